@@ -0,0 +1,309 @@
+"""
+#### Module Information ####
+
+Module name: array_store.py
+
+Purpose of module: Chunked, compressed array store of the basal area rasters. s1 copies the .img
+    rasters into ba.gdb one at a time, and a file gdb can only be read back through ArcPy.
+    Here each raster is saved as a folder of square chunks plus a meta.json with its shape, chunk
+    size, geotransform, coordinate system and NoData, so any window can be read with NumPy alone
+    (no ArcGIS licence), and only the chunks that overlap the window are read.
+
+    Chunks are float32 with NoData as NaN, byte-shuffled and zlib compressed. Chunks with no data are
+    not saved, so a species with a small range takes little space. meta.json is written last, so a
+    raster without it was interrupted and is ingested again.
+
+    Store layout: store_dir/{raster}/meta.json and store_dir/{raster}/{chunk row}_{chunk col}.z
+
+    ArcPy is only needed to ingest the .img rasters (ingest_img, ingest_rasters); reading does not
+    import it. raster_blocks.read_block reads the rasters of the store by their path (store_dir/{raster})
+    like any other raster, and a StoreRaster has the grid properties of an ap.Raster, so the basal area
+    sum and proportions (ba_sum.py) run on the store in place of ba.gdb.
+
+Used by: s1_ba_export_to_array_store.py, raster_blocks.py, s2_s4_fused_ingest.py
+
+Date Created: 2026-10-18
+
+"""
+
+# Import the necessary modules
+import json
+import os
+import shutil
+import zlib
+from collections import namedtuple
+import numpy as np
+
+# Rows and columns per chunk; 512 x 512 float32 is 1 MB before compression
+CHUNK_SIZE = 512
+
+# zlib level of the chunks; higher levels give little on shuffled floats and ingest more slowly
+COMPRESS_LEVEL = 4
+
+# Version of the layout, saved in meta.json
+STORE_FORMAT = 1
+
+META_NAME = 'meta.json'
+
+# Extent of a store raster, named as that of an ap.Raster
+Extent = namedtuple('Extent', ['XMin', 'YMin', 'XMax', 'YMax'])
+
+
+def _encode_chunk(chunk):
+    """
+    Compressed bytes of a float32 chunk: the bytes of each value are grouped by position (shuffle)
+    before compression, which compresses floats much better than the raw bytes.
+    """
+    shuffled = np.ascontiguousarray(chunk, dtype=np.float32).view(np.uint8).reshape(-1, 4).T
+    return zlib.compress(shuffled.tobytes(), COMPRESS_LEVEL)
+
+
+def _decode_chunk(data, nrows, ncols):
+    """
+    float32 chunk from the bytes saved by _encode_chunk.
+    """
+    shuffled = np.frombuffer(zlib.decompress(data), dtype=np.uint8).reshape(4, -1)
+    return np.ascontiguousarray(shuffled.T).view(np.float32).reshape(nrows, ncols)
+
+
+def save_raster(store_dir, name, strips, nrows, ncols, geotransform, crs=None, source=None,
+                source_nodata=None, chunk_size=CHUNK_SIZE):
+    """
+    Save a raster to the store from full-width row strips.
+
+    strips: iterable of (row_start, block) in row order, with NaN for NoData; every strip except the
+        last must have a multiple of chunk_size rows
+    nrows, ncols: shape of the raster
+    geotransform: (x_min, cell_width, 0, y_max, 0, -cell_height), as in GDAL
+    crs: coordinate system of the raster (WKT string)
+    source: path of the raster it was read from; source_nodata: NoData value of the source
+    Returns the meta of the saved raster.
+    """
+    raster_dir = os.path.join(store_dir, name)
+    if os.path.exists(raster_dir):
+        shutil.rmtree(raster_dir)
+    os.makedirs(raster_dir)
+    chunks = []
+    for row_start, block in strips:
+        if row_start % chunk_size:
+            raise ValueError('Strip at row {} is not aligned to chunks of {} rows'.format(row_start, chunk_size))
+        for chunk_row_start in range(0, block.shape[0], chunk_size):
+            for col_start in range(0, ncols, chunk_size):
+                chunk = block[chunk_row_start:chunk_row_start + chunk_size, col_start:col_start + chunk_size]
+                if np.isnan(chunk).all():
+                    continue
+                key = '{}_{}'.format((row_start + chunk_row_start) // chunk_size, col_start // chunk_size)
+                with open(os.path.join(raster_dir, key + '.z'), 'wb') as f:
+                    f.write(_encode_chunk(chunk))
+                chunks.append(key)
+
+    meta = {'format': STORE_FORMAT, 'name': name, 'shape': [int(nrows), int(ncols)], 'chunk_size': int(chunk_size),
+            'dtype': 'float32', 'nodata': 'nan', 'geotransform': [float(value) for value in geotransform],
+            'crs': crs, 'source': source, 'source_nodata': source_nodata, 'chunks': sorted(chunks)}
+    # Written last and in one step, so only finished rasters have a meta.json
+    tmp_path = os.path.join(raster_dir, META_NAME + '.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(meta, f, indent=1)
+    os.replace(tmp_path, os.path.join(raster_dir, META_NAME))
+    return meta
+
+
+def save_array(store_dir, name, array, geotransform, crs=None, chunk_size=CHUNK_SIZE):
+    """
+    Save an array held in memory (NaN for NoData) to the store, e.g., a synthetic raster.
+    """
+    strips = ((row_start, array[row_start:row_start + chunk_size]) for row_start in range(0, array.shape[0], chunk_size))
+    return save_raster(store_dir, name, strips, array.shape[0], array.shape[1], geotransform, crs,
+                       chunk_size=chunk_size)
+
+
+def is_store_raster(path):
+    """
+    True if path is a finished raster of a store (a folder with a meta.json).
+    """
+    return isinstance(path, str) and os.path.isfile(os.path.join(path, META_NAME))
+
+
+def list_rasters(store_dir):
+    """
+    Names of the finished rasters in the store, sorted.
+    """
+    if not os.path.isdir(store_dir):
+        return []
+    return sorted(name for name in os.listdir(store_dir) if os.path.exists(os.path.join(store_dir, name, META_NAME)))
+
+
+class StoreRaster(object):
+    """
+    One raster of the store, read by window.
+
+    path: folder of the raster; meta: contents of its meta.json
+    nrows, ncols: shape of the raster; chunk_size: rows and columns per chunk
+    geotransform: (x_min, cell_width, 0, y_max, 0, -cell_height)
+    """
+
+    def __init__(self, path, meta):
+        self.path = path
+        self.meta = meta
+        self.nrows, self.ncols = meta['shape']
+        self.chunk_size = meta['chunk_size']
+        self.geotransform = meta['geotransform']
+        self._chunks = set(meta['chunks'])
+
+    @classmethod
+    def open(cls, store_dir, name):
+        """
+        Raster of the store by name, e.g., StoreRaster.open(store_dir, 's121').
+        """
+        path = os.path.join(store_dir, name)
+        with open(os.path.join(path, META_NAME)) as f:
+            return cls(path, json.load(f))
+
+    @classmethod
+    def open_path(cls, path):
+        """
+        Raster of the store by its folder, e.g., StoreRaster.open_path('out_dir/ba_store/s121').
+        """
+        return cls.open(*os.path.split(os.path.normpath(path)))
+
+    @property
+    def cell_size(self):
+        return self.geotransform[1], -self.geotransform[5]
+
+    # Grid properties named as those of an ap.Raster, so a store raster can be the template of
+    # raster_blocks.iter_blocks, block_to_raster and mosaic_blocks
+    @property
+    def height(self):
+        return self.nrows
+
+    @property
+    def width(self):
+        return self.ncols
+
+    @property
+    def meanCellWidth(self):
+        return self.cell_size[0]
+
+    @property
+    def meanCellHeight(self):
+        return self.cell_size[1]
+
+    @property
+    def extent(self):
+        cell_width, cell_height = self.cell_size
+        return Extent(self.geotransform[0], self.geotransform[3] - self.nrows * cell_height,
+                      self.geotransform[0] + self.ncols * cell_width, self.geotransform[3])
+
+    @property
+    def spatialReference(self):
+        """
+        ap.SpatialReference of the coordinate system saved with the raster, or None without one.
+        """
+        if not self.meta['crs']:
+            return None
+        import arcpy as ap
+
+        spatial_ref = ap.SpatialReference()
+        spatial_ref.loadFromString(self.meta['crs'])
+        return spatial_ref
+
+    def index(self, x, y):
+        """
+        (row, column) of the cell that holds the map coordinates x, y.
+        """
+        cell_width, cell_height = self.cell_size
+        return (int(np.floor((self.geotransform[3] - y) / cell_height)),
+                int(np.floor((x - self.geotransform[0]) / cell_width)))
+
+    def read_chunk(self, chunk_row, chunk_col):
+        """
+        One chunk as float32, all NaN if it was not saved (no data).
+        """
+        nrows = min(self.chunk_size, self.nrows - chunk_row * self.chunk_size)
+        ncols = min(self.chunk_size, self.ncols - chunk_col * self.chunk_size)
+        key = '{}_{}'.format(chunk_row, chunk_col)
+        if key not in self._chunks:
+            return np.full((nrows, ncols), np.nan, dtype=np.float32)
+        with open(os.path.join(self.path, key + '.z'), 'rb') as f:
+            return _decode_chunk(f.read(), nrows, ncols)
+
+    def read_window(self, row, col, nrows, ncols, dtype=np.float64):
+        """
+        Read a window of nrows x ncols cells from (row, col) of the top left, NaN for NoData (also for
+        the part of the window outside the raster), as raster_blocks.read_block does.
+        """
+        out = np.full((nrows, ncols), np.nan, dtype=dtype)
+        row_min, row_max = max(row, 0), min(row + nrows, self.nrows)
+        col_min, col_max = max(col, 0), min(col + ncols, self.ncols)
+        if row_min >= row_max or col_min >= col_max:
+            return out
+        for chunk_row in range(row_min // self.chunk_size, (row_max - 1) // self.chunk_size + 1):
+            for chunk_col in range(col_min // self.chunk_size, (col_max - 1) // self.chunk_size + 1):
+                if '{}_{}'.format(chunk_row, chunk_col) not in self._chunks:
+                    continue
+                chunk = self.read_chunk(chunk_row, chunk_col)
+                top, left = chunk_row * self.chunk_size, chunk_col * self.chunk_size
+                r0, r1 = max(row_min, top), min(row_max, top + chunk.shape[0])
+                c0, c1 = max(col_min, left), min(col_max, left + chunk.shape[1])
+                out[r0 - row:r1 - row, c0 - col:c1 - col] = chunk[r0 - top:r1 - top, c0 - left:c1 - left]
+        return out
+
+    def read_block(self, x_min, y_min, ncols, nrows, dtype=np.float64):
+        """
+        Read the window of nrows x ncols cells whose lower left corner is at the map coordinates x_min,
+        y_min, as raster_blocks.read_block reads the window at a lower_left point.
+        """
+        cell_width, cell_height = self.cell_size
+        row = int(round((self.geotransform[3] - y_min) / cell_height)) - nrows
+        col = int(round((x_min - self.geotransform[0]) / cell_width))
+        return self.read_window(row, col, nrows, ncols, dtype)
+
+    def read(self, dtype=np.float64):
+        """
+        The whole raster as one array.
+        """
+        return self.read_window(0, 0, self.nrows, self.ncols, dtype)
+
+
+def ingest_img(img_path, store_dir, name=None, chunk_size=CHUNK_SIZE):
+    """
+    Read a raster (e.g., an .img of Wilson et al. 2013) with ArcPy in strips of chunk rows and save it
+    to the store. Run once per raster, possibly in a worker process.
+    name: name in the store; defaults to the file name without extension, as in ba.gdb
+    """
+    import arcpy as ap
+
+    name = name or os.path.splitext(os.path.basename(img_path))[0]
+    raster = ap.Raster(img_path)
+    extent = raster.extent
+
+    def strips():
+        for row_start in range(0, raster.height, chunk_size):
+            nrows = min(chunk_size, raster.height - row_start)
+            lower_left = ap.Point(extent.XMin, extent.YMax - (row_start + nrows) * raster.meanCellHeight)
+            yield row_start, ap.RasterToNumPyArray(raster, lower_left, raster.width, nrows, nodata_to_value=np.nan)
+
+    geotransform = (extent.XMin, raster.meanCellWidth, 0, extent.YMax, 0, -raster.meanCellHeight)
+    crs = raster.spatialReference.exportToString() if raster.spatialReference is not None else None
+    meta = save_raster(store_dir, name, strips(), raster.height, raster.width, geotransform, crs,
+                       source=str(img_path), source_nodata=raster.noDataValue, chunk_size=chunk_size)
+    print('Saved', name, 'to the store:', len(meta['chunks']), 'chunks with data')
+    return name
+
+
+def ingest_rasters(img_paths, store_dir, workers=1, memory_limit_mb=None, chunk_size=CHUNK_SIZE, overwrite=False):
+    """
+    Save every raster of img_paths to the store, several at the same time in a pool of worker
+    processes (see species_parallel.py). Rasters already finished in the store are skipped unless
+    overwrite is set.
+    Returns the results of run_species_parallel.
+    """
+    from raster_blocks import setup_worker
+    from species_parallel import run_species_parallel
+
+    os.makedirs(store_dir, exist_ok=True)
+    done = set() if overwrite else set(list_rasters(store_dir))
+    tasks = [(os.path.basename(img_path), dict(img_path=img_path, store_dir=store_dir, chunk_size=chunk_size))
+             for img_path in img_paths if os.path.splitext(os.path.basename(img_path))[0] not in done]
+    print('Saving', len(tasks), 'rasters to the store,', len(img_paths) - len(tasks), 'already done')
+    return run_species_parallel(ingest_img, tasks, workers, memory_limit_mb, setup_worker)
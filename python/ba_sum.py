@@ -0,0 +1,206 @@
+"""
+#### Module Information ####
+
+Module name: ba_sum.py
+
+Purpose of module: National basal area sum of the species rasters (s3) streamed one tile at a time, and
+    the Horn species' proportion of it (s4).
+    ap.sa.CellStatistics(rasters, "SUM", "DATA") over all 324 rasters is a single call that can not be
+    resumed, run in parallel or held to a memory limit. Here the grid is cut into tiles; each tile
+    reads the same window of every species raster, adds the values in float64 (NoData where no species
+    has data, as the DATA option) and saves its partial sum, so tiles can run in a pool of worker
+    processes (see species_parallel.py) and an interrupted run only redoes the tiles that were not saved.
+    Species are always added in the same order within a tile and the tiles are combined in tile order,
+    so the result does not depend on the number of workers.
+
+    The same pass also gives each species' total basal area and number of cells with data, saved as a
+    csv next to the output.
+
+    Both passes can read the rasters of s1 (ba.gdb) directly with zero taken as NoData, so the fused
+    ingest (s2_s4_fused_ingest.py) does not need the 324 nulled copies of s2: one pass sums all species
+    and a second pass reads only the Horn species and writes their proportion rasters, caching each
+    species' range from the values as they are written (see species_ranges.py).
+    The basal area rasters can also be read from the array store of s1_ba_export_to_array_store.py
+    (see array_store.py) by passing their store paths; the store then also sets the tiles and grid of the sum.
+
+Used by: s3_ba_sum_natl_forest.py, s2_s4_fused_ingest.py
+
+Date Created: 2026-10-18
+
+"""
+
+# Import the necessary modules
+import json
+import os
+import shutil
+import numpy as np
+
+import raster_blocks
+from raster_blocks import block_to_raster, iter_blocks, mosaic_blocks, open_raster, read_block, setup_worker
+from run_manifest import file_stamp, hash_parts
+from run_profile import count_cells
+from species_parallel import run_species_parallel
+from species_ranges import SpeciesRange, range_cache_path
+
+# Rows and columns per tile; 2048 x 2048 float64 is 32 MB per array
+TILE_SIZE = 2048
+
+
+def read_ba_block(raster, lower_left, ncols, nrows, zero_as_nodata=False):
+    """
+    Read one window of a basal area raster (see raster_blocks.read_block); zero_as_nodata: set 0 to NaN,
+    as s2_setzero_null.py does, for the rasters of s1.
+    """
+    block = read_block(raster, lower_left, ncols, nrows)
+    if zero_as_nodata:
+        block[block == 0] = np.nan
+    return block
+
+
+def tile_sum(rasters, lower_left, ncols, nrows, tile_path, zero_as_nodata=False):
+    """
+    Sum one tile window of every raster and save it to tile_path (.npz) with each raster's total and
+    number of cells with data in the tile. Run once per tile, possibly in a worker process.
+    zero_as_nodata: take 0 as NoData (see read_ba_block)
+    """
+    total = np.zeros((nrows, ncols), dtype=np.float64)
+    has_data = np.zeros((nrows, ncols), dtype=bool)
+    species_totals = np.zeros(len(rasters), dtype=np.float64)
+    species_cells = np.zeros(len(rasters), dtype=np.int64)
+    for i, raster in enumerate(rasters):
+        block = read_ba_block(raster, lower_left, ncols, nrows, zero_as_nodata)
+        valid = ~np.isnan(block)
+        total += np.where(valid, block, 0.0)
+        has_data |= valid
+        species_totals[i] = block[valid].sum()
+        species_cells[i] = np.count_nonzero(valid)
+        count_cells(block.size)
+    total[~has_data] = np.nan
+
+    # Written to a temporary file first, so an interrupted tile is not taken as finished
+    tmp_path = tile_path + '.tmp.npz'
+    np.savez(tmp_path, total=total, species_totals=species_totals, species_cells=species_cells)
+    os.replace(tmp_path, tile_path)
+    return tile_path
+
+
+def sum_rasters(rasters, out_raster_save_path, totals_csv_path, work_dir, workers=1, memory_limit_mb=None,
+                tile_size=TILE_SIZE, zero_as_nodata=False):
+    """
+    Save the cell-by-cell sum of the rasters (NoData where every raster is NoData) and a csv of each
+    raster's total and number of cells with data.
+
+    rasters: list of raster paths on the same grid (e.g., the nulled basal area rasters, or the rasters of
+        the array store); the first sets the tiles and the grid of the output
+    work_dir: folder for the partial sums of the tiles; tiles already saved there from the same rasters
+        (unchanged since, see run_manifest.file_stamp) and tiling are not summed again. Deleted once the
+        output is saved.
+    workers: number of tiles summed at the same time (see species_parallel.py)
+    memory_limit_mb: memory limit for each worker, in MB (None for no limit)
+    tile_size: rows and columns per tile
+    zero_as_nodata: take 0 as NoData, to sum the rasters of s1 without the nulled copies of s2
+
+    Returns a dict of raster -> (total, cells with data).
+    """
+    rasters = sorted(rasters) # Fixed order, so the sum is the same on every run
+    tiles = list(iter_blocks(rasters[0], tile_size))
+
+    # Tiles saved by an earlier run are only used if they were made from the same rasters (paths and
+    # file stamps, so replaced rasters are summed again) and tiling
+    key = hash_parts(rasters=rasters, stamps=[file_stamp(raster) for raster in rasters],
+                     tiles=[(p.X, p.Y, ncols, nrows) for p, ncols, nrows in tiles], zero_as_nodata=zero_as_nodata)
+    key_path = os.path.join(work_dir, 'tiles.json')
+    if os.path.exists(key_path):
+        with open(key_path) as f:
+            if json.load(f)['key'] != key:
+                shutil.rmtree(work_dir)
+    os.makedirs(work_dir, exist_ok=True)
+    with open(key_path, 'w') as f:
+        json.dump({'key': key}, f)
+
+    tile_paths = [os.path.join(work_dir, 'tile_{:05d}.npz'.format(i)) for i in range(len(tiles))]
+    tasks = [('tile {} of {}'.format(i + 1, len(tiles)), dict(rasters=rasters, lower_left=lower_left, ncols=ncols,
+                                                           nrows=nrows, tile_path=tile_paths[i],
+                                                           zero_as_nodata=zero_as_nodata))
+             for i, (lower_left, ncols, nrows) in enumerate(tiles) if not os.path.exists(tile_paths[i])]
+    print('Summing', len(rasters), 'rasters in', len(tiles), 'tiles,', len(tiles) - len(tasks), 'already done')
+    results = run_species_parallel(tile_sum, tasks, workers, memory_limit_mb, setup_worker)
+    failed = [label for label, _, error in results if error]
+    if failed:
+        raise RuntimeError('{} tiles failed ({}); run again to finish them'.format(len(failed), ', '.join(failed)))
+
+    # Combine the tiles in tile order
+    template = open_raster(rasters[0])
+    species_totals = np.zeros(len(rasters), dtype=np.float64)
+    species_cells = np.zeros(len(rasters), dtype=np.int64)
+    block_rasters = []
+    for (lower_left, _, _), tile_path in zip(tiles, tile_paths):
+        with np.load(tile_path) as tile:
+            species_totals += tile['species_totals']
+            species_cells += tile['species_cells']
+            if not np.isnan(tile['total']).all():
+                block_rasters.append(block_to_raster(tile['total'], lower_left, template))
+    mosaic_blocks(block_rasters, out_raster_save_path, template)
+
+    with open(totals_csv_path, 'w', newline='') as f:
+        f.write('raster,total_ba,cells\n')
+        for raster, total, cells in zip(rasters, species_totals, species_cells):
+            f.write('{},{:.17g},{}\n'.format(os.path.basename(raster), total, cells))
+    shutil.rmtree(work_dir)
+    return {raster: (float(total), int(cells)) for raster, total, cells in zip(rasters, species_totals, species_cells)}
+
+
+def species_proportion(ba_raster, natl_raster, out_raster_save_path, out_dir, zero_as_nodata=False, block_rows=None):
+    """
+    Divide one species' basal area raster by the national basal area raster in full-width row strips,
+    save the proportion over the full grid (as ap.sa.Divide does) and cache the species' range from the
+    strips as they are written, instead of reading the proportion raster back.
+    Run once per species, possibly in a worker process.
+
+    zero_as_nodata: take 0 as NoData in the basal area raster (see read_ba_block)
+    """
+    import arcpy as ap
+
+    raster = ap.Raster(natl_raster)
+    block_rows = block_rows or raster_blocks.BLOCK_SIZE
+    block_rasters = []
+
+    def strips():
+        for row_start in range(0, raster.height, block_rows):
+            nrows = min(block_rows, raster.height - row_start)
+            lower_left = ap.Point(raster.extent.XMin, raster.extent.YMax - (row_start + nrows) * raster.meanCellHeight)
+            proportion = (read_ba_block(ba_raster, lower_left, raster.width, nrows, zero_as_nodata)
+                          / read_block(natl_raster, lower_left, raster.width, nrows))
+            count_cells(proportion.size)
+            # Every strip is written so the proportion raster keeps the full extent, as later stages
+            # use it as the template grid
+            block_rasters.append(block_to_raster(proportion, lower_left, raster))
+            yield row_start, proportion
+
+    species_range = SpeciesRange.from_strips(out_raster_save_path, raster, strips())
+    mosaic_blocks(block_rasters, out_raster_save_path, raster)
+    species_range.stamp = file_stamp(out_raster_save_path)
+    range_path = range_cache_path(out_raster_save_path, out_dir)
+    os.makedirs(os.path.dirname(range_path), exist_ok=True)
+    species_range.save(range_path)
+    print('Range of', os.path.basename(out_raster_save_path), ':', len(species_range), 'cells,',
+          species_range.nrows, 'x', species_range.ncols, 'window')
+    return out_raster_save_path
+
+
+def run_proportions(ba_rasters, natl_raster, spp_prop_ba_gdb_path, out_dir, workers=1, memory_limit_mb=None,
+                    zero_as_nodata=False):
+    """
+    Save the proportion raster ('{raster}_proportion') of every basal area raster in spp_prop_ba_gdb_path
+    and cache its range in out_dir/spp_ranges.
+
+    ba_rasters: paths of the species' basal area rasters, e.g., the Horn species in ba.gdb
+    natl_raster: national basal area raster (ba_null_natl_forest)
+    workers: number of species processed at the same time (see species_parallel.py)
+    Returns the results of run_species_parallel.
+    """
+    tasks = [(os.path.basename(ba_raster), dict(
+                ba_raster=ba_raster, natl_raster=natl_raster, out_dir=out_dir, zero_as_nodata=zero_as_nodata,
+                out_raster_save_path=os.path.join(spp_prop_ba_gdb_path, '{}_proportion'.format(os.path.basename(ba_raster)))))
+             for ba_raster in ba_rasters]
+    return run_species_parallel(species_proportion, tasks, workers, memory_limit_mb, setup_worker)
@@ -0,0 +1,511 @@
+"""
+#### Module Information ####
+
+Module name: benchmarks.py
+
+Purpose of module: Benchmarks of every stage of the script series on seeded synthetic inputs
+    (see synthetic_inputs.py), so the speed of a change can be measured and compared between
+    versions without the real inputs, on a laptop-sized grid or the full CONUS grid.
+
+    Each benchmark runs the functions of one stage over all species, with rasters replaced by the array
+    store (see array_store.py) and arrays on disk (.npy/.npz in work_dir) so results do not depend on
+    ArcGIS or the disk layout of the gdbs:
+        s2: zero to null of every species' basal area, a strip of rows at a time (ba_sum.read_ba_block)
+        s3: national basal area sum of all species, a tile at a time (ba_sum.tile_sum)
+        s4: proportion of the national basal area of each Horn species, cached as its range, and the
+            presence index of the ranges (presence_index.load_presence_index)
+        s5: exceedance masks and summaries, every element (exceedance_masks.calculate_exceedance)
+        s6: growth and survival effects, every element (response_curves.effect)
+        s6_lookup: s6 from per-species lookup tables (response_curves.ResponseTable)
+        s8: basal area weighted growth effects of s6 (response_curves.ba_weighted_effect)
+        s9: deposition level needed to prevent a 5% (growth) / 1% (survival) reduction
+        s7: 5th percentile across species of the s9 deposition levels (cell_statistics.nanpercentile_select)
+        s7_signature: s7 calculated once per distinct set of species present (cell_statistics.SignatureCache)
+        scenario_1, scenarios_10: aggregates across species of 1 and of 10 N deposition scenarios in one
+            pass (deposition_scenarios.scenario_aggregates), reading the ranges and TDep once
+    Stages that need the outputs of another stage (e.g., s8 needs s6) run it first, untimed, if it
+    was not selected.
+
+    Every benchmark is repeated and timed with run_profile.profile_unit (wall and CPU time, peak RSS).
+    Results are saved as JSON with the grid, seed and versions, and compare_results reports the stages
+    that got slower between two result files of the same grid.
+
+Used by: run_benchmarks.py
+
+Date Created: 2026-10-18
+
+"""
+
+# Import the necessary modules
+import json
+import os
+import platform
+import subprocess
+import time
+from collections import namedtuple
+import numpy as np
+
+from array_store import StoreRaster, save_array
+from ba_sum import TILE_SIZE, read_ba_block, tile_sum
+from cell_statistics import SignatureCache, nanpercentile_select, strip_cells
+from deposition_scenarios import scenario_aggregates
+from exceedance_masks import calculate_exceedance, masks_path
+from presence_index import load_presence_index
+from raster_blocks import read_block
+from response_curves import ba_weighted_effect, deposition_level, effect, lookup_tables
+from run_profile import profile_unit
+from species_params import load_species_params
+from species_ranges import RANGES_DIR_NAME, SpeciesRange
+from synthetic_inputs import (STRIP_ROWS, ba_store_path, generate_inputs, grid_cells, grid_geotransform, load_tdep,
+                              window_offset)
+
+# Folder of the scripts and shared modules
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Stage order, as in the script series
+STAGE_ORDER = ['s2', 's3', 's4', 's5', 's6', 's6_lookup', 's8', 's9', 's7', 's7_signature', 'scenario_1',
+               'scenarios_10']
+
+# Stages whose outputs each benchmark reads
+STAGE_NEEDS = {'s2': [], 's3': [], 's4': ['s3'], 's5': ['s4'], 's6': ['s4'], 's6_lookup': ['s4'], 's8': ['s6'],
+               's9': ['s4'], 's7': ['s9'], 's7_signature': ['s9'], 'scenario_1': ['s4'], 'scenarios_10': ['s4']}
+
+# Response variables, elements, TDep period and percentile of the benchmarks
+RESPONSE_VARIABLES = ['growth', 'survival']
+ELEMENTS = ['n', 's']
+TDEP_PERIOD = '1719'
+PERCENTILE = 5
+
+# Scales of the N deposition of the scenario benchmarks
+SCENARIO_SCALES = [1.0, 0.95, 0.9, 0.85, 0.8, 0.75, 0.7, 0.6, 0.5, 0.4]
+
+# Relative change in time reported as a regression (or improvement) by compare_results
+TOLERANCE = 0.10
+
+# Lower left corner of a window, as read from the array store by raster_blocks.read_block (in place of ap.Point)
+Point = namedtuple('Point', ['X', 'Y'])
+
+
+def output_path(work_dir, stage, name):
+    """
+    Path of one benchmark output, e.g., work_dir/s6/s121_n_growth.npy.
+    """
+    return os.path.join(work_dir, stage, name)
+
+
+def save_values(work_dir, stage, name, values):
+    """
+    Save the values of one output as float32, standing in for writing the output raster.
+    """
+    os.makedirs(os.path.join(work_dir, stage), exist_ok=True)
+    np.save(output_path(work_dir, stage, name), values.astype(np.float32))
+
+
+def grid_windows(grid, nrows, ncols):
+    """
+    Yield (lower_left, ncols, nrows) of the windows of the grid, nrows x ncols cells at most, in row order.
+    """
+    cell_size = grid['cell_size']
+    for row_start in range(0, grid['nrows'], nrows):
+        window_nrows = min(nrows, grid['nrows'] - row_start)
+        for col_start in range(0, grid['ncols'], ncols):
+            lower_left = Point(grid['x_min'] + col_start * cell_size,
+                               grid['y_max'] - (row_start + window_nrows) * cell_size)
+            yield lower_left, min(ncols, grid['ncols'] - col_start), window_nrows
+
+
+def bench_s2(inputs_dir, work_dir, grid):
+    """
+    Read every species' basal area raster with zero set to NoData (NaN), a strip at a time. The nulled
+    rasters are not written (s3 nulls on read). Returns the number of cells processed.
+    """
+    cells_processed = 0
+    for code in grid['species']:
+        for lower_left, ncols, nrows in grid_windows(grid, STRIP_ROWS, grid['ncols']):
+            cells_processed += read_ba_block(ba_store_path(inputs_dir, code), lower_left, ncols, nrows, True).size
+    return cells_processed
+
+
+def bench_s3(inputs_dir, work_dir, grid):
+    """
+    National basal area: sum of every species' nulled basal area, NoData where no species has data,
+    summed a tile at a time and saved to the array store in work_dir/s3.
+    """
+    rasters = [ba_store_path(inputs_dir, code) for code in sorted(grid['species'])]
+    tiles_dir = os.path.join(work_dir, 's3', 'tiles')
+    os.makedirs(tiles_dir, exist_ok=True)
+    total = np.empty((grid['nrows'], grid['ncols']), dtype=np.float32)
+    cells_processed = 0
+    for i, (lower_left, ncols, nrows) in enumerate(grid_windows(grid, TILE_SIZE, TILE_SIZE)):
+        tile_path = tile_sum(rasters, lower_left, ncols, nrows, os.path.join(tiles_dir, 'tile_{:05d}.npz'.format(i)),
+                             zero_as_nodata=True)
+        row = int(round((grid['y_max'] - lower_left.Y) / grid['cell_size'])) - nrows
+        col = int(round((lower_left.X - grid['x_min']) / grid['cell_size']))
+        with np.load(tile_path) as tile:
+            total[row:row + nrows, col:col + ncols] = tile['total']
+        cells_processed += len(rasters) * ncols * nrows
+    save_array(os.path.join(work_dir, 's3'), 'ba_null_natl_forest', total, grid_geotransform(grid))
+    return cells_processed
+
+
+def ranges_dir(work_dir):
+    """
+    Folder of the Horn species' ranges cached by the s4 benchmark.
+    """
+    return output_path(work_dir, 's4', RANGES_DIR_NAME)
+
+
+def bench_s4(inputs_dir, work_dir, grid):
+    """
+    Proportion of the national basal area of every Horn species, a strip at a time, cached as its range
+    (as s4 caches the ranges in spp_ranges), then the presence index of the ranges.
+    """
+    natl_path = output_path(work_dir, 's3', 'ba_null_natl_forest')
+    natl = StoreRaster.open_path(natl_path)
+    os.makedirs(ranges_dir(work_dir), exist_ok=True)
+    cells_processed = 0
+    for code in grid['horn_species']:
+        ba_path = ba_store_path(inputs_dir, code)
+
+        def strips():
+            for lower_left, ncols, nrows in grid_windows(grid, STRIP_ROWS, grid['ncols']):
+                row_start = int(round((grid['y_max'] - lower_left.Y) / grid['cell_size'])) - nrows
+                yield row_start, (read_ba_block(ba_path, lower_left, ncols, nrows, zero_as_nodata=True)
+                                  / read_block(natl_path, lower_left, ncols, nrows))
+
+        species_range = SpeciesRange.from_strips('s{}_proportion'.format(code), natl, strips())
+        species_range.save(os.path.join(ranges_dir(work_dir), 's{}_proportion.npz'.format(code)))
+        cells_processed += grid['nrows'] * grid['ncols']
+    load_presence_index(os.path.join(work_dir, 's4'))
+    return cells_processed
+
+
+def horn_species(work_dir, grid):
+    """
+    Yield (code, proportion range, grid cells) of every Horn species from the s4 benchmark.
+    """
+    for code in grid['horn_species']:
+        species_range = SpeciesRange.load(os.path.join(ranges_dir(work_dir), 's{}_proportion.npz'.format(code)))
+        yield code, species_range, grid_cells(species_range, grid)
+
+
+def bench_s5(inputs_dir, work_dir, grid):
+    """
+    Exceedance masks of every Horn species and the exceedance summaries, for every element, from the
+    presence index of s4 and TDep at its cells.
+    """
+    species_params = load_species_params(inputs_dir, RESPONSE_VARIABLES)
+    index = load_presence_index(os.path.join(work_dir, 's4'))
+    # Flat indices on the whole grid of the index cells (PresenceIndex.gather reads them from a raster)
+    row0 = int(round((grid['y_max'] - index.y_max) / grid['cell_size']))
+    col0 = int(round((index.x_min - grid['x_min']) / grid['cell_size']))
+    rows, cols = np.divmod(index.cells.astype(np.int64), index.ncols)
+    cells = (rows + row0) * grid['ncols'] + cols + col0
+    os.makedirs(os.path.join(work_dir, 's5'), exist_ok=True)
+    cells_processed = 0
+    for element in ELEMENTS:
+        dep = load_tdep(inputs_dir, element, TDEP_PERIOD).ravel()[cells].astype(np.float64)
+        masks, summaries = calculate_exceedance(index, element, dep, species_params, RESPONSE_VARIABLES, TDEP_PERIOD,
+                                                ranges_dir(work_dir))
+        masks.save(masks_path(os.path.join(work_dir, 's5'), element, TDEP_PERIOD))
+        for response_variable, values_by_summary in summaries.items():
+            for summary, values in values_by_summary.items():
+                save_values(work_dir, 's5', '{}_{}_{}.npy'.format(summary, element, response_variable), values)
+        cells_processed += len(index) * len(index.species)
+    return cells_processed
+
+
+def bench_s6(inputs_dir, work_dir, grid):
+    """
+    Growth and survival effects of every Horn species and element with a critical load.
+    """
+    species_params = load_species_params(inputs_dir, RESPONSE_VARIABLES)
+    tdep = {element: load_tdep(inputs_dir, element, TDEP_PERIOD).ravel() for element in ELEMENTS}
+    cells_processed = 0
+    for code, species_range, cells in horn_species(work_dir, grid):
+        for element in ELEMENTS:
+            dep = tdep[element][cells].astype(np.float64)
+            for response_variable in RESPONSE_VARIABLES:
+                params = species_params[response_variable].curve_params(code, element, full_curve=True)
+                if params is None:
+                    continue
+                save_values(work_dir, 's6', 's{}_{}_{}.npy'.format(code, element, response_variable),
+                            effect(dep, params, response_variable))
+                cells_processed += len(species_range)
+    return cells_processed
+
+
+def bench_s6_lookup(inputs_dir, work_dir, grid):
+    """
+    s6 with the effects looked up from a table of each species, endpoint and element.
+    """
+    species_params = load_species_params(inputs_dir, RESPONSE_VARIABLES)
+    tdep = {element: load_tdep(inputs_dir, element, TDEP_PERIOD).ravel() for element in ELEMENTS}
+    cells_processed = 0
+    for code, species_range, cells in horn_species(work_dir, grid):
+        for element in ELEMENTS:
+            dep = tdep[element][cells].astype(np.float64)
+            params_by_endpoint = {}
+            for response_variable in RESPONSE_VARIABLES:
+                params = species_params[response_variable].curve_params(code, element, full_curve=True)
+                if params is not None:
+                    params_by_endpoint[(response_variable, element)] = params
+            for (response_variable, _), table in lookup_tables(params_by_endpoint, {element: dep}).items():
+                save_values(work_dir, 's6_lookup', 's{}_{}_{}.npy'.format(code, element, response_variable),
+                            table.evaluate(dep))
+                cells_processed += len(species_range)
+    return cells_processed
+
+
+def bench_s8(inputs_dir, work_dir, grid):
+    """
+    Growth effects from s6 weighted by each species' basal area proportion.
+    """
+    cells_processed = 0
+    for code, species_range, _ in horn_species(work_dir, grid):
+        for element in ELEMENTS:
+            effect_path = output_path(work_dir, 's6', 's{}_{}_growth.npy'.format(code, element))
+            if not os.path.exists(effect_path):
+                continue
+            save_values(work_dir, 's8', 's{}_{}_growth.npy'.format(code, element),
+                        ba_weighted_effect(species_range.values, np.load(effect_path)))
+            cells_processed += len(species_range)
+    return cells_processed
+
+
+def bench_s9(inputs_dir, work_dir, grid):
+    """
+    Deposition level needed to prevent an x% reduction, written over every Horn species' range.
+    """
+    species_params = load_species_params(inputs_dir, RESPONSE_VARIABLES)
+    cells_processed = 0
+    for code, species_range, _ in horn_species(work_dir, grid):
+        for element in ELEMENTS:
+            for response_variable in RESPONSE_VARIABLES:
+                params = species_params[response_variable].curve_params(code, element, full_curve=True)
+                if params is None or not params.dep_max:
+                    continue
+                level = float(deposition_level(params, response_variable))
+                save_values(work_dir, 's9', 's{}_{}_{}.npy'.format(code, element, response_variable),
+                            np.full(len(species_range), level))
+                cells_processed += len(species_range)
+    return cells_processed
+
+
+def bench_s7(inputs_dir, work_dir, grid):
+    """
+    PERCENTILE-th percentile across species of the s9 deposition levels, per cell, for every element and
+    response variable, with the species stacked a strip of rows at a time.
+    """
+    ranges = list(horn_species(work_dir, grid))
+    ncols = grid['ncols']
+    cells_processed = 0
+    for element in ELEMENTS:
+        for response_variable in RESPONSE_VARIABLES:
+            stacked = []
+            for code, _, cells in ranges:
+                level_path = output_path(work_dir, 's9', 's{}_{}_{}.npy'.format(code, element, response_variable))
+                if os.path.exists(level_path):
+                    stacked.append((cells, np.load(level_path, mmap_mode='r')))
+            if not stacked:
+                continue
+            result = np.empty(grid['nrows'] * ncols, dtype=np.float32)
+            for row_start in range(0, grid['nrows'], STRIP_ROWS):
+                nrows = min(STRIP_ROWS, grid['nrows'] - row_start)
+                stack = np.full((len(stacked), nrows * ncols), np.nan, dtype=np.float32)
+                for i, (cells, values) in enumerate(stacked):
+                    bounds = np.searchsorted(cells, [row_start * ncols, (row_start + nrows) * ncols])
+                    stack[i, cells[bounds[0]:bounds[1]] - row_start * ncols] = values[bounds[0]:bounds[1]]
+                result[row_start * ncols:(row_start + nrows) * ncols] = nanpercentile_select(stack, PERCENTILE)
+                cells_processed += stack.size
+            save_values(work_dir, 's7', 'dep_percentile_{}_{}_{}.npy'.format(PERCENTILE, response_variable, element),
+                        result)
+    return cells_processed
+
+
+def bench_s7_signature(inputs_dir, work_dir, grid):
+    """
+    s7 with the percentile calculated once per distinct set of species present at a cell, from the
+    level of each species (read from the first value of its s9 output).
+    """
+    ranges = list(horn_species(work_dir, grid))
+    ncols = grid['ncols']
+    cells_processed = 0
+    for element in ELEMENTS:
+        for response_variable in RESPONSE_VARIABLES:
+            species = []
+            for code, species_range, _ in ranges:
+                level_path = output_path(work_dir, 's9', 's{}_{}_{}.npy'.format(code, element, response_variable))
+                if os.path.exists(level_path) and len(species_range):
+                    species.append((species_range, window_offset(species_range, grid),
+                                    np.load(level_path, mmap_mode='r')[0]))
+            if not species:
+                continue
+            cache = SignatureCache([level for _, _, level in species],
+                                   lambda stack: nanpercentile_select(stack, PERCENTILE))
+            result = np.empty(grid['nrows'] * ncols, dtype=np.float32)
+            for row_start in range(0, grid['nrows'], STRIP_ROWS):
+                nrows = min(STRIP_ROWS, grid['nrows'] - row_start)
+                species_cells = [strip_cells(species_range, offset, row_start, nrows, ncols)
+                                 for species_range, offset, _ in species]
+                index = cache.index(cache.presence(species_cells, nrows * ncols))
+                result[row_start * ncols:(row_start + nrows) * ncols] = cache.scatter(index)
+                cells_processed += index.size
+            save_values(work_dir, 's7_signature',
+                        'dep_percentile_{}_{}_{}.npy'.format(PERCENTILE, response_variable, element), result)
+    return cells_processed
+
+
+def bench_scenarios(inputs_dir, work_dir, grid, scales, stage):
+    """
+    Exceedance count, exceeded proportion, basal area weighted effect and PERCENTILE-th percentile of
+    the effects across species for every N deposition scale at once, a strip of rows at a time.
+    """
+    species_params = load_species_params(inputs_dir, RESPONSE_VARIABLES)
+    tdep = load_tdep(inputs_dir, 'n', TDEP_PERIOD).ravel().astype(np.float64)
+    ranges = [(code, species_range, window_offset(species_range, grid))
+              for code, species_range, _ in horn_species(work_dir, grid) if len(species_range)]
+    ncols = grid['ncols']
+    cells_processed = 0
+    for response_variable in RESPONSE_VARIABLES:
+        species = [(species_range, offset, species_params[response_variable].curve_params(code, 'n'))
+                   for code, species_range, offset in ranges
+                   if species_params[response_variable].has_critical_load(code, 'n')]
+        results = {}
+        for row_start in range(0, grid['nrows'], STRIP_ROWS):
+            nrows = min(STRIP_ROWS, grid['nrows'] - row_start)
+            baseline = tdep[row_start * ncols:(row_start + nrows) * ncols]
+            dep = np.vstack([baseline * scale for scale in scales])
+            for aggregate, values in scenario_aggregates(dep, species, row_start, nrows, ncols, response_variable,
+                                                         q=PERCENTILE).items():
+                results.setdefault(aggregate, []).append(values)
+        cells_processed += len(scales) * sum(len(species_range) for species_range, _, _ in species)
+        for aggregate, values in results.items():
+            for i, row in enumerate(np.hstack(values)):
+                save_values(work_dir, stage, '{}_{}_n_{}.npy'.format(aggregate, response_variable, i), row)
+    return cells_processed
+
+
+def bench_scenario_1(inputs_dir, work_dir, grid):
+    """
+    Scenario aggregates of the TDep N deposition alone.
+    """
+    return bench_scenarios(inputs_dir, work_dir, grid, SCENARIO_SCALES[:1], 'scenario_1')
+
+
+def bench_scenarios_10(inputs_dir, work_dir, grid):
+    """
+    Scenario aggregates of 10 scales of the TDep N deposition, in the same pass.
+    """
+    return bench_scenarios(inputs_dir, work_dir, grid, SCENARIO_SCALES, 'scenarios_10')
+
+
+# Stage -> benchmark function
+BENCHMARKS = {
+    's2': bench_s2, 's3': bench_s3, 's4': bench_s4, 's5': bench_s5,
+    's6': bench_s6, 's6_lookup': bench_s6_lookup, 's8': bench_s8, 's9': bench_s9, 's7': bench_s7,
+    's7_signature': bench_s7_signature, 'scenario_1': bench_scenario_1, 'scenarios_10': bench_scenarios_10,
+}
+
+
+def code_commit():
+    """
+    Git commit of the scripts folder, or None if it is not a git checkout.
+    """
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=SCRIPT_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(work_dir, nrows, ncols, n_species, seed=0, cell_size=250.0, stages=None, repeat=3,
+                   results_path=None, label=None):
+    """
+    Generate (or re-use) the synthetic inputs in work_dir/inputs and time the benchmark of each stage.
+
+    stages: stages to time (see STAGE_ORDER), default all
+    repeat: times each benchmark is run; the fastest run is the headline time
+    results_path: JSON file the results are saved to, default work_dir/benchmark_results.json
+    label: name of the version being measured, saved with the results (e.g., a branch name)
+
+    Returns the results: {'meta': grid, seed and versions, 'benchmarks': stage -> {'seconds': every run,
+    'min_s', 'median_s', 'cpu_s', 'peak_rss_mb', 'cells', 'cells_per_s'}}.
+    """
+    stages = stages or STAGE_ORDER
+    unknown = set(stages) - set(STAGE_ORDER)
+    if unknown:
+        raise ValueError('Unknown stages {}; choose from {}'.format(sorted(unknown), STAGE_ORDER))
+    inputs_dir = os.path.join(work_dir, 'inputs')
+    grid = generate_inputs(inputs_dir, nrows, ncols, n_species, seed, cell_size)
+
+    results = {'meta': {'label': label, 'commit': code_commit(), 'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                        'python': platform.python_version(), 'numpy': np.__version__,
+                        'platform': platform.platform(), 'repeat': repeat,
+                        'grid': {key: grid[key] for key in ['nrows', 'ncols', 'n_species', 'seed', 'cell_size']},
+                        'horn_species': len(grid['horn_species'])},
+               'benchmarks': {}}
+    done = set()
+
+    def run_needed(stage):
+        # Outputs of the stages a benchmark reads, made once and untimed if that stage was not selected
+        for needed in STAGE_NEEDS[stage]:
+            if needed not in done:
+                run_needed(needed)
+                print('Preparing', needed, 'outputs for', stage)
+                BENCHMARKS[needed](inputs_dir, work_dir, grid)
+                done.add(needed)
+
+    for stage in [stage for stage in STAGE_ORDER if stage in stages]:
+        run_needed(stage)
+        runs = []
+        for _ in range(repeat):
+            with profile_unit() as unit:
+                cells = BENCHMARKS[stage](inputs_dir, work_dir, grid)
+            runs.append(unit)
+        done.add(stage)
+        seconds = [run['wall_s'] for run in runs]
+        peaks = [run['peak_rss'] for run in runs if run['peak_rss'] is not None]
+        results['benchmarks'][stage] = {
+            'seconds': seconds, 'min_s': min(seconds), 'median_s': float(np.median(seconds)),
+            'cpu_s': min(run['cpu_s'] for run in runs), 'peak_rss_mb': max(peaks) / 1024 ** 2 if peaks else None,
+            'cells': cells, 'cells_per_s': cells / min(seconds) if min(seconds) > 0 else None}
+        print('{:<4} {:8.2f} s (median {:.2f} s) {:>15,} cells'.format(stage, min(seconds), np.median(seconds), cells))
+
+    results_path = results_path or os.path.join(work_dir, 'benchmark_results.json')
+    with open(results_path, 'w') as f:
+        json.dump(results, f, indent=1)
+    print('Results saved to', results_path)
+    return results
+
+
+def compare_results(baseline_path, results_path, tolerance=TOLERANCE):
+    """
+    Compare the fastest time of each stage between two result files of the same grid and seed and print
+    the ratio (results / baseline). Returns the stages that were slower by more than the tolerance.
+    """
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    with open(results_path) as f:
+        results = json.load(f)
+    if baseline['meta']['grid'] != results['meta']['grid']:
+        raise ValueError('Results are for different grids: {} and {}'.format(baseline['meta']['grid'],
+                                                                             results['meta']['grid']))
+    print('Baseline:', baseline['meta']['label'] or '', baseline['meta']['commit'] or '', baseline['meta']['date'])
+    print('Results: ', results['meta']['label'] or '', results['meta']['commit'] or '', results['meta']['date'])
+    slower = []
+    for stage in STAGE_ORDER:
+        if stage not in baseline['benchmarks'] or stage not in results['benchmarks']:
+            continue
+        before, after = baseline['benchmarks'][stage]['min_s'], results['benchmarks'][stage]['min_s']
+        ratio = after / before if before > 0 else float('inf')
+        if ratio > 1 + tolerance:
+            change = 'SLOWER'
+            slower.append(stage)
+        elif ratio < 1 - tolerance:
+            change = 'faster'
+        else:
+            change = ''
+        print('{:<4} {:8.2f} s -> {:8.2f} s  x{:.2f} {}'.format(stage, before, after, ratio, change))
+    return slower
+
@@ -0,0 +1,53 @@
+"""
+#### Script Information ####
+
+Script name: calculate_tree_effects.py
+
+Purpose of script: Calculate the growth and survival effects of N and S deposition for every FIA tree
+    and every TDep year (2000-2019 and the 3-year periods), plus the domain of the response curve.
+    Python equivalent of the effect section of r/calculate_effects.R: all endpoints and years are
+    calculated as one array operation per chunk of trees, so the run takes minutes instead of a
+    long R session, and RAM usage is set by chunk_rows rather than the size of the tree table.
+    The species and state summary tables are still made by r/calculate_effects.R.
+
+Placement in script series: Tree-level (FIA) analysis, replaces the effect section of calculate_effects.R
+Outputs needed from: tree_characteristic_deposition.csv (figshare+ repository)
+
+Date Created: 2026-10-18
+
+"""
+
+# Import the necessary modules
+import os
+import timeit
+
+# Vectorized tree-level effects, see tree_effects.py and response_curves.py
+from tree_effects import TDEP_SUFFIXES, calculate_tree_effects
+
+# Set path to the folder with tree_characteristic_deposition.csv
+file_dir = <'Insert process_files directory here'>
+
+# Input and output tables
+tree_dep_csv_path = os.path.join(file_dir, 'tree_characteristic_deposition.csv')
+tree_effects_csv_path = os.path.join(file_dir, 'tree_level_effects_2000_2019.csv')
+
+# TDep year suffixes and number of trees processed at a time
+suffixes = TDEP_SUFFIXES
+chunk_rows = 100000
+
+# Effects looked up from a table of each species' response curve, starting at this deposition step
+# and refined until within lookup_tolerance of the exact effect; None evaluates the exact formula,
+# as calculate_effects.R does
+lookup_step = None
+lookup_tolerance = 1e-4
+
+# Record start time
+start_time = timeit.default_timer()
+
+# Begin the tree-level effect calculation
+n_trees = calculate_tree_effects(tree_dep_csv_path, tree_effects_csv_path, suffixes, chunk_rows, lookup_step,
+                                 lookup_tolerance)
+
+# Calculate time elapsed and print
+elapsed_min = (timeit.default_timer() - start_time) / 60
+print('Calculating effects for', n_trees, 'trees took ', elapsed_min, 'minutes')
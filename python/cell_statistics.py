@@ -0,0 +1,266 @@
+"""
+#### Module Information ####
+
+Module name: cell_statistics.py
+
+Purpose of module: Per-cell percentiles across a stack of species rasters (e.g., the 5th percentile
+    of all species' effects), similar to the ArcGIS Cell Statistics tool but able to process
+    percentiles. Rasters are streamed in full-width row blocks across all species, so peak memory
+    is set by a memory budget rather than by the size of the grid. Percentiles are found by
+    selection (np.partition) on the valid values of each cell instead of a full NaN-aware sort.
+
+    When each species has one value over its whole range (the deposition levels of s9a/s9b), the
+    percentile at a cell only depends on which species are present there. signature_percentile_raster
+    packs the species present at each cell into bits (its presence signature), gives each distinct
+    signature an index, and calculates the percentile once per signature (SignatureCache); the values
+    are then scattered back to the cells through the index. A forest has far fewer species combinations
+    than cells, so the percentile is calculated a few thousand times instead of once per cell.
+
+Used by: s7_calculate_summary_rasters.py, benchmarks.py, presence_index.py, deposition_scenarios.py
+
+Date Created: 2026-10-18
+
+"""
+
+# Import the necessary modules
+import numpy as np
+
+import raster_blocks
+from raster_blocks import block_to_raster, iter_blocks, mosaic_blocks
+from run_profile import count_cells
+
+# Default memory budget for one block of the species stack, in MB
+MEMORY_BUDGET_MB = 4096
+
+
+def rows_for_budget(n_rasters, ncols, memory_budget_mb=MEMORY_BUDGET_MB):
+    """
+    Number of full-width rows per block so that the species stack and the working copy made by the
+    partition fit in the memory budget (float32 stack, about 3 copies at peak).
+    """
+    bytes_per_row = max(n_rasters, 1) * ncols * np.dtype(np.float32).itemsize * 3
+    return max(1, int(memory_budget_mb * 1024 ** 2 // bytes_per_row))
+
+
+def nanpercentile_select(stack, q):
+    """
+    Percentile q (0-100) of each column of a 2D stack (rasters x cells), ignoring NaN.
+
+    Gives the same result as np.nanpercentile(stack, q, axis=0) with linear interpolation. Cells are
+    grouped by how many rasters have data there; within a group the two order statistics needed for
+    the interpolation are found with np.partition. The stack is modified in place (NaN set to inf).
+    """
+    valid_count = np.count_nonzero(~np.isnan(stack), axis=0)
+    stack[np.isnan(stack)] = np.inf
+    out = np.full(stack.shape[1], np.nan, dtype=np.float64)
+    for n in np.unique(valid_count):
+        if n == 0:
+            continue
+        cells = np.flatnonzero(valid_count == n)
+        # Position of the percentile among the n valid values, as used by np.percentile
+        position = q / 100.0 * (n - 1)
+        low = int(np.floor(position))
+        high = min(low + 1, n - 1)
+        part = np.partition(stack[:, cells], (low, high) if high != low else low, axis=0)
+        fraction = position - low
+        out[cells] = part[low] + fraction * (part[high] - part[low]) if fraction else part[low]
+    return out
+
+
+def percentile_raster(rasters, q, out_raster_save_path, template=None, memory_budget_mb=MEMORY_BUDGET_MB):
+    """
+    Save the per-cell percentile q (0-100) across the rasters, ignoring NoData.
+
+    rasters: list of raster paths on the same grid
+    out_raster_save_path: path of the output raster
+    template: raster that sets the extent and cell size; defaults to the first raster. Species
+        rasters only cover their range, so the national forest raster is a safer template.
+    memory_budget_mb: memory allowed for one block of the stack; sets the number of rows per block
+    """
+    import arcpy as ap
+
+    if not rasters:
+        raise ValueError('No rasters to calculate the percentile of for {}'.format(out_raster_save_path))
+    template = ap.Raster(template or rasters[0])
+    block_rows = rows_for_budget(len(rasters), template.width, memory_budget_mb)
+    print('Processing', len(rasters), 'rasters in blocks of', block_rows, 'rows')
+
+    block_rasters = []
+    stack = None
+    for lower_left, ncols, nrows in iter_blocks(template, block_rows, template.width):
+        # Reuse the same stack buffer for every full-size block
+        if stack is None or stack.shape[1] != nrows * ncols:
+            stack = np.empty((len(rasters), nrows * ncols), dtype=np.float32)
+        for i, raster in enumerate(rasters):
+            stack[i] = ap.RasterToNumPyArray(raster, lower_left, ncols, nrows, nodata_to_value=np.nan).ravel()
+        raster_blocks.IO_BYTES['read'] += stack.nbytes
+        result = nanpercentile_select(stack, q).reshape(nrows, ncols)
+        count_cells(stack.size)
+        if not np.isnan(result).all():
+            block_rasters.append(block_to_raster(result, lower_left, template))
+
+    mosaic_blocks(block_rasters, out_raster_save_path, template)
+    return out_raster_save_path
+
+
+def strip_slice(species_range, offset, row_start, nrows):
+    """
+    Slice of a species' cells (of its indices and values) that fall within a full-width strip of a grid.
+
+    offset: (row, col) of the upper left cell of the species' window on the grid
+    row_start, nrows: rows of the grid covered by the strip
+    """
+    row0 = offset[0]
+    first, last = max(row_start - row0, 0), min(row_start + nrows - row0, species_range.nrows)
+    if first >= last:
+        return slice(0, 0)
+    # The indices are sorted, so the cells of the strip are a contiguous slice
+    bounds = np.searchsorted(species_range.indices, [first * species_range.ncols, last * species_range.ncols])
+    return slice(int(bounds[0]), int(bounds[1]))
+
+
+def strip_cells(species_range, offset, row_start, nrows, ncols, cells=None):
+    """
+    Flat indices of a species' cells within a full-width strip of a grid.
+
+    offset: (row, col) of the upper left cell of the species' window on the grid
+    row_start, nrows: rows of the grid covered by the strip; ncols: columns of the grid
+    cells: strip_slice of the species for the strip, if already found
+    """
+    row0, col0 = offset
+    cells = strip_slice(species_range, offset, row_start, nrows) if cells is None else cells
+    rows, cols = np.divmod(species_range.indices[cells].astype(np.int64), species_range.ncols)
+    return (rows + row0 - row_start) * ncols + cols + col0
+
+
+class SignatureCache(object):
+    """
+    Statistic of per-species constants, calculated once per distinct set of species present.
+
+    levels: value of each species over its whole range; species with a NaN value count as absent
+    statistic: function of a 2D stack (species x signatures) of the levels, NaN where a species is not
+        in the signature, giving the statistic of each column, e.g., nanpercentile_select
+    n_words: uint64 words of each presence signature, one bit per species
+    values: statistic of each signature, by signature index
+    """
+
+    def __init__(self, levels, statistic):
+        self.levels = np.asarray(levels, dtype=np.float64)
+        self.statistic = statistic
+        self.n_words = max(1, (len(self.levels) + 63) // 64)
+        self.values = np.empty(0, dtype=np.float64)
+        self._index = {} # Signature bytes -> signature index
+
+    def __len__(self):
+        return len(self.values)
+
+    def presence(self, species_cells, n_cells):
+        """
+        Presence signature of each cell, as an (n_cells x n_words) uint64 array.
+        species_cells: flat indices of the cells of each species, in the order of levels
+        """
+        words = np.zeros((n_cells, self.n_words), dtype=np.uint64)
+        for i, cells in enumerate(species_cells):
+            if len(cells) and not np.isnan(self.levels[i]):
+                words[cells, i // 64] |= np.uint64(1) << np.uint64(i % 64)
+        return words
+
+    def index(self, words):
+        """
+        Signature index of each cell, -1 where no species is present. The statistic is calculated for
+        signatures not seen before.
+        """
+        index = np.full(len(words), -1, dtype=np.int64)
+        present = np.flatnonzero(words.any(axis=1))
+        if not present.size:
+            return index
+        rows = words[present]
+        # Neighbouring cells mostly hold the same species, so only the first cell of each run of equal
+        # signatures is looked up
+        starts = np.flatnonzero(np.concatenate([[True], (rows[1:] != rows[:-1]).any(axis=1)]))
+        runs = rows[starts]
+        # Distinct signatures of the runs, sorted by their words (faster than np.unique on rows)
+        order = np.lexsort(runs.T[::-1])
+        runs = runs[order]
+        first = np.concatenate([[True], (runs[1:] != runs[:-1]).any(axis=1)])
+        inverse = np.empty(len(runs), dtype=np.int64)
+        inverse[order] = np.cumsum(first) - 1
+        keys = [signature.tobytes() for signature in runs[first]]
+        new = [key for key in keys if key not in self._index]
+        if new:
+            for key in new:
+                self._index[key] = len(self._index)
+            members = self.members(np.frombuffer(b''.join(new), dtype=np.uint64).reshape(len(new), self.n_words))
+            stack = np.where(members.T, self.levels[:, None], np.nan).astype(np.float32)
+            self.values = np.concatenate([self.values, self.statistic(stack)])
+        ids = np.array([self._index[key] for key in keys], dtype=np.int64)
+        index[present] = np.repeat(ids[inverse], np.diff(np.append(starts, len(rows))))
+        return index
+
+    def members(self, words):
+        """
+        Boolean (signatures x species) array of the species in each signature (rows of words).
+        """
+        species = np.arange(len(self.levels))
+        return ((words[:, species // 64] >> (species % 64).astype(np.uint64)) & np.uint64(1)).astype(bool)
+
+    def scatter(self, index):
+        """
+        Statistic at each cell from its signature index, NaN where no species is present.
+        """
+        return np.append(self.values, np.nan)[index]
+
+
+def signature_percentile_raster(species_ranges, levels, q, out_raster_save_path, template,
+                                memory_budget_mb=MEMORY_BUDGET_MB, index_raster_save_path=None):
+    """
+    Save the per-cell percentile q (0-100) across species that each have one value over their whole
+    range (e.g., the deposition levels of s9a/s9b), calculated once per distinct set of species present
+    (see SignatureCache). Gives the same result as percentile_raster on the rasters of the levels,
+    without writing or reading them.
+
+    species_ranges: SpeciesRange of each species, on the grid of the template
+    levels: value of each species over its range
+    template: raster that sets the extent and cell size (the national forest raster)
+    memory_budget_mb: memory allowed for the signatures of one strip; sets the number of rows per strip
+    index_raster_save_path: optional path to also save the signature index of every cell as a 32-bit
+        integer raster (NoData where no species is present)
+    Returns the SignatureCache, with the percentile of every signature index.
+    """
+    import arcpy as ap
+
+    template = ap.Raster(template)
+    extent = template.extent
+    cell_width, cell_height = template.meanCellWidth, template.meanCellHeight
+    offsets = [(int(round((extent.YMax - species_range.y_max) / cell_height)),
+                int(round((species_range.x_min - extent.XMin) / cell_width))) for species_range in species_ranges]
+    cache = SignatureCache(np.asarray(levels, dtype=np.float32), lambda stack: nanpercentile_select(stack, q))
+    # Signatures, their sorted copy and the index of every cell of a strip
+    bytes_per_row = template.width * (8 * cache.n_words * 3 + 8 * 2)
+    block_rows = max(1, int(memory_budget_mb * 1024 ** 2 // bytes_per_row))
+    print('Processing', len(species_ranges), 'species in strips of', block_rows, 'rows')
+
+    block_rasters = []
+    index_rasters = []
+    for row_start in range(0, template.height, block_rows):
+        nrows = min(block_rows, template.height - row_start)
+        species_cells = [strip_cells(species_range, offset, row_start, nrows, template.width)
+                         for species_range, offset in zip(species_ranges, offsets)]
+        index = cache.index(cache.presence(species_cells, nrows * template.width))
+        count_cells(index.size)
+        if (index < 0).all():
+            continue
+        result = cache.scatter(index).reshape(nrows, template.width)
+        lower_left = ap.Point(extent.XMin, extent.YMax - (row_start + nrows) * cell_height)
+        block_rasters.append(block_to_raster(result, lower_left, template))
+        if index_raster_save_path:
+            # Written as integers (-1 for no species), since float32 only holds integers exactly up to 2^24
+            index_rasters.append(block_to_raster(index.reshape(nrows, template.width), lower_left, template,
+                                                 nodata=-1))
+
+    mosaic_blocks(block_rasters, out_raster_save_path, template)
+    if index_raster_save_path:
+        mosaic_blocks(index_rasters, index_raster_save_path, template, '32_BIT_SIGNED')
+    print('Percentile of', len(species_ranges), 'species found for', len(cache), 'distinct sets of species present')
+    return cache
+
@@ -0,0 +1,475 @@
+"""
+#### Module Information ####
+
+Module name: deposition_scenarios.py
+
+Purpose of module: Deposition scenarios ("what if N deposition drops 10/20/30/50%") evaluated for every
+    species, element and endpoint in one batched pass. Each scenario transforms the TDep deposition:
+    a uniform scale, a scale per region (a zone raster, or polygons such as states) and/or a substitute
+    deposition raster. Running s5 - s8 and s7 once per scenario on a scaled TDep raster reads every
+    species' proportion raster and writes every species' outputs again for each scenario; here the
+    species' ranges are loaded once (spp_ranges, see species_ranges.py), the deposition of every
+    scenario is read once per strip of rows as a (scenarios x cells) array, and each species' cells are
+    evaluated for all scenarios at once. Only the aggregate rasters across species are written, so a
+    10-scenario study costs one read of the inputs plus the arithmetic of 10 scenarios.
+
+    Aggregates of each scenario, endpoint and element (one gdb per scenario, scenario_{name}.gdb):
+        exceedance_count: number of species where the deposition is at or above the critical load
+        exceeded_proportion: basal area proportion of the species in exceedance
+        ba_weighted_effect: sum of the species' basal area proportion times their effect (s8 summed
+            over species)
+        effect_percentile: percentile across species of the effects (e.g., the 5th, as in s7)
+
+    Scenario outputs are recorded in the run manifest with a key of the scenario, TDep, ranges,
+    parameters and code (see run_manifest.py), so a re-run only calculates the scenarios that changed
+    or were added. Zonal tables of every scenario raster are made with zonal_statistics.py.
+
+Used by: s11_deposition_scenarios.py, benchmarks.py
+
+Date Created: 2026-10-18
+
+"""
+
+# Import the necessary modules
+import os
+import numpy as np
+
+from cell_statistics import strip_cells, strip_slice
+from raster_blocks import align_to_template, block_to_raster, mosaic_blocks, read_block
+from response_curves import effect
+from run_manifest import RunManifest, code_version, hash_parts, prepare_tdep
+from run_profile import count_cells, profile_unit, start_profile
+from species_params import load_species_params, species_to_process
+from species_ranges import load_species_range
+from zonal_statistics import MEMORY_BUDGET_MB, rasterize_zones, tidy_columns, write_csv, zonal_statistics, zone_layer
+
+# Aggregates across species calculated for every scenario
+AGGREGATES = ['exceedance_count', 'exceeded_proportion', 'ba_weighted_effect', 'effect_percentile']
+
+# Default percentile of the effects across species
+PERCENTILE = 5
+
+# Output gdb of a scenario and raster name of an aggregate, formatted with the scenario name, aggregate,
+# percentile (q), response variable (rv) and element (e)
+SCENARIO_GDB_NAME = 'scenario_{}.gdb'
+AGGREGATE_NAMES = {
+    'exceedance_count': 'exceedance_count_{rv}_{e}',
+    'exceeded_proportion': 'exceeded_proportion_{rv}_{e}',
+    'ba_weighted_effect': 'ba_weighted_effect_{rv}_{e}',
+    'effect_percentile': 'effect_percentile_{q}_{rv}_{e}',
+}
+
+
+class DepositionScenario(object):
+    """
+    One deposition scenario: the TDep deposition of each element, replaced by a substitute raster where
+    one is given, times a uniform scale and a scale per region.
+
+    name: name of the scenario, e.g., 'n_minus_20'; outputs are saved to scenario_{name}.gdb
+    scale: uniform factor, e.g., 0.8 for a 20% reduction
+    regions: zone raster on the grid of the species (integer region codes), or [polygon feature class,
+        key field], e.g., ['C:/gis/states.shp', 'STUSPS'], rasterized once (see zonal_statistics.py)
+    region_scales: dict of region -> factor, by region code of the zone raster or key field value of the
+        polygons, e.g., {'CA': 0.7, 'NY': 0.8}; other regions keep a factor of 1
+    rasters: dict of element -> substitute deposition raster (kg/ha/yr), e.g., a modelled 2030 deposition
+    elements: elements the scales apply to, e.g., ['n']; defaults to every element
+    A scenario without any of these is the TDep deposition as it is (the baseline).
+    """
+
+    def __init__(self, name, scale=1.0, regions=None, region_scales=None, rasters=None, elements=None):
+        self.name = name
+        self.scale = float(scale)
+        self.regions = regions
+        self.region_scales = {str(region): float(factor) for region, factor in (region_scales or {}).items()}
+        self.rasters = dict(rasters or {})
+        self.elements = elements
+        self.aligned = {} # Element -> substitute raster aligned to the species grid, set by prepare()
+        self.input_hashes = {}
+        self._region_raster = None
+        self._region_factors = None
+
+    @classmethod
+    def from_setting(cls, name, setting):
+        """
+        Scenario from one entry of the scenarios setting of s11, a dict of the arguments above, e.g.,
+        {'scale': 0.8, 'elements': ['n']}.
+        """
+        unknown = set(setting) - {'scale', 'regions', 'region_scales', 'rasters', 'elements'}
+        if unknown:
+            raise ValueError('Unknown settings {} of scenario {}'.format(sorted(unknown), name))
+        return cls(name, **setting)
+
+    def setting(self):
+        """
+        Arguments of the scenario, for its manifest key.
+        """
+        return dict(scale=self.scale, regions=self.regions, region_scales=self.region_scales,
+                    rasters=self.rasters, elements=self.elements)
+
+    def scales(self, element):
+        """
+        True if the scales apply to the element.
+        """
+        return self.elements is None or element in self.elements
+
+    def prepare(self, out_dir, template, manifest):
+        """
+        Align the substitute rasters and the region raster to the grid of the template (a proportion
+        raster) in Scratch.gdb, or rasterize the region polygons, once, and hash the substitutes.
+        """
+        import arcpy as ap
+
+        scratch_gdb_path = os.path.join(out_dir, 'Scratch.gdb')
+        if not ap.Exists(scratch_gdb_path):
+            ap.CreateFileGDB_management(out_dir, 'Scratch.gdb')
+        for element, raster in self.rasters.items():
+            aligned_path = os.path.join(scratch_gdb_path, 'scenario_{}_{}_aligned'.format(self.name, element))
+            self.input_hashes[element] = manifest.input_hash(raster)
+            if raster in manifest.changed_inputs and ap.Exists(aligned_path):
+                ap.management.Delete(aligned_path) # Re-align a substitute raster that was replaced
+            self.aligned[element] = align_to_template(raster, template, aligned_path)
+
+        if self.regions is None:
+            return
+        if isinstance(self.regions, str):
+            # Region codes of a zone raster
+            aligned_path = os.path.join(scratch_gdb_path, 'scenario_{}_regions_aligned'.format(self.name))
+            self.input_hashes['regions'] = manifest.input_hash(self.regions)
+            if self.regions in manifest.changed_inputs and ap.Exists(aligned_path):
+                ap.management.Delete(aligned_path)
+            self._region_raster = align_to_template(self.regions, template, aligned_path)
+            factors = {int(float(region)): factor for region, factor in self.region_scales.items()}
+        else:
+            # Polygons rasterized once, with the key field of each zone
+            self._region_raster, keys = rasterize_zones(self.regions[0], [self.regions[1]], template, out_dir,
+                                                        'scenario_{}'.format(self.name))
+            factors = {zone: self.region_scales[str(key[0])] for zone, key in keys.items()
+                       if str(key[0]) in self.region_scales}
+        # Factor of every zone label, plus a factor of 1 (last) for cells outside the listed regions
+        size = max(factors, default=-1) + 1
+        self._region_factors = np.ones(size + 1)
+        for zone, factor in factors.items():
+            if zone >= 0:
+                self._region_factors[zone] = factor
+
+    def region_factor(self, lower_left, ncols, nrows):
+        """
+        Factor of the regions at each cell of a full-width strip, 1 outside the listed regions.
+        """
+        codes = read_block(self._region_raster, lower_left, ncols, nrows).ravel()
+        outside = len(self._region_factors) - 1
+        valid = ~np.isnan(codes) & (codes >= 0) & (codes < outside)
+        zones = np.full(codes.shape, outside, dtype=np.int64)
+        zones[valid] = codes[valid].astype(np.int64)
+        return self._region_factors[zones]
+
+    def deposition(self, element, baseline, lower_left, ncols, nrows):
+        """
+        Deposition of the scenario at the cells of a full-width strip, from the TDep values of the
+        strip (baseline) and the scenario's rasters.
+        """
+        if element in self.aligned:
+            dep = read_block(self.aligned[element], lower_left, ncols, nrows).ravel()
+        else:
+            dep = baseline.copy()
+        if self.scales(element):
+            dep *= self.scale
+            if self._region_raster is not None:
+                dep *= self.region_factor(lower_left, ncols, nrows)
+        return dep
+
+
+def scenario_aggregates(dep, species, row_start, nrows, ncols, response_variable, aggregates=None,
+                        q=PERCENTILE):
+    """
+    Aggregates across species of one full-width strip for every scenario at once.
+
+    dep: (scenarios x cells) deposition of the strip
+    species: list of (SpeciesRange, offset, CurveParams) of the species with a critical load for the
+        response variable and element; offset is the (row, col) of the species' window on the grid.
+        Species missing n2/s2 or min_n/min_s count towards the exceedances only, as in s5
+    row_start, nrows, ncols: rows of the grid covered by the strip, and columns of the grid
+    aggregates: aggregates to calculate (see AGGREGATES), default all
+    q: percentile (0-100) of the effects across species
+    Returns a dict of aggregate -> (scenarios x cells) array with NaN where no species is present (or,
+    for the effects, where no species has an effect).
+    """
+    aggregates = AGGREGATES if aggregates is None else aggregates
+    n_scenarios, n_cells = dep.shape
+    percentile = 'effect_percentile' in aggregates
+    exceedance = 'exceedance_count' in aggregates or 'exceeded_proportion' in aggregates
+    effects = percentile or 'ba_weighted_effect' in aggregates
+
+    # Cells of each species in the strip; the totals are kept for the cells with any species only
+    species_cells = []
+    present = np.zeros(n_cells, dtype=bool)
+    for species_range, offset, params in species:
+        sl = strip_slice(species_range, offset, row_start, nrows)
+        cells = strip_cells(species_range, offset, row_start, nrows, ncols, sl)
+        present[cells] = True
+        species_cells.append((sl, cells))
+    live = np.flatnonzero(present)
+    position = np.cumsum(present) - 1
+    dep = dep[:, live]
+    n_live = len(live)
+
+    exceeded_count = np.zeros((n_scenarios, n_live), dtype=np.float64)
+    exceeded_proportion = np.zeros((n_scenarios, n_live), dtype=np.float64)
+    weighted = np.zeros((n_scenarios, n_live), dtype=np.float64)
+    effect_count = np.zeros((n_scenarios, n_live), dtype=np.int32)
+    effect_cells, effect_values = [], [] # Effects of every species for the percentile
+    for (species_range, offset, params), (sl, cells) in zip(species, species_cells):
+        if not len(cells):
+            continue
+        cells = position[cells]
+        proportion = species_range.values[sl].astype(np.float64)
+        species_dep = dep[:, cells]
+        if exceedance:
+            # Deposition >= critical load at cells with basal area, as in s5
+            exceeded = np.greater_equal(species_dep, params.cl1) & (proportion != 0)
+            exceeded_count[:, cells] += exceeded
+            exceeded_proportion[:, cells] += np.where(exceeded, proportion, 0.0)
+        if effects and not np.isnan([params.cl2, params.min_dep]).any():
+            # NaN below min_dep, as in s6a/s6b
+            species_effect = effect(species_dep, params, response_variable)
+            valid = ~np.isnan(species_effect)
+            weighted[:, cells] += np.where(valid, proportion * species_effect, 0.0)
+            effect_count[:, cells] += valid
+            if percentile:
+                effect_cells.append(cells)
+                effect_values.append(species_effect.astype(np.float32))
+        count_cells(species_dep.size)
+
+    def expand(values):
+        out = np.full((n_scenarios, n_cells), np.nan)
+        out[:, live] = values
+        return out
+
+    results = {}
+    if 'exceedance_count' in aggregates:
+        results['exceedance_count'] = expand(exceeded_count)
+    if 'exceeded_proportion' in aggregates:
+        results['exceeded_proportion'] = expand(exceeded_proportion)
+    if 'ba_weighted_effect' in aggregates:
+        results['ba_weighted_effect'] = expand(np.where(effect_count > 0, weighted, np.nan))
+    if percentile:
+        results['effect_percentile'] = expand(grouped_percentile(effect_cells, effect_values, n_live, q))
+    return results
+
+
+def grouped_percentile(species_cells, species_values, n_cells, q):
+    """
+    Percentile q (0-100) across species at each cell for every scenario, ignoring NaN, from the values of
+    each species at its cells only. Gives the same result as cell_statistics.nanpercentile_select on the
+    (species x cells) stack of each scenario, from one sort of the (scenario, cell, value) triples
+    instead of a stack that is mostly NaN where few species overlap.
+
+    species_cells: cells of each species; species_values: (scenarios x cells) float32 values of each species
+    Returns a (scenarios x n_cells) array, NaN where no species has a value.
+    """
+    n_scenarios = species_values[0].shape[0] if species_values else 0
+    out = np.full((n_scenarios, n_cells), np.nan)
+    if not species_values:
+        return out
+    values = np.concatenate(species_values, axis=1)
+    groups = np.concatenate(species_cells)[None, :] + (np.arange(n_scenarios, dtype=np.int64) * n_cells)[:, None]
+    valid = ~np.isnan(values)
+    values, groups = values[valid], groups[valid]
+    # One sort of uint64 keys: the group in the high 32 bits and the float32 value in the low 32 bits, with
+    # its bits flipped so that unsigned order is numeric order (much faster than np.lexsort)
+    bits = values.view(np.uint32)
+    bits = bits ^ np.where(bits >> np.uint32(31), np.uint32(0xFFFFFFFF), np.uint32(0x80000000))
+    keys = np.sort((groups.astype(np.uint64) << np.uint64(32)) | bits.astype(np.uint64))
+    bits = (keys & np.uint64(0xFFFFFFFF)).astype(np.uint32)
+    values = (bits ^ np.where(bits >> np.uint32(31), np.uint32(0x80000000), np.uint32(0xFFFFFFFF))).view(np.float32)
+    counts = np.bincount(groups, minlength=n_scenarios * n_cells)
+    has = np.flatnonzero(counts)
+    n = counts[has]
+    starts = np.cumsum(counts)[has] - n
+    # Positions of the two order statistics, as used by np.percentile (linear interpolation)
+    position = q / 100.0 * (n - 1)
+    low = np.floor(position).astype(np.int64)
+    high = np.minimum(low + 1, n - 1)
+    fraction = position - low
+    low_values = values[starts + low]
+    # The difference is taken in float32 and the interpolation in float64, as in nanpercentile_select
+    difference = (values[starts + high] - low_values).astype(np.float64)
+    out.ravel()[has] = np.where(fraction != 0, low_values + fraction * difference, low_values)
+    return out
+
+
+def scenario_raster_path(out_dir, scenario_name, aggregate, response_variable, element, q=PERCENTILE):
+    """
+    Path of one aggregate raster of a scenario, e.g., out_dir/scenario_n_minus_20.gdb/ba_weighted_effect_growth_n.
+    """
+    raster_name = AGGREGATE_NAMES[aggregate].format(q=q, rv=response_variable, e=element)
+    return os.path.join(out_dir, SCENARIO_GDB_NAME.format(scenario_name), raster_name)
+
+
+def rows_for_scenarios(n_scenarios, n_species, ncols, percentile=True, memory_budget_mb=MEMORY_BUDGET_MB):
+    """
+    Full-width rows per strip so that the (scenarios x cells) arrays of one strip (deposition, totals
+    and the species x scenarios stack of the effects for the percentile) fit in the memory budget.
+    """
+    bytes_per_cell = n_scenarios * (8 * 6 + (4 * n_species if percentile else 0))
+    return max(1, int(memory_budget_mb * 1024 ** 2 // (bytes_per_cell * ncols)))
+
+
+def run_deposition_scenarios(root_dir, out_dir, scenarios, response_variables, elements, tdep_suffix='1719',
+                             aggregates=None, q=PERCENTILE, memory_budget_mb=MEMORY_BUDGET_MB):
+    """
+    Save the aggregate rasters of every scenario, response variable and element.
+
+    scenarios: dict of scenario name -> setting (see DepositionScenario.from_setting)
+    response_variables: list of endpoints, e.g., ['growth', 'survival']
+    elements: list of elements, e.g., ['n', 's']
+    tdep_suffix: TDep raster period the scenarios start from, e.g., '1719' for n_tw_1719 / s_tw_1719
+    aggregates: aggregates to save (see AGGREGATES), default all
+    q: percentile (0-100) of the effects across species
+    memory_budget_mb: memory allowed for the arrays of one strip; sets the number of rows per strip
+    Returns a dict of scenario name -> dict of raster name -> path of the rasters saved.
+    """
+    import arcpy as ap
+
+    aggregates = AGGREGATES if aggregates is None else aggregates
+    unknown = set(aggregates) - set(AGGREGATES)
+    if unknown:
+        raise ValueError('Unknown aggregates {}; choose from {}'.format(sorted(unknown), AGGREGATES))
+    scenarios = [DepositionScenario.from_setting(name, setting) for name, setting in scenarios.items()]
+    spp_prop_ba_gdb_path = os.path.join(out_dir, 'spp_proportion_ba.gdb')
+    natl_forest_raster = os.path.join(out_dir, 'ba_null.gdb', 'ba_null_natl_forest')
+    species_params = load_species_params(root_dir, response_variables)
+    manifest = RunManifest.load(out_dir)
+    code = code_version('response_curves.py', 'cell_statistics.py', 'deposition_scenarios.py')
+    start_profile(out_dir)
+
+    # Every species' range is loaded once and shared by all scenarios, elements and endpoints
+    ap.env.workspace = spp_prop_ba_gdb_path
+    spp_raster_list = ap.ListRasters()
+    template = os.path.join(spp_prop_ba_gdb_path, spp_raster_list[0])
+    tdep_aligned, tdep_hashes = prepare_tdep(out_dir, template, elements, [tdep_suffix], manifest)
+    for scenario in scenarios:
+        scenario.prepare(out_dir, template, manifest)
+    manifest.save()
+    ranges = [(spp_code, load_species_range(os.path.join(spp_prop_ba_gdb_path, spp_raster), out_dir))
+              for spp_raster, spp_code in species_to_process(spp_raster_list, species_params, elements)]
+    range_hashes = [species_range.content_hash() for _, species_range in ranges]
+
+    raster = ap.Raster(natl_forest_raster)
+    extent = raster.extent
+    cell_width, cell_height = raster.meanCellWidth, raster.meanCellHeight
+    offsets = [(int(round((extent.YMax - species_range.y_max) / cell_height)),
+                int(round((species_range.x_min - extent.XMin) / cell_width))) for _, species_range in ranges]
+
+    saved = {scenario.name: {} for scenario in scenarios}
+    for element in elements:
+        # Species with a critical load for each endpoint, with their offset on the grid
+        species = {}
+        for response_variable in response_variables:
+            table = species_params[response_variable]
+            species[response_variable] = [(species_range, offset, table.curve_params(spp_code, element))
+                                          for (spp_code, species_range), offset in zip(ranges, offsets)
+                                          if table.has_critical_load(spp_code, element) and len(species_range)]
+        params_list = {response_variable: [list(params) for _, _, params in species[response_variable]]
+                       for response_variable in response_variables}
+
+        # Scenarios whose rasters are missing or out of date
+        todo, keys = [], {}
+        for scenario in scenarios:
+            for response_variable in response_variables:
+                keys[(scenario.name, response_variable)] = hash_parts(
+                    scenario=scenario.setting(), inputs=scenario.input_hashes, element=element,
+                    response_variable=response_variable, tdep=tdep_hashes[(element, tdep_suffix)],
+                    ranges=range_hashes, params=params_list[response_variable], code=code, q=q)
+            if all(manifest.is_current(scenario_raster_path(out_dir, scenario.name, aggregate, response_variable,
+                                                            element, q), keys[(scenario.name, response_variable)])
+                   for response_variable in response_variables for aggregate in aggregates):
+                print(' >>> UP TO DATE: scenario', scenario.name, element)
+                continue
+            todo.append(scenario)
+            gdb_name = SCENARIO_GDB_NAME.format(scenario.name)
+            if not ap.Exists(os.path.join(out_dir, gdb_name)):
+                ap.CreateFileGDB_management(out_dir, gdb_name)
+        if not todo:
+            continue
+
+        n_species = max([len(species_list) for species_list in species.values()] + [1])
+        block_rows = rows_for_scenarios(len(todo), n_species, raster.width, 'effect_percentile' in aggregates,
+                                        memory_budget_mb)
+        print('Calculating', len(todo), 'scenarios for', element.upper(), 'in strips of', block_rows, 'rows')
+        blocks = {}
+        with profile_unit(element=element):
+            for row_start in range(0, raster.height, block_rows):
+                nrows = min(block_rows, raster.height - row_start)
+                lower_left = ap.Point(extent.XMin, extent.YMax - (row_start + nrows) * cell_height)
+                # TDep is read once per strip and transformed for every scenario
+                baseline = read_block(tdep_aligned[(element, tdep_suffix)], lower_left, raster.width, nrows).ravel()
+                dep = np.vstack([scenario.deposition(element, baseline, lower_left, raster.width, nrows)
+                                 for scenario in todo])
+                for response_variable in response_variables:
+                    results = scenario_aggregates(dep, species[response_variable], row_start, nrows, raster.width,
+                                                  response_variable, aggregates, q)
+                    for aggregate, values in results.items():
+                        for scenario, row in zip(todo, values):
+                            if np.isnan(row).all():
+                                continue
+                            blocks.setdefault((scenario.name, aggregate, response_variable), []).append(
+                                block_to_raster(row.reshape(nrows, raster.width), lower_left, raster))
+
+        records = {}
+        for scenario in todo:
+            for response_variable in response_variables:
+                for aggregate in aggregates:
+                    path = scenario_raster_path(out_dir, scenario.name, aggregate, response_variable, element, q)
+                    if ap.Exists(path):
+                        ap.management.Delete(path)
+                    written = mosaic_blocks(blocks.pop((scenario.name, aggregate, response_variable), []), path, raster)
+                    records[path] = {'key': keys[(scenario.name, response_variable)], 'written': written}
+        manifest.update(records)
+        print('***{} scenarios saved***'.format(element.upper()), [scenario.name for scenario in todo], '\n')
+
+    for scenario in scenarios:
+        for element in elements:
+            for response_variable in response_variables:
+                for aggregate in aggregates:
+                    path = scenario_raster_path(out_dir, scenario.name, aggregate, response_variable, element, q)
+                    record = manifest.outputs.get(path)
+                    if record is not None and record['written']:
+                        saved[scenario.name][os.path.basename(path)] = path
+    return saved
+
+
+def scenario_zonal_tables(out_dir, saved, zone_layers, probs=(0.05, 0.5), out_folder='zonal',
+                          memory_budget_mb=MEMORY_BUDGET_MB):
+    """
+    Zonal statistics of every scenario raster for each zone layer, as one tidy csv per layer
+    (out_dir/zonal/scenarios_{layer}_zonal_statistics.csv) with a scenario column before the raster.
+
+    saved: rasters of each scenario, as returned by run_deposition_scenarios
+    zone_layers: dict of layer name -> [polygon feature class, [key fields]] or zone raster (as in s10)
+    Returns the paths of the csv files.
+    """
+    natl_forest_raster = os.path.join(out_dir, 'ba_null.gdb', 'ba_null_natl_forest')
+    zonal_out_path = os.path.join(out_dir, out_folder)
+    if not os.path.exists(zonal_out_path): # Create the directory if it does not exist
+        os.makedirs(zonal_out_path)
+    # Every raster of every scenario is summarized in the same pass over the zones
+    rasters = {'{}/{}'.format(name, raster_name): path
+               for name, scenario_rasters in saved.items() for raster_name, path in scenario_rasters.items()}
+    out_csv_paths = []
+    for layer, zones in zone_layers.items():
+        zone_raster_path, key_fields, keys = zone_layer(zones, natl_forest_raster, out_dir, layer)
+        print('Summarizing the scenarios by', layer, '...')
+        with profile_unit(layer):
+            labels, cells, stats = zonal_statistics(zone_raster_path, rasters, probs, memory_budget_mb=memory_budget_mb)
+        columns = {}
+        for column, values in tidy_columns(labels, cells, stats, key_fields, keys).items():
+            if column == 'raster':
+                scenario_raster = np.array([value.split('/', 1) for value in values]).reshape(-1, 2)
+                columns['scenario'], columns['raster'] = scenario_raster[:, 0], scenario_raster[:, 1]
+            else:
+                columns[column] = values
+        out_csv_paths.append(write_csv(columns, os.path.join(zonal_out_path,
+                                                             'scenarios_{}_zonal_statistics.csv'.format(layer))))
+        print(len(labels), 'zones of', layer, 'saved to', out_csv_paths[-1], '\n')
+    return out_csv_paths
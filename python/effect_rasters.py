@@ -0,0 +1,349 @@
+"""
+#### Module Information ####
+
+Module name: effect_rasters.py
+
+Purpose of module: Calculate species effect rasters on growth and/or survival rates for N and/or S
+    deposition, and the deposition levels needed to prevent an x% rate reduction.
+    The TDep rasters are read once per species, only at the cells of the species' range (see
+    species_ranges.py), and every requested endpoint (growth-N, growth-S, survival-N, survival-S)
+    is calculated from them, instead of running one script per endpoint that each re-read the
+    same inputs over all of CONUS. Outputs cover the bounding box of the species' range only.
+    The basal area weighted effects (s8) are calculated from the effect rasters the same way.
+    Outputs are only recomputed when their inputs, parameters or code changed since they were
+    written (see run_manifest.py).
+    The deposition level only depends on the species' parameters, so it is solved once per species,
+    element and endpoint and saved as that number plus the species' range in run_manifest.json;
+    its raster is only written on request (write_rasters, or run_manifest.materialize_levels).
+
+Used by: s6a/s6b/s6 (effects), s8 (weighted effects), s9a/s9b (deposition levels), s7 and species_pass.py (see README_Py.md)
+
+Date Created: 2026-10-18
+
+"""
+
+# Import the necessary modules
+import os
+import arcpy as ap
+
+from raster_blocks import setup_worker
+from response_curves import LOOKUP_TOLERANCE, ba_weighted_effect, deposition_level, endpoint_effects, lookup_tables
+from run_manifest import (KERNEL_MODULES, RunManifest, code_version, file_stamp, hash_parts, prepare_tdep, save_level,
+                          save_output)
+from run_profile import count_cells, profile_unit, start_profile
+from species_params import load_species_params, species_to_process
+from species_parallel import run_species_parallel
+from species_ranges import load_species_range, range_cache_path
+
+# Output gdb and raster name of the deposition levels, as written by s9a (5% growth) and s9b (1% survival)
+# and read by s7, formatted with the capitalized element (E), element (e) and species raster (spp)
+DEPOSITION_LEVEL_NAMES = {
+    'growth': ('{E}_growth_deposition_5_red.gdb', '{spp}_{e}_growth_deposition_red'),
+    'survival': ('{E}_survival_deposition_1_red_check.gdb', '{spp}_{e}_survival_deposition'),
+}
+
+
+def run_effects(root_dir, out_dir, response_variables, elements, tdep_suffix='1719', workers=1,
+                memory_limit_mb=None, lookup_step=None, lookup_tolerance=LOOKUP_TOLERANCE):
+    """
+    Create effect rasters for every species in spp_proportion_ba.gdb.
+
+    response_variables: list of endpoints, e.g., ['growth', 'survival']
+    elements: list of elements, e.g., ['n', 's']
+    tdep_suffix: TDep raster period, e.g., '1719' for n_tw_1719 / s_tw_1719
+    workers: number of species processed at the same time (see species_parallel.py)
+    memory_limit_mb: memory limit for each worker, in MB (None for no limit)
+    lookup_step: evaluate the effects from lookup tables starting at this deposition step (kg/ha/yr),
+        within lookup_tolerance of the exact effect (see response_curves.ResponseTable); None
+        evaluates the exact formula at every cell
+    Outputs are saved to {N,S}_{growth,survival}_effect.gdb as '{spp_raster}_effect'.
+    """
+    # Set path to input proportional rasters created in s4_select_horn_spp_calc_proportion.py
+    spp_prop_ba_gdb_path = os.path.join(out_dir, 'spp_proportion_ba.gdb')
+
+    # Load the growth/survival tables once; species without a critical load are dropped up front
+    species_params = load_species_params(root_dir, response_variables)
+
+    # Outputs are only recomputed when their inputs changed since the last run
+    manifest = RunManifest.load(out_dir)
+    code = code_version(*KERNEL_MODULES)
+    lookup = (lookup_step, lookup_tolerance) if lookup_step else None
+    if lookup:
+        code = hash_parts(code=code, lookup=lookup) # Switching the lookup tables on or off recomputes the outputs
+
+    # Time and memory of every species, element and endpoint are recorded in out_dir/profile
+    start_profile(out_dir)
+
+    # Create output gdbs
+    for response_variable in response_variables:
+        for element in elements:
+            gdb_name = '{}_{}_effect.gdb'.format(element.capitalize(), response_variable)
+            if not ap.Exists(os.path.join(out_dir, gdb_name)): # Create the directory if it does not exist
+                ap.CreateFileGDB_management(out_dir, gdb_name)
+
+    ap.env.workspace = spp_prop_ba_gdb_path
+    spp_raster_list = ap.ListRasters()
+
+    # All proportion rasters share the national forest grid, so TDep only needs to be aligned once
+    template = os.path.join(spp_prop_ba_gdb_path, spp_raster_list[0])
+    aligned, hashes = prepare_tdep(out_dir, template, elements, [tdep_suffix], manifest)
+    tdep_aligned = {element: aligned[(element, tdep_suffix)] for element in elements}
+    tdep_hashes = {element: hashes[(element, tdep_suffix)] for element in elements}
+
+    tasks = [(spp_raster, dict(spp_raster=spp_raster, spp_code=spp_code, species_params=species_params,
+                               out_dir=out_dir, response_variables=response_variables, elements=elements,
+                               tdep_aligned=tdep_aligned, manifest=manifest, tdep_hashes=tdep_hashes, code=code,
+                               lookup=lookup))
+             for spp_raster, spp_code in species_to_process(spp_raster_list, species_params, elements,
+                                                            full_curve=True)]
+    return run_species_parallel(species_effects, tasks, workers, memory_limit_mb, setup_worker, manifest.update)
+
+
+def species_effects(spp_raster, spp_code, species_params, out_dir, response_variables, elements, tdep_aligned,
+                    manifest, tdep_hashes, code, lookup=None, block_rows=None):
+    """
+    Create the effect rasters of one species for every response variable and element that is missing
+    or out of date. Run once per species by run_effects, possibly in a worker process.
+
+    tdep_aligned: dict of element -> TDep raster aligned to the species grid
+    manifest: RunManifest of earlier runs (see run_manifest.py)
+    tdep_hashes: dict of element -> content hash of the TDep raster
+    code: code version of the calculation
+    lookup: (step, tolerance) of the lookup tables, or None for the exact formula
+    block_rows: rows per strip when reading and writing (set by species_parallel.py for a memory limit)
+    Returns the manifest records (output path -> record) of the outputs written.
+    """
+    spp_prop_ba_gdb_path = os.path.join(out_dir, 'spp_proportion_ba.gdb')
+    spp_raster_path = os.path.join(spp_prop_ba_gdb_path, spp_raster)
+    out_raster_name = '{0}_effect'.format(spp_raster)
+    species_range = load_species_range(spp_raster_path, out_dir, block_rows=block_rows)
+    range_hash = species_range.content_hash()
+
+    # Collect every endpoint that still needs to be processed for this species
+    params_by_endpoint = {}
+    out_raster_save_paths = {}
+    keys = {}
+    for response_variable in response_variables:
+        for element in elements:
+            out_raster_save_path = os.path.join(out_dir, '{}_{}_effect.gdb'.format(
+                element.capitalize(), response_variable), out_raster_name)
+            params = species_params[response_variable].curve_params(spp_code, element, full_curve=True)
+            if params is None:
+                print('No critical load value, **skipping** ', spp_code, element, response_variable)
+                continue
+            # Skip if already processed from the same inputs
+            key = hash_parts(product='effect', element=element, response_variable=response_variable,
+                             params=list(params), range=range_hash, code=code, tdep=tdep_hashes[element],
+                             reduction=None)
+            if manifest.is_current(out_raster_save_path, key):
+                print(' >>> UP TO DATE IN OUTPUT gdb: ', out_raster_save_path)
+                continue
+            print('Values for spp code', spp_code, element, response_variable, '=', params)
+            params_by_endpoint[(response_variable, element)] = params
+            out_raster_save_paths[(response_variable, element)] = out_raster_save_path
+            keys[(response_variable, element)] = key
+
+    if not params_by_endpoint:
+        print('Going to next raster', '\n')
+        return {}
+
+    # Read the TDep values at the species' cells once and calculate every endpoint
+    # Deposition below min_dep is set to NoData; cells outside the species' range are never read
+    dep = {}
+    for element in sorted({element for _, element in params_by_endpoint}):
+        with profile_unit(spp_raster, element):
+            dep[element] = species_range.gather(tdep_aligned[element])
+    tables = lookup_tables(params_by_endpoint, dep, *lookup) if lookup else None
+    if tables:
+        built = [table.max_error for table in tables.values() if table.values is not None]
+        print('Lookup tables of', spp_raster, ':', len(built), 'of', len(tables), 'built',
+              '(within {:.2g} of the exact effect)'.format(max(built)) if built else '')
+    effects = endpoint_effects(dep, params_by_endpoint, tables=tables)
+
+    print('Calculating effect rasters for ', spp_raster, ':', sorted(out_raster_save_paths), 'on',
+          len(species_range), 'cells')
+    records = {}
+    for (response_variable, element), out_raster_save_path in out_raster_save_paths.items():
+        with profile_unit(spp_raster, element, response_variable):
+            save_output(species_range, effects[(response_variable, element)], out_raster_save_path,
+                        keys[(response_variable, element)], records)
+            count_cells(len(species_range))
+    print('***EFFECTS saved to***', sorted(out_raster_save_paths.values()), '\n')
+    return records
+
+
+def run_ba_weighted_effects(out_dir, response_variables, elements, workers=1, memory_limit_mb=None):
+    """
+    Weight the effect rasters of every species (s6a, s6b, s6) by its basal area proportion.
+
+    response_variables: list of endpoints, e.g., ['growth']
+    elements: list of elements, e.g., ['n', 's']
+    workers: number of species processed at the same time (see species_parallel.py)
+    memory_limit_mb: memory limit for each worker, in MB (None for no limit)
+    Outputs are saved to {N,S}_basal_area_prop_{growth,survival}_effect.gdb as '{effect raster}_basalarea'.
+    An output is only recomputed when its effect raster (by its manifest key), the proportion rasters
+    or the code changed since it was written.
+    """
+    # Set path to input proportional rasters created in s4_select_horn_spp_calc_proportion.py
+    spp_prop_ba_gdb_path = os.path.join(out_dir, 'spp_proportion_ba.gdb')
+    manifest = RunManifest.load(out_dir)
+    code = code_version(*KERNEL_MODULES)
+    ba_stamp = file_stamp(spp_prop_ba_gdb_path)
+
+    # Time and memory of every species are recorded in out_dir/profile
+    start_profile(out_dir)
+
+    tasks = []
+    for response_variable in response_variables:
+        for element in elements:
+            spp_rdxn_path = os.path.join(out_dir, '{}_{}_effect.gdb'.format(element.capitalize(), response_variable))
+            gdb_name = '{}_basal_area_prop_{}_effect.gdb'.format(element.capitalize(), response_variable)
+            if not ap.Exists(os.path.join(out_dir, gdb_name)): # Create the directory if it does not exist
+                ap.CreateFileGDB_management(out_dir, gdb_name)
+            ap.env.workspace = spp_rdxn_path
+            for rdxn_raster in ap.ListRasters() or []:
+                effect_path = os.path.join(spp_rdxn_path, rdxn_raster)
+                out_raster_save_path = os.path.join(out_dir, gdb_name, '{0}_basalarea'.format(rdxn_raster))
+                # Effect rasters written before the manifest existed are keyed on their content
+                record = manifest.outputs.get(effect_path)
+                effect_key = record['key'] if record else manifest.input_hash(effect_path)
+                key = hash_parts(product='ba_weighted_effect', effect=effect_key, ba=ba_stamp, code=code)
+                if manifest.is_current(out_raster_save_path, key):
+                    print(' >>> UP TO DATE IN OUTPUT gdb: ', out_raster_save_path)
+                    continue
+                print('Redxn raster will be saved to : ', out_raster_save_path)
+                tasks.append((os.path.basename(out_raster_save_path),
+                              dict(rdxn_raster=rdxn_raster, spp_rdxn_path=spp_rdxn_path, out_dir=out_dir,
+                                   out_raster_save_path=out_raster_save_path, key=key)))
+    manifest.save()
+
+    # Every species and element writes its own raster, so they can be processed at the same time
+    return run_species_parallel(species_ba_weighted_effect, tasks, workers, memory_limit_mb, setup_worker,
+                                manifest.update)
+
+
+def species_ba_weighted_effect(rdxn_raster, spp_rdxn_path, out_dir, out_raster_save_path, key, block_rows=None):
+    """
+    Multiply one species' effect raster by its basal area proportion at the cells of its range and
+    save the result. Run once per species, element and endpoint by run_ba_weighted_effects, possibly
+    in a worker process.
+    block_rows: rows per strip when reading and writing (set by species_parallel.py for a memory limit)
+    Returns the manifest record (output path -> record) of the output written.
+    """
+    # The effect raster of 's121_proportion' is 's121_proportion_effect'
+    spp_raster_path = os.path.join(out_dir, 'spp_proportion_ba.gdb', rdxn_raster[:-len('_effect')])
+    print('Running basal area proportion effect for:', os.path.basename(out_raster_save_path))
+    species_range = load_species_range(spp_raster_path, out_dir, block_rows=block_rows)
+    records = {}
+    save_output(species_range, ba_weighted_effect(species_range.values,
+                                                  species_range.gather(os.path.join(spp_rdxn_path, rdxn_raster))),
+                out_raster_save_path, key, records)
+    count_cells(len(species_range))
+    return records
+
+
+def deposition_level_path(out_dir, response_variable, element, spp_raster=None):
+    """
+    Path of the deposition level gdb of an endpoint and element, or of one species' level raster in it.
+    """
+    gdb_name, raster_name = DEPOSITION_LEVEL_NAMES[response_variable]
+    names = dict(E=element.capitalize(), e=element, spp=spp_raster)
+    gdb_path = os.path.join(out_dir, gdb_name.format(**names))
+    return gdb_path if spp_raster is None else os.path.join(gdb_path, raster_name.format(**names))
+
+
+def run_deposition_levels(root_dir, out_dir, response_variable, elements, reduction, workers=1,
+                          memory_limit_mb=None, write_rasters=False):
+    """
+    Calculate the deposition levels (kg N or S/ha/yr) needed to prevent an x% rate reduction for
+    every species in spp_proportion_ba.gdb. The level only depends on the species' parameters, so
+    it is solved once per species and element and saved as one number over the species' range
+    (see run_manifest.save_level).
+
+    response_variable: 'growth' or 'survival'
+    elements: list of elements, e.g., ['n', 's']
+    reduction: x as a proportion, e.g., 0.05 for a 5% reduction
+    Outputs are saved to the gdb of the endpoint and element in DEPOSITION_LEVEL_NAMES.
+    workers: number of species processed at the same time (see species_parallel.py)
+    memory_limit_mb: memory limit for each worker, in MB (None for no limit)
+    write_rasters: also write each level as a raster over the species' range; otherwise only the
+        level is saved and the raster can be written later with run_manifest.materialize_levels
+    """
+    # Set path to input proportional rasters created in s4_select_horn_spp_calc_proportion.py
+    spp_prop_ba_gdb_path = os.path.join(out_dir, 'spp_proportion_ba.gdb')
+
+    # Load the growth or survival table once; species without a critical load are dropped up front
+    species_params = load_species_params(root_dir, [response_variable])
+
+    # Outputs are only recomputed when their parameters or the code changed since the last run
+    manifest = RunManifest.load(out_dir)
+    code = code_version(*KERNEL_MODULES)
+
+    # Time and memory of every species and element are recorded in out_dir/profile
+    start_profile(out_dir)
+
+    # Create output gdbs
+    for element in elements:
+        gdb_path = deposition_level_path(out_dir, response_variable, element)
+        if not ap.Exists(gdb_path):
+            ap.CreateFileGDB_management(out_dir, os.path.basename(gdb_path))
+
+    ap.env.workspace = spp_prop_ba_gdb_path
+    tasks = [(spp_raster, dict(spp_raster=spp_raster, spp_code=spp_code, species_params=species_params,
+                               out_dir=out_dir, response_variable=response_variable, elements=elements,
+                               reduction=reduction,
+                               manifest=manifest, code=code, write_rasters=write_rasters))
+             for spp_raster, spp_code in species_to_process(ap.ListRasters(), species_params, elements,
+                                                            full_curve=True)]
+    return run_species_parallel(species_deposition_levels, tasks, workers, memory_limit_mb, setup_worker,
+                                manifest.update)
+
+
+def species_deposition_levels(spp_raster, spp_code, species_params, out_dir, response_variable, elements,
+                              reduction, manifest, code, write_rasters=False, block_rows=None):
+    """
+    Solve the deposition levels of one species for every element that is missing or out of date, and
+    write their rasters if write_rasters is set. Run once per species by run_deposition_levels,
+    possibly in a worker process.
+    block_rows: rows per strip when writing (set by species_parallel.py for a memory limit)
+    Returns the manifest records (output path -> record) of the outputs saved.
+    """
+    spp_raster_path = os.path.join(out_dir, 'spp_proportion_ba.gdb', spp_raster)
+    species_range = load_species_range(spp_raster_path, out_dir, block_rows=block_rows)
+    range_hash = species_range.content_hash()
+
+    levels = {}
+    out_raster_save_paths = {}
+    keys = {}
+    for element in elements:
+        out_raster_save_path = deposition_level_path(out_dir, response_variable, element, spp_raster)
+        params = species_params[response_variable].curve_params(spp_code, element, full_curve=True)
+        if params is None or not params.dep_max:
+            print('No critical load value or {}dep_max is null, **skipping** '.format(element), spp_code)
+            continue
+        key = hash_parts(product='deposition_level', element=element, response_variable=response_variable,
+                         params=list(params), range=range_hash, code=code, tdep=None, reduction=reduction)
+        # Skip if already processed from the same parameters, and written if rasters are requested
+        record = manifest.outputs.get(out_raster_save_path)
+        if (manifest.is_current(out_raster_save_path, key) and 'level' in record
+                and (record['written'] or not write_rasters)):
+            print(' >>> UP TO DATE: ', out_raster_save_path)
+            continue
+        levels[element] = float(deposition_level(params, response_variable, reduction))
+        out_raster_save_paths[element] = out_raster_save_path
+        keys[element] = key
+        print('Values for spp code', spp_code, element, '=', params, ', deposition level =', levels[element])
+
+    if not levels:
+        return {}
+
+    # Save the level of every element with the species' range, written over the range if requested
+    records = {}
+    for element, level in levels.items():
+        with profile_unit(spp_raster, element, response_variable):
+            save_level(species_range, level, out_raster_save_paths[element], keys[element], records,
+                       range_cache_path(spp_raster_path, out_dir), write_rasters)
+            if write_rasters:
+                count_cells(len(species_range))
+    print('***{} deposition levels saved for***'.format(response_variable), sorted(out_raster_save_paths.values()), '\n')
+    return records
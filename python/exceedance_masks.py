@@ -0,0 +1,168 @@
+"""
+#### Module Information ####
+
+Module name: exceedance_masks.py
+
+Purpose of module: Exceedance of the critical load of every Horn species as bit masks over the cells of
+    the presence index (see presence_index.py): one bit per species, packed into uint64 words, for every
+    cell where any species is present, by element and response variable. s5 wrote one float32 raster per
+    species, element and endpoint holding the proportion where TDep >= the critical load; the masks hold
+    the same information (the proportion is in the species' cached range) in 1 bit per species and cell
+    instead of 32, and questions across species (how many species are in exceedance at a cell, which
+    ones) are answered from the packed words without reading a raster per species.
+
+    The masks of an element are calculated in one pass: TDep is read once at the index cells and each
+    species' cached range once. The same pass gives the summaries of every index cell:
+        exceedance_count: number of species in exceedance (popcount of the mask words)
+        exceeded_proportion: basal area proportion of the species in exceedance
+        exceedance_magnitude: largest exceedance of a species' critical load at the cell, TDep - critical
+            load (kg/ha/yr), 0 where no species is in exceedance
+
+    Masks are saved by element and TDep period (out_dir/exceedance_masks_n_1719.npz), with the stamps of
+    the presence index they were calculated on.
+
+Used by: s5_calculate_wilson_exceedance.py
+
+Date Created: 2026-10-18
+
+"""
+
+# Import the necessary modules
+import os
+import numpy as np
+
+from presence_index import popcount
+from run_profile import count_cells
+from species_params import spp_code_from_raster
+from species_ranges import SpeciesRange
+
+# File of the masks of an element and TDep period in out_dir
+MASKS_NAME = 'exceedance_masks_{}_{}.npz'
+
+# Summaries of every index cell, written as rasters by s5
+SUMMARIES = ['exceedance_count', 'exceeded_proportion', 'exceedance_magnitude']
+
+
+class ExceedanceMasks(object):
+    """
+    Species in exceedance of their critical load at each cell of a presence index, one bit per species.
+
+    species: names of the species, as in the presence index (e.g., 's121_proportion'); bit i is species[i]
+    element: element of the critical loads, e.g., 'n'
+    tdep_suffix: TDep period of the deposition, e.g., '1719'
+    words: dict of response variable -> (cells x words) uint64 array of the species in exceedance at
+        each cell of the presence index
+    critical_loads: dict of response variable -> critical load (n1/s1) of each species, NaN without one
+    stamps: stamps of the presence index the masks were calculated on (PresenceIndex.stamps)
+    """
+
+    def __init__(self, species, element, tdep_suffix, words, critical_loads, stamps=None):
+        self.species = list(species)
+        self.element = element
+        self.tdep_suffix = tdep_suffix
+        self.words = words
+        self.critical_loads = critical_loads
+        self.stamps = stamps or []
+        self._bits = {name: i for i, name in enumerate(self.species)}
+
+    @classmethod
+    def load(cls, path):
+        """
+        Read masks saved with save().
+        """
+        with np.load(path, allow_pickle=False) as npz:
+            response_variables = [str(name) for name in npz['response_variables']]
+            stamps = [[str(name), int(size), int(mtime)] for name, size, mtime in npz['stamps']]
+            return cls([str(name) for name in npz['species']], str(npz['element']), str(npz['tdep_suffix']),
+                       {rv: npz['words_{}'.format(rv)] for rv in response_variables},
+                       {rv: npz['critical_loads_{}'.format(rv)] for rv in response_variables}, stamps)
+
+    def save(self, path):
+        """
+        Save the masks as an .npz file.
+        """
+        arrays = {}
+        for response_variable in self.words:
+            arrays['words_{}'.format(response_variable)] = self.words[response_variable]
+            arrays['critical_loads_{}'.format(response_variable)] = self.critical_loads[response_variable]
+        np.savez(path, species=np.array(self.species), element=self.element, tdep_suffix=self.tdep_suffix,
+                 response_variables=np.array(list(self.words)),
+                 stamps=np.array(self.stamps, dtype=object).astype(str), **arrays)
+
+    def nbytes(self):
+        """
+        Memory used by the mask words, in bytes.
+        """
+        return sum(words.nbytes for words in self.words.values())
+
+    def has(self, name, response_variable):
+        """
+        Boolean array, over the index cells, of where a species is in exceedance.
+        """
+        i = self._bits[name]
+        return (self.words[response_variable][:, i // 64] & (np.uint64(1) << np.uint64(i % 64))) != 0
+
+    def count(self, response_variable):
+        """
+        Number of species in exceedance at each index cell.
+        """
+        return popcount(self.words[response_variable])
+
+    def species_values(self, name, response_variable, species_range, positions):
+        """
+        Proportion of a species where it is in exceedance (NaN elsewhere) at the cells of its range, as
+        written to the exceedance rasters by s5. positions: PresenceIndex.positions of the range.
+        """
+        return np.where(self.has(name, response_variable)[positions], species_range.values, np.nan)
+
+
+def masks_path(out_dir, element, tdep_suffix):
+    """
+    Path of the exceedance masks of an element and TDep period in out_dir.
+    """
+    return os.path.join(out_dir, MASKS_NAME.format(element, tdep_suffix))
+
+
+def calculate_exceedance(index, element, dep, species_params, response_variables, tdep_suffix, ranges_dir):
+    """
+    Exceedance masks and summaries of one element for every species of a presence index, in one pass.
+
+    index: PresenceIndex of the species (see presence_index.py)
+    dep: TDep deposition of the element at the index cells (PresenceIndex.gather of the aligned TDep)
+    species_params: dict of response variable -> SpeciesParams (see species_params.py)
+    ranges_dir: folder of the cached species ranges the index was built from (out_dir/spp_ranges)
+    Returns (masks, summaries): the ExceedanceMasks and a dict of response variable -> dict of summary
+        (see SUMMARIES) -> values at the index cells.
+    """
+    words = {rv: np.zeros_like(index.words) for rv in response_variables}
+    critical_loads = {rv: np.full(len(index.species), np.nan) for rv in response_variables}
+    exceeded_proportion = {rv: np.zeros(len(index), dtype=np.float64) for rv in response_variables}
+    magnitude = {rv: np.zeros(len(index), dtype=np.float64) for rv in response_variables}
+    for i, name in enumerate(index.species):
+        spp_code = spp_code_from_raster(name)
+        params_by_response = {rv: species_params[rv].curve_params(spp_code, element) for rv in response_variables}
+        if all(params is None for params in params_by_response.values()):
+            continue
+        # The species' cells and the TDep values there, shared by both response variables
+        species_range = SpeciesRange.load(os.path.join(ranges_dir, '{}.npz'.format(name)))
+        positions = index.positions(species_range)
+        species_dep = dep[positions]
+        for response_variable, params in params_by_response.items():
+            if params is None:
+                continue
+            critical_loads[response_variable][i] = params.cl1
+            # Deposition >= critical load at cells with basal area, as in the exceedance rasters
+            exceeded = np.greater_equal(species_dep, params.cl1) & (species_range.values != 0)
+            cells = positions[exceeded]
+            words[response_variable][cells, i // 64] |= np.uint64(1) << np.uint64(i % 64)
+            exceeded_proportion[response_variable][cells] += species_range.values[exceeded]
+            magnitude[response_variable][cells] = np.maximum(magnitude[response_variable][cells],
+                                                             species_dep[exceeded] - params.cl1)
+        count_cells(len(species_range))
+
+    masks = ExceedanceMasks(index.species, element, tdep_suffix, words, critical_loads, index.stamps)
+    summaries = {rv: {'exceedance_count': masks.count(rv).astype(np.float64),
+                      'exceeded_proportion': exceeded_proportion[rv],
+                      'exceedance_magnitude': magnitude[rv]}
+                 for rv in response_variables}
+    return masks, summaries
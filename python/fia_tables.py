@@ -0,0 +1,201 @@
+"""
+#### Module Information ####
+
+Module name: fia_tables.py
+
+Purpose of module: Load columns of the FIA tree tables (tree_characteristic_deposition.csv,
+    tree_level_effects_2000_2019.csv) without parsing the whole file into float64 and strings.
+    Files are streamed in fixed-size row chunks and only the requested columns are kept.
+    Deposition (n_tw_*, s_tw_*) and effect (G_N_*, G_S_*, S_N_*, S_S_*) columns are stored as
+    float32, and Gen_Spp, STUSPS, pheno.type and Wood.Products as integer category codes.
+    Parsed columns can be cached as one .npy file per column next to the csv; the next load
+    memory-maps the cached columns instead of parsing the csv again, and only parses columns
+    that are not cached yet. The cache is rebuilt when the csv changes (size or modified time).
+
+Used by: tree_effects.py, group_statistics.py
+
+Date Created: 2026-10-18
+
+"""
+
+# Import the necessary modules
+import csv
+import json
+import os
+import numpy as np
+
+# Rows read at a time
+CHUNK_ROWS = 100000
+
+# Column name prefixes stored as float32 in compact mode
+FLOAT32_PREFIXES = ('n_tw', 's_tw', 'G_N_', 'G_S_', 'S_N_', 'S_S_')
+
+# Text columns stored as integer category codes in compact mode (-1 for missing)
+CATEGORY_COLUMNS = ['Gen_Spp', 'STUSPS', 'pheno.type', 'Wood.Products']
+
+# Text columns kept as strings
+TEXT_COLUMNS = ['Genus', 'Species', 'Common.Name', 'NAME', 'Shape.g.N', 'Shape.g.S', 'Shape.s.N', 'Shape.s.S']
+
+# Values read as missing, as in R's read.csv
+MISSING_VALUES = ('', 'NA')
+
+
+def column_kind(column, compact=True):
+    """
+    How a column is parsed: 'category', 'text', 'float32' or 'float64'.
+    """
+    if column in CATEGORY_COLUMNS:
+        return 'category' if compact else 'text'
+    if column in TEXT_COLUMNS:
+        return 'text'
+    if compact and column.startswith(FLOAT32_PREFIXES):
+        return 'float32'
+    return 'float64'
+
+
+def to_float(values, dtype=np.float64):
+    """
+    Convert a sequence of csv strings to floats, with '' and 'NA' as NaN.
+    """
+    arr = np.array(values, dtype=str)
+    return np.where(np.isin(arr, MISSING_VALUES), 'nan', arr).astype(dtype)
+
+
+def read_header(csv_path):
+    """
+    Column names of a csv file.
+    """
+    with open(csv_path, newline='') as f:
+        return next(csv.reader(f))
+
+
+def iter_chunks(csv_path, columns, chunk_rows=CHUNK_ROWS, compact=True, categories=None):
+    """
+    Yield dicts of column name -> array for chunks of rows, keeping only the columns listed.
+
+    compact: store deposition and effect columns as float32 and CATEGORY_COLUMNS as int16 codes;
+        otherwise numbers are float64 and all text is kept as strings
+    categories: dict of column -> list of category names, extended in place as new values are found,
+        so codes are the same in every chunk; pass the same dict to decode the codes afterwards
+    """
+    categories = {} if categories is None else categories
+    header = read_header(csv_path)
+    missing = [column for column in columns if column not in header]
+    if missing:
+        raise ValueError('Columns {} not in {}'.format(missing, csv_path))
+    index = [header.index(column) for column in columns]
+    kinds = [column_kind(column, compact) for column in columns]
+    codes = {column: {name: code for code, name in enumerate(categories.get(column, []))}
+             for column, kind in zip(columns, kinds) if kind == 'category'}
+
+    def parse(rows):
+        chunk = {}
+        for column, values, kind in zip(columns, zip(*rows), kinds):
+            if kind == 'category':
+                column_codes = codes[column]
+                names = categories.setdefault(column, [])
+                for name in set(values) - set(column_codes) - set(MISSING_VALUES):
+                    column_codes[name] = len(names)
+                    names.append(name)
+                chunk[column] = np.array([column_codes.get(value, -1) for value in values], dtype=np.int16)
+            elif kind == 'text':
+                chunk[column] = np.array(values, dtype=str)
+            else:
+                chunk[column] = to_float(values, kind)
+        return chunk
+
+    with open(csv_path, newline='') as f:
+        reader = csv.reader(f)
+        next(reader)
+        rows = []
+        for row in reader:
+            rows.append([row[i] for i in index])
+            if len(rows) == chunk_rows:
+                yield parse(rows)
+                rows = []
+        if rows:
+            yield parse(rows)
+
+
+class FIATable(object):
+    """
+    Columns of an FIA table held as arrays (memory-mapped when loaded from the cache).
+
+    columns: dict of column name -> array
+    categories: dict of column name -> list of category names for the integer coded columns
+    """
+
+    def __init__(self, columns, categories):
+        self.columns = columns
+        self.categories = categories
+
+    def __getitem__(self, column):
+        return self.columns[column]
+
+    def __len__(self):
+        return len(next(iter(self.columns.values()))) if self.columns else 0
+
+    def decode(self, column):
+        """
+        Category names of an integer coded column (None for missing).
+        """
+        names = np.array(self.categories[column] + [None], dtype=object)
+        return names[self.columns[column]]
+
+    def code(self, column, name):
+        """
+        Integer code of a category name, e.g., code('STUSPS', 'NY'); -1 if the name is not in the table.
+        """
+        names = self.categories[column]
+        return names.index(name) if name in names else -1
+
+
+def load_table(csv_path, columns, cache=True, chunk_rows=CHUNK_ROWS):
+    """
+    Load the listed columns of an FIA csv in compact form as an FIATable.
+
+    cache: keep parsed columns in '{csv_path}.cache' (one .npy per column); cached columns are
+        memory-mapped and only columns that are not cached yet are parsed from the csv
+    """
+    cache_dir = csv_path + '.cache'
+    manifest_path = os.path.join(cache_dir, 'manifest.json')
+    stat = os.stat(csv_path)
+    source = {'size': stat.st_size, 'mtime': stat.st_mtime}
+
+    manifest = {'source': source, 'columns': {}, 'categories': {}}
+    if cache and os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            cached = json.load(f)
+        if cached['source'] == source: # Otherwise the csv changed and the cache is rebuilt
+            manifest = cached
+
+    to_parse = [column for column in columns if column not in manifest['columns']]
+    categories = {column: list(names) for column, names in manifest['categories'].items() if column in to_parse}
+    parsed = {}
+    if to_parse:
+        chunks = {column: [] for column in to_parse}
+        for chunk in iter_chunks(csv_path, to_parse, chunk_rows, compact=True, categories=categories):
+            for column in to_parse:
+                chunks[column].append(chunk[column])
+        parsed = {column: np.concatenate(chunks[column]) if chunks[column] else np.array([]) for column in to_parse}
+
+    if cache and parsed:
+        # Save the new columns and add them to the manifest
+        os.makedirs(cache_dir, exist_ok=True)
+        for column, values in parsed.items():
+            file_name = 'column_{}.npy'.format(len(manifest['columns']))
+            np.save(os.path.join(cache_dir, file_name), values)
+            manifest['columns'][column] = file_name
+        manifest['categories'].update(categories)
+        with open(manifest_path, 'w') as f:
+            json.dump(manifest, f)
+
+    table_columns = {}
+    for column in columns:
+        if column in parsed:
+            table_columns[column] = parsed[column]
+        else:
+            table_columns[column] = np.load(os.path.join(cache_dir, manifest['columns'][column]), mmap_mode='r')
+    table_categories = {column: manifest['categories'].get(column, categories.get(column))
+                        for column in columns if column_kind(column) == 'category'}
+    return FIATable(table_columns, table_categories)
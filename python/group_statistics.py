@@ -0,0 +1,187 @@
+"""
+#### Module Information ####
+
+Module name: group_statistics.py
+
+Purpose of module: Grouped percentiles and counts of the tree-level effects, the Python equivalent
+    of the species and state summaries at the end of r/calculate_effects.R
+    (species_median_trends.xlsx, species_fifth_percentile_trends.xlsx, state_fifth_percentile_trends.xlsx).
+    The R script runs a separate group_by, domain filter and summarize over the full tree table for
+    every endpoint and statistic (12 passes). Here the table is loaded and filtered once, the trees
+    are partitioned once per grouping (e.g., by species or by state), and every statistic of every
+    effect column is taken from one sort of each group's block of values.
+    Results are written as tidy tables: one row per group, endpoint and year.
+
+    Percentiles match R's quantile(type = 7, na.rm = TRUE) and the median matches R's median
+    (NA when a tree in the group has a missing effect). Effects are read as float32 (see fia_tables.py),
+    so results can differ from R in the 7th significant digit.
+
+Used by: summarize_tree_effects.py, zonal_statistics.py
+
+Date Created: 2026-10-18
+
+"""
+
+# Import the necessary modules
+import numpy as np
+
+from fia_tables import load_table, read_header
+from tree_effects import ENDPOINT_COLUMNS, TDEP_SUFFIXES
+
+# Group key columns of the summaries in calculate_effects.R
+GROUPINGS = {
+    'species': ['SPCD', 'Gen_Spp'],
+    'state': ['STUSPS'],
+}
+
+# Year suffixes summarized in calculate_effects.R (G_N_00:G_N_19)
+YEAR_SUFFIXES = TDEP_SUFFIXES[:20]
+
+
+def percentile_name(p):
+    """
+    Column name of a percentile, e.g., 0.05 -> 'p5'.
+    """
+    return 'p{:g}'.format(p * 100)
+
+
+def partition(keys):
+    """
+    Partition rows by group key once.
+
+    keys: list of 1D arrays (one per key column)
+    Returns (order, starts, group_keys): the row order that puts each group together (groups sorted by
+        key, as group_by does), the start of each group in that order (plus the total at the end),
+        and the key values of each group (groups x key columns).
+    """
+    group_keys, group = np.unique(np.column_stack(keys), axis=0, return_inverse=True)
+    group = group.ravel()
+    order = np.argsort(group, kind='stable')
+    starts = np.concatenate([[0], np.cumsum(np.bincount(group, minlength=len(group_keys)))])
+    return order, starts, group_keys
+
+
+def block_statistics(block, probs):
+    """
+    Statistics of each column of one group's (trees x columns) block, from a single sort.
+
+    Returns a dict of statistic -> array (one value per column): 'n_valid' (non-missing trees),
+    'median' (R's median, NA if any value is missing) and one percentile per prob (R's quantile
+    type 7 with na.rm = TRUE).
+    """
+    values = np.sort(block, axis=0) # NaN sort to the end of each column
+    n_valid = np.count_nonzero(~np.isnan(values), axis=0)
+    columns = np.arange(values.shape[1])
+    stats = {'n_valid': n_valid}
+
+    def quantile(p):
+        # Linear interpolation between the order statistics below and above (k - 1) * p
+        h = (np.maximum(n_valid, 1) - 1) * p
+        lo = np.floor(h).astype(np.int64)
+        hi = np.minimum(lo + 1, np.maximum(n_valid, 1) - 1)
+        result = values[lo, columns] + (h - lo) * (values[hi, columns] - values[lo, columns])
+        return np.where(n_valid > 0, result, np.nan)
+
+    stats['median'] = np.where(n_valid == len(values), quantile(0.5), np.nan)
+    for p in probs:
+        stats[percentile_name(p)] = quantile(p)
+    return stats
+
+
+def grouped_statistics(values, keys, probs=(0.05,)):
+    """
+    Statistics of every column of a (trees x columns) array for every group of trees.
+
+    keys: list of 1D arrays with the group key of each tree
+    probs: percentiles to calculate, e.g., (0.05,) for the 5th percentile
+    Returns (group_keys, n_trees, stats): the key values of each group, the number of trees in each
+        group, and a dict of statistic -> (groups x columns) array (see block_statistics).
+    """
+    order, starts, group_keys = partition(keys)
+    stats = {}
+    for g in range(len(group_keys)):
+        block = np.asarray(values[order[starts[g]:starts[g + 1]]], dtype=np.float64)
+        for name, result in block_statistics(block, probs).items():
+            stats.setdefault(name, np.empty((len(group_keys), values.shape[1]), dtype=result.dtype))[g] = result
+    return group_keys, np.diff(starts), stats
+
+
+def in_domain(table, domain_columns):
+    """
+    True for trees inside the domain of the response curves in every year (all _Domain flags == 0),
+    as filter_at(vars(ends_with("Domain")), all_vars(. == 0)); missing flags are excluded.
+    """
+    keep = np.ones(len(table), dtype=bool)
+    for column in domain_columns:
+        keep &= np.asarray(table[column]) == 0
+    return keep
+
+
+def format_value(value):
+    """
+    Number as written by R's write.csv (15 significant digits, NA for missing).
+    """
+    return 'NA' if np.isnan(value) else '{:.15g}'.format(value)
+
+
+def summarize_tree_effects(effects_csv_path, out_csv_paths, probs=(0.05,), suffixes=YEAR_SUFFIXES,
+                           endpoints=None):
+    """
+    Summarize tree_level_effects_2000_2019.csv by species and by state, with only the trees inside the
+    domain of the response curves in every year, and write one tidy csv per grouping with the columns:
+    the group keys, endpoint, year, n (trees in the group), n_valid (trees with an effect), median and
+    one column per percentile (e.g., p5).
+
+    out_csv_paths: dict of grouping (see GROUPINGS) -> output csv path
+    endpoints: effect column prefixes, defaults to G_N, G_S, S_N and S_S
+    Returns a dict of grouping -> number of groups written.
+    """
+    endpoints = endpoints or list(ENDPOINT_COLUMNS)
+    header = read_header(effects_csv_path)
+    domain_columns = [column for column in header if column.endswith('_Domain')]
+    effect_columns = ['{}_{}'.format(endpoint, suffix) for endpoint in endpoints for suffix in suffixes]
+    key_columns = list(dict.fromkeys(column for grouping in out_csv_paths for column in GROUPINGS[grouping]))
+
+    # Load and filter the table once for every grouping
+    table = load_table(effects_csv_path, key_columns + domain_columns + effect_columns)
+    keep = in_domain(table, domain_columns)
+    values = np.column_stack([np.asarray(table[column])[keep] for column in effect_columns])
+    print('Trees inside the domain of the response curves:', np.count_nonzero(keep), 'of', len(table))
+
+    n_groups = {}
+    for grouping, out_csv_path in out_csv_paths.items():
+        # Category codes are in order of appearance; group on the rank of the names so groups are
+        # sorted by name as in R, with missing names last
+        keys = []
+        for column in GROUPINGS[grouping]:
+            key = np.asarray(table[column])[keep]
+            if column in table.categories:
+                names = table.categories[column]
+                rank = np.append(np.argsort(np.argsort(names)), len(names))
+                key = rank[key]
+            keys.append(key)
+        group_keys, n_trees, stats = grouped_statistics(values, keys, probs)
+
+        # Write the names of the category columns instead of the ranks
+        key_text = []
+        for j, column in enumerate(GROUPINGS[grouping]):
+            if column in table.categories:
+                names = sorted(table.categories[column]) + [None]
+                key_text.append(['"{}"'.format(names[rank]) if names[rank] is not None else 'NA'
+                                 for rank in group_keys[:, j].astype(int)])
+            else:
+                key_text.append([format_value(value) for value in group_keys[:, j]])
+
+        stat_names = ['median'] + [percentile_name(p) for p in probs]
+        with open(out_csv_path, 'w', newline='') as out:
+            out.write(','.join('"{}"'.format(column) for column in GROUPINGS[grouping] + ['endpoint', 'year', 'n', 'n_valid']
+                               + stat_names) + '\n')
+            for g in range(len(group_keys)):
+                for c, column in enumerate(effect_columns):
+                    endpoint, suffix = column.rsplit('_', 1)
+                    out.write(','.join([key[g] for key in key_text] + ['"{}"'.format(endpoint), '"{}"'.format(suffix),
+                                       str(n_trees[g]), str(stats['n_valid'][g, c])]
+                                       + [format_value(stats[name][g, c]) for name in stat_names]) + '\n')
+        n_groups[grouping] = len(group_keys)
+        print('Groups written for', grouping, ':', len(group_keys))
+    return n_groups
@@ -0,0 +1,462 @@
+"""
+#### Module Information ####
+
+Module name: pipeline.py
+
+Purpose of module: Run the s1 - s9 scripts as one pipeline from a single config file.
+    Each stage declares the stages whose outputs it needs, and stages whose inputs are ready run at
+    the same time (each in its own process) up to a budget of worker processes, so independent
+    branches overlap: s5, s6a, s6b, s9a and s9b only need s4, s8 only needs s6a/s6b and s7 only
+    needs s9a/s9b. With split_elements, s6a, s6b, s9a and s9b also run N and S as separate stages.
+    s2_s4 (s2_s4_fused_ingest.py) can be listed instead of s2, s3 and s4; s1_store
+    (s1_ba_export_to_array_store.py) exports the rasters to the array store, which s2_s4 reads in place
+    of ba.gdb when it holds them.
+    s10 (s10_zonal_statistics.py) summarizes the s7 rasters by zone and s11 (s11_deposition_scenarios.py)
+    maps deposition scenarios; both only run when listed.
+
+    The config file replaces the <'Insert ...'> placeholders of the scripts: every script is copied
+    to out_dir/pipeline/scripts with the placeholders and any settings from the config filled in,
+    and the copy is run. The state of every stage is saved in out_dir/pipeline/state.json, so an
+    interrupted or failed run resumes with the stages that did not finish. A stage is run again when its
+    fingerprint changed: the hash of its script and settings, the code of the shared modules it imports,
+    the files of its declared inputs (STAGE_INPUTS, e.g., growth.csv or tdep.gdb) and the fingerprints
+    of the stages it needs. A stage that runs again also runs every stage that needs it.
+    Output of each stage goes to out_dir/pipeline/logs.
+
+    Config file (JSON):
+        root_dir: root directory to converted rasters (replaces <'Insert root directory ...'>)
+        out_folder: output folder name in root_dir (replaces <'Insert folder directory here'>)
+        ba_gdb_name: gdb of the Wilson et al. 2013 rasters made by s1, default 'ba.gdb'
+        stages: stages to run (see STAGES), default DEFAULT_STAGES; needed stages that are not
+            listed are taken as already done
+        max_workers: worker processes used at the same time by all running stages, default one per core
+        split_elements: run s6a, s6b, s9a and s9b as one stage per element, default false
+        elements: elements of the split stages, default ['n', 's']
+        settings: values for settings of every script that has them, e.g., {"workers": 4, "tdep_suffix": "0002"}
+        stage_settings: values for settings of one stage, e.g., {"s7": {"percentile": 10}}
+
+Used by: run_pipeline.py
+
+Date Created: 2026-10-18
+
+"""
+
+# Import the necessary modules
+import ast
+import hashlib
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+import timeit
+
+# Folder of the scripts and shared modules
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Stage name -> (script, stages whose outputs it needs); 'tdep' aligns the TDep rasters to the species
+# grid once (see align_tdep_stage) so the stages that read TDep do not all align it at the same time
+STAGES = {
+    's1': ('s1_ba_export_to_single_gdb.py', []),
+    's1_store': ('s1_ba_export_to_array_store.py', []),
+    's2': ('s2_setzero_null.py', ['s1']),
+    's3': ('s3_ba_sum_natl_forest.py', ['s2']),
+    's4': ('s4_select_horn_spp_calc_proportion.py', ['s3']),
+    's2_s4': ('s2_s4_fused_ingest.py', ['s1', 's1_store']),
+    'tdep': (None, ['s4', 's2_s4']),
+    's5': ('s5_calculate_wilson_exceedance.py', ['tdep']),
+    's6a': ('s6a_effects_eqn_growth.py', ['tdep']),
+    's6b': ('s6b_effects_eqn_survival.py', ['tdep']),
+    's6': ('s6_effects_eqn_all_endpoints.py', ['tdep']),
+    's9a': ('s9a_deposition_level_for_growth_reduction.py', ['s4', 's2_s4']),
+    's9b': ('s9b_deposition_level_for_survival_reduction.py', ['s4', 's2_s4']),
+    's8': ('s8_basal_area_weight_growth_effects.py', ['s6a', 's6b', 's6']),
+    's7': ('s7_calculate_summary_rasters.py', ['s9a', 's9b', 's5_s9']),
+    's5_s9': ('s5_s9_species_pass.py', ['tdep']),
+    's10': ('s10_zonal_statistics.py', ['s7']),
+    's11': ('s11_deposition_scenarios.py', ['tdep']),
+}
+
+# Stage name -> inputs it reads that no stage writes, as (config key of the folder, path in it); the
+# stage runs again when their files change
+STAGE_INPUTS = {
+    's1': [('root_dir', 'raster_maps')],
+    's1_store': [('root_dir', 'raster_maps')],
+    'tdep': [('out_dir', 'tdep.gdb')],
+    's5': [('root_dir', 'growth.csv'), ('root_dir', 'survival.csv')],
+    's6a': [('root_dir', 'growth.csv')],
+    's6b': [('root_dir', 'survival.csv')],
+    's6': [('root_dir', 'growth.csv'), ('root_dir', 'survival.csv')],
+    's9a': [('root_dir', 'growth.csv')],
+    's9b': [('root_dir', 'survival.csv')],
+    's5_s9': [('root_dir', 'growth.csv'), ('root_dir', 'survival.csv')],
+    's11': [('root_dir', 'growth.csv'), ('root_dir', 'survival.csv')],
+}
+
+# Stages run by default: the script series s1 - s9 (s2_s4, s6 and s5_s9 are alternatives to s2 - s4,
+# s6a/s6b and s5 - s9)
+DEFAULT_STAGES = ['s1', 's2', 's3', 's4', 'tdep', 's5', 's6a', 's6b', 's9a', 's9b', 's8', 's7']
+
+# Stages that can run as one stage per element; each only creates the gdbs of its own elements
+SPLIT_STAGES = ['s6a', 's6b', 's6', 's9a', 's9b']
+
+# Script placeholders -> config key
+PLACEHOLDERS = {
+    "<'Insert root directory to converted rasters here'>": 'root_dir',
+    "<'Insert folder directory here'>": 'out_folder',
+    "<'Insert gdb name here for Wilson et al. 2013 rasters'>": 'ba_gdb_name',
+}
+
+# Seconds between checks of the running stages
+POLL_SECONDS = 5
+
+
+def load_config(config_path):
+    """
+    Read the config file and fill in the defaults.
+    """
+    with open(config_path) as f:
+        config = json.load(f)
+    for key in ['root_dir', 'out_folder']:
+        if key not in config:
+            raise ValueError('{} is missing from {}'.format(key, config_path))
+    config.setdefault('ba_gdb_name', 'ba.gdb')
+    config.setdefault('stages', DEFAULT_STAGES)
+    config.setdefault('max_workers', os.cpu_count() or 1)
+    config.setdefault('split_elements', False)
+    config.setdefault('elements', ['n', 's'])
+    config.setdefault('settings', {})
+    config.setdefault('stage_settings', {})
+    unknown = set(config['stages']) - set(STAGES)
+    if unknown:
+        raise ValueError('Unknown stages {}; choose from {}'.format(sorted(unknown), list(STAGES)))
+    return config
+
+
+def build_graph(config):
+    """
+    Stages to run as a dict of stage name -> dict(base=stage in STAGES, needs=[stage names],
+    settings={name: value}), in the order of STAGES. Split stages are named by element, e.g., 's6a_n'.
+    """
+    def is_split(stage):
+        return config['split_elements'] and stage in SPLIT_STAGES
+
+    graph = {}
+    for stage in [stage for stage in STAGES if stage in config['stages']]:
+        for element in config['elements'] if is_split(stage) else [None]:
+            # A split stage only needs the same element of a split stage before it
+            needs = []
+            for need in STAGES[stage][1]:
+                if need not in config['stages']:
+                    continue
+                if is_split(need):
+                    needs += ['{}_{}'.format(need, other) for other in config['elements']
+                              if element is None or other == element]
+                else:
+                    needs.append(need)
+            settings = dict(config['settings'])
+            settings.update(config['stage_settings'].get(stage, {}))
+            if element is not None:
+                settings['elements'] = [element]
+            graph[stage if element is None else '{}_{}'.format(stage, element)] = dict(
+                base=stage, needs=needs, settings=settings)
+    return graph
+
+
+def render_script(script, config, settings):
+    """
+    Source of a script with the placeholders replaced by config values and top-level settings
+    (single line assignments such as 'workers = 1') replaced by the values in settings.
+    """
+    with open(os.path.join(SCRIPT_DIR, script)) as f:
+        source = f.read()
+    for placeholder, key in PLACEHOLDERS.items():
+        source = source.replace(placeholder, repr(config[key]))
+    remaining = re.findall(r"<'Insert [^>]*>", source)
+    if remaining:
+        raise ValueError('No config value for {} in {}'.format(sorted(set(remaining)), script))
+    for name, value in settings.items():
+        source = re.sub(r'^{} = .*$'.format(re.escape(name)),
+                        lambda match: '{} = {!r} # Set by the pipeline config'.format(name, value),
+                        source, flags=re.MULTILINE)
+    return source
+
+
+def script_setting(source, name, default=None):
+    """
+    Value of a top-level setting in a (rendered) script, e.g., script_setting(source, 'workers', 1).
+    """
+    match = re.search(r'^{} = ([^#\n]*)'.format(re.escape(name)), source, flags=re.MULTILINE)
+    if match is None:
+        return default
+    try:
+        return ast.literal_eval(match.group(1).strip())
+    except (ValueError, SyntaxError):
+        return default
+
+
+def shared_modules(source, found=None):
+    """
+    File names of the modules in this folder imported by a source, and by those modules in turn.
+    """
+    found = set() if found is None else found
+    for node in ast.walk(ast.parse(source)):
+        if isinstance(node, ast.Import):
+            names = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names = [node.module]
+        else:
+            continue
+        for module_name in ['{}.py'.format(name.split('.')[0]) for name in names]:
+            module_path = os.path.join(SCRIPT_DIR, module_name)
+            if module_name not in found and os.path.exists(module_path):
+                found.add(module_name)
+                with open(module_path) as f:
+                    shared_modules(f.read(), found)
+    return found
+
+
+def input_stamps(stage, config):
+    """
+    Stamps of the files of a stage's declared inputs (see STAGE_INPUTS and run_manifest.file_stamp);
+    every file of a folder that is not a gdb, and None for an input that does not exist.
+    """
+    from raster_blocks import file_stamp
+
+    folders = {'root_dir': config['root_dir'], 'out_dir': os.path.join(config['root_dir'], config['out_folder'])}
+    stamps = {}
+    for folder, name in STAGE_INPUTS.get(stage, []):
+        path = os.path.join(folders[folder], name)
+        if not os.path.exists(path):
+            stamps[name] = None
+        elif os.path.isdir(path) and not path.lower().endswith('.gdb'):
+            stamps[name] = [[os.path.relpath(os.path.join(dirpath, filename), path), file_stamp(
+                os.path.join(dirpath, filename))] for dirpath, _, filenames in sorted(os.walk(path))
+                for filename in sorted(filenames)]
+        else:
+            stamps[name] = file_stamp(path)
+    return stamps
+
+
+def stage_command(name, stage, config, config_path, pipeline_dir):
+    """
+    (command, fingerprint, workers) of a stage: the command line that runs it, a hash of what it runs and
+    reads (its script and settings, the shared modules it imports and its declared inputs; see
+    chain_fingerprints for the stages it needs) and the number of worker processes it uses.
+    """
+    from run_manifest import code_version
+
+    script = STAGES[stage['base']][0]
+    if script is None:
+        # The TDep stage runs align_tdep_stage of this module
+        source = 'import pipeline; pipeline.align_tdep_stage({!r})'.format(os.path.abspath(config_path))
+        command, settings, workers = [sys.executable, '-c', source], tdep_suffixes(config), 1
+    else:
+        source = render_script(script, config, stage['settings'])
+        scripts_dir = os.path.join(pipeline_dir, 'scripts')
+        os.makedirs(scripts_dir, exist_ok=True)
+        rendered_path = os.path.join(scripts_dir, '{}.py'.format(name))
+        with open(rendered_path, 'w') as f:
+            f.write(source)
+        command, settings, workers = [sys.executable, rendered_path], None, script_setting(source, 'workers', 1) or 1
+    fingerprint = hashlib.sha256(json.dumps([source, settings, code_version(*sorted(shared_modules(source))),
+                                             input_stamps(stage['base'], config)]).encode())
+    return command, fingerprint.hexdigest(), workers
+
+
+def chain_fingerprints(graph, commands):
+    """
+    Fingerprint of every stage including the fingerprints of the stages it needs, so a change to any
+    stage before it (its script, settings, shared modules or inputs) runs it again.
+    """
+    chained = {}
+
+    def chain(name):
+        if name not in chained:
+            chained[name] = hashlib.sha256(json.dumps(
+                [commands[name][1]] + [chain(need) for need in graph[name]['needs']]).encode()).hexdigest()
+        return chained[name]
+
+    for name in graph:
+        chain(name)
+    return chained
+
+
+def tdep_suffixes(config):
+    """
+    TDep periods read by the selected stages: the tdep_suffix setting (one period or a list).
+    """
+    suffixes = []
+    for stage in config['stages']:
+        settings = dict(config['settings'])
+        settings.update(config['stage_settings'].get(stage, {}))
+        suffix = settings.get('tdep_suffix', '1719')
+        suffixes += [suffix] if isinstance(suffix, str) else list(suffix)
+    return sorted(set(suffixes))
+
+
+def align_tdep_stage(config_path):
+    """
+    The 'tdep' stage: align every TDep raster read by the later stages to the species grid and hash it
+    (see run_manifest.prepare_tdep), so the stages that run at the same time find it done.
+    """
+    import arcpy as ap
+    from run_manifest import RunManifest, prepare_tdep
+
+    ap.env.overwriteOutput = True
+    ap.CheckOutExtension("Spatial")
+    config = load_config(config_path)
+    out_dir = os.path.join(config['root_dir'], config['out_folder'])
+    spp_prop_ba_gdb_path = os.path.join(out_dir, 'spp_proportion_ba.gdb')
+    ap.env.workspace = spp_prop_ba_gdb_path
+    template = os.path.join(spp_prop_ba_gdb_path, ap.ListRasters()[0])
+    prepare_tdep(out_dir, template, config['elements'], tdep_suffixes(config), RunManifest.load(out_dir))
+
+
+def stage_dependents(graph, name):
+    """
+    Stages of the graph (see build_graph) that need a stage, directly or through other stages.
+    """
+    found = set()
+    for other, stage in graph.items():
+        if name in stage['needs'] and other not in found:
+            found |= {other} | stage_dependents(graph, other)
+    return found
+
+
+class PipelineState(object):
+    """
+    Status of every stage ('done', 'failed', 'running', 'interrupted' or 'stale' (a stage it needs ran
+    again since it finished)), saved in state.json after every change so a later run can resume.
+    """
+
+    def __init__(self, path, stages=None):
+        self.path = path
+        self.stages = stages or {}
+
+    @classmethod
+    def load(cls, pipeline_dir):
+        path = os.path.join(pipeline_dir, 'state.json')
+        if not os.path.exists(path):
+            return cls(path)
+        with open(path) as f:
+            return cls(path, json.load(f))
+
+    def save(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.stages, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def is_done(self, name, fingerprint):
+        """
+        True if the stage finished in an earlier run with the same fingerprint (see chain_fingerprints).
+        """
+        record = self.stages.get(name, {})
+        return record.get('status') == 'done' and record.get('fingerprint') == fingerprint
+
+    def clear_dependents(self, graph, name):
+        """
+        Mark the finished stages of the graph that need a stage as stale, so they run again after it
+        even if this run stops first.
+        """
+        for other in stage_dependents(graph, name):
+            if self.stages.get(other, {}).get('status') == 'done':
+                self.stages[other]['status'] = 'stale'
+        self.save()
+
+    def set(self, name, **record):
+        self.stages.setdefault(name, {}).update(record)
+        self.save()
+
+
+def run_pipeline(config_path, restart=False):
+    """
+    Run the stages of the config file, resuming from the saved state unless restart is set.
+    Returns a dict of stage name -> status ('done', 'failed', 'blocked' (a needed stage failed) or
+    'skipped' (done in an earlier run)).
+    """
+    config = load_config(config_path)
+    out_dir = os.path.join(config['root_dir'], config['out_folder'])
+    pipeline_dir = os.path.join(out_dir, 'pipeline')
+    logs_dir = os.path.join(pipeline_dir, 'logs')
+    os.makedirs(logs_dir, exist_ok=True)
+    state = PipelineState.load(pipeline_dir)
+    if restart:
+        state.stages = {}
+
+    graph = build_graph(config)
+    commands = {name: stage_command(name, stage, config, config_path, pipeline_dir) for name, stage in graph.items()}
+    fingerprints = chain_fingerprints(graph, commands)
+
+    # A stage is only skipped if every stage it needs is skipped too
+    skipped = {}
+
+    def is_skipped(name):
+        if name not in skipped:
+            skipped[name] = (state.is_done(name, fingerprints[name])
+                             and all(is_skipped(need) for need in graph[name]['needs']))
+        return skipped[name]
+
+    status = {}
+    for name in graph:
+        if is_skipped(name):
+            status[name] = 'skipped'
+            print('Stage', name, 'finished in an earlier run, skipping')
+
+    # Scripts import the shared modules from this folder
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(path for path in [SCRIPT_DIR, env.get('PYTHONPATH')] if path)
+
+    running = {}
+    try:
+        while True:
+            # Stages whose needed stages failed can not run
+            for name, stage in graph.items():
+                if name not in status and any(status.get(need) in ('failed', 'blocked') for need in stage['needs']):
+                    status[name] = 'blocked'
+                    print('Stage', name, 'blocked by a failed stage')
+
+            # Start ready stages in order while worker processes are available; a stage larger than the
+            # budget runs on its own
+            for name, stage in graph.items():
+                if name in status or name in running:
+                    continue
+                if not all(status.get(need) in ('done', 'skipped') for need in stage['needs']):
+                    continue
+                command, _, workers = commands[name]
+                in_use = sum(commands[other][2] for other in running)
+                if running and in_use + workers > config['max_workers']:
+                    continue
+                log = open(os.path.join(logs_dir, '{}.log'.format(name)), 'w')
+                running[name] = (subprocess.Popen(command, cwd=SCRIPT_DIR, env=env, stdout=log,
+                                                  stderr=subprocess.STDOUT), log, timeit.default_timer())
+                state.set(name, status='running', fingerprint=fingerprints[name])
+                state.clear_dependents(graph, name)
+                print('Stage', name, 'started ({} workers)'.format(workers))
+
+            if not running:
+                break
+            time.sleep(POLL_SECONDS)
+
+            # Record the stages that finished
+            for name in list(running):
+                process, log, start_time = running[name]
+                if process.poll() is None:
+                    continue
+                log.close()
+                del running[name]
+                elapsed_min = (timeit.default_timer() - start_time) / 60
+                status[name] = 'done' if process.returncode == 0 else 'failed'
+                state.set(name, status=status[name], elapsed_min=elapsed_min)
+                print('Stage', name, status[name].upper(), 'after', round(elapsed_min, 1), 'minutes, log:', log.name)
+    except KeyboardInterrupt:
+        # Stop the running stages; they run again on the next run
+        for name, (process, log, _) in running.items():
+            process.terminate()
+            process.wait()
+            log.close()
+            state.set(name, status='interrupted')
+        raise
+    return status
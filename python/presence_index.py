@@ -0,0 +1,288 @@
+"""
+#### Module Information ####
+
+Module name: presence_index.py
+
+Purpose of module: Presence index of the Horn species: one bit per species for every cell where any
+    species is present, packed into uint64 words (94 species fit in two words per cell). The stages
+    find each species' range from its cached SpeciesRange (see species_ranges.py); questions across
+    species (how many species are present at a cell, which species occur here, where do two species
+    co-occur) would otherwise need every proportion raster. The index answers them from 16 bytes per
+    forested cell instead of one float32 raster per species.
+
+    The index is built from the cached ranges of the s4 proportion rasters (out_dir/spp_ranges), one
+    strip of rows at a time, and saved as out_dir/presence_index.npz with the size and modified time
+    of each range file, so it is only built again when a range changed. Queries of the index only
+    need NumPy; reading a raster at the index cells (gather) or writing one (to_range, e.g., the
+    exceedance summaries of s5) uses the grid of the proportion rasters.
+
+Used by: s4, s2_s4_fused_ingest.py, s5, exceedance_masks.py and benchmarks.py (see README_Py.md)
+
+Date Created: 2026-10-18
+
+"""
+
+# Import the necessary modules
+import os
+import numpy as np
+
+import raster_blocks
+from cell_statistics import strip_cells
+from species_ranges import RANGES_DIR_NAME, SpeciesRange
+
+# File of the index in out_dir
+INDEX_NAME = 'presence_index.npz'
+
+# Number of set bits in each byte value, for numpy versions without np.bitwise_count
+_BYTE_COUNTS = np.array([bin(value).count('1') for value in range(256)], dtype=np.uint8)
+
+
+def popcount(words):
+    """
+    Number of set bits in each row of a 2D uint64 array.
+    """
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(words).sum(axis=1, dtype=np.int64)
+    return _BYTE_COUNTS[np.ascontiguousarray(words).view(np.uint8)].sum(axis=1, dtype=np.int64)
+
+
+def range_stamps(range_paths):
+    """
+    Size and modified time of each range file, to tell whether the index is out of date.
+    """
+    return [[os.path.basename(path), os.stat(path).st_size, os.stat(path).st_mtime_ns] for path in range_paths]
+
+
+class PresenceIndex(object):
+    """
+    Species present at each cell of a grid window, one bit per species.
+
+    template: path of a proportion raster, which sets the grid and spatial reference of rasters written
+    x_min, y_max: upper left corner of the window that covers every species' range
+    cell_width, cell_height: cell size of the grid
+    nrows, ncols: size of the window in cells
+    species: names of the species (their range names, e.g., 's121_proportion'); bit i is species[i]
+    cells: sorted flat (row-major) indices, within the window, of the cells where any species is present
+    words: (cells x words) uint64 array of the species present at each cell
+    stamps: range_stamps of the ranges the index was built from
+    """
+
+    def __init__(self, template, x_min, y_max, cell_width, cell_height, nrows, ncols, species, cells, words,
+                 stamps=None):
+        self.template = template
+        self.x_min = x_min
+        self.y_max = y_max
+        self.cell_width = cell_width
+        self.cell_height = cell_height
+        self.nrows = nrows
+        self.ncols = ncols
+        self.species = list(species)
+        self.cells = cells
+        self.words = words
+        self.stamps = stamps or []
+        self._bits = {name: i for i, name in enumerate(self.species)}
+
+    @classmethod
+    def build(cls, range_paths, block_rows=None):
+        """
+        Build the index from cached species ranges (.npz files of species_ranges.py), one strip of rows
+        of the window at a time. Only one strip of the packed words is held uncompressed.
+        """
+        ranges = [SpeciesRange.load(path) for path in range_paths]
+        species = [os.path.splitext(os.path.basename(path))[0] for path in range_paths]
+        occupied = [species_range for species_range in ranges if len(species_range)]
+        if not occupied:
+            raise ValueError('No species ranges with cells to build the presence index from')
+        cell_width, cell_height = occupied[0].cell_width, occupied[0].cell_height
+
+        # Window that covers every species' range
+        x_min = min(species_range.x_min for species_range in occupied)
+        y_max = max(species_range.y_max for species_range in occupied)
+        offsets = [(int(round((y_max - species_range.y_max) / cell_height)),
+                    int(round((species_range.x_min - x_min) / cell_width))) for species_range in ranges]
+        nrows = max(row0 + species_range.nrows for species_range, (row0, _) in zip(ranges, offsets) if len(species_range))
+        ncols = max(col0 + species_range.ncols for species_range, (_, col0) in zip(ranges, offsets) if len(species_range))
+
+        n_words = max(1, (len(ranges) + 63) // 64)
+        block_rows = block_rows or raster_blocks.BLOCK_SIZE
+        cells, words = [], []
+        for row_start in range(0, nrows, block_rows):
+            strip_nrows = min(block_rows, nrows - row_start)
+            strip = np.zeros((strip_nrows * ncols, n_words), dtype=np.uint64)
+            for i, (species_range, offset) in enumerate(zip(ranges, offsets)):
+                strip[strip_cells(species_range, offset, row_start, strip_nrows, ncols), i // 64] |= \
+                    np.uint64(1) << np.uint64(i % 64)
+            present = np.flatnonzero(strip.any(axis=1))
+            cells.append(present + row_start * ncols)
+            words.append(strip[present])
+        index = cls(occupied[0].template, x_min, y_max, cell_width, cell_height, nrows, ncols, species,
+                    np.concatenate(cells), np.concatenate(words), range_stamps(range_paths))
+        print('Presence index of', len(species), 'species built:', len(index), 'cells with species,',
+              index.nbytes() / 1024 ** 2, 'MB')
+        return index
+
+    @classmethod
+    def load(cls, path):
+        """
+        Read an index saved with save().
+        """
+        with np.load(path, allow_pickle=False) as npz:
+            stamps = [[str(name), int(size), int(mtime)] for name, size, mtime in npz['stamps']]
+            return cls(str(npz['template']), float(npz['x_min']), float(npz['y_max']),
+                       float(npz['cell_width']), float(npz['cell_height']), int(npz['nrows']),
+                       int(npz['ncols']), [str(name) for name in npz['species']], npz['cells'], npz['words'],
+                       stamps)
+
+    def save(self, path):
+        """
+        Save the index as an .npz file.
+        """
+        np.savez(path, template=self.template, x_min=self.x_min, y_max=self.y_max,
+                 cell_width=self.cell_width, cell_height=self.cell_height, nrows=self.nrows,
+                 ncols=self.ncols, species=np.array(self.species), cells=self.cells, words=self.words,
+                 stamps=np.array(self.stamps, dtype=object).astype(str))
+
+    def __len__(self):
+        return len(self.cells)
+
+    def nbytes(self):
+        """
+        Memory used by the cells and words, in bytes.
+        """
+        return self.cells.nbytes + self.words.nbytes
+
+    def has(self, name):
+        """
+        Boolean array, over the index cells, of where a species is present.
+        """
+        i = self._bits[name]
+        return (self.words[:, i // 64] & (np.uint64(1) << np.uint64(i % 64))) != 0
+
+    def richness(self):
+        """
+        Number of species present at each index cell.
+        """
+        return popcount(self.words)
+
+    def occupancy(self):
+        """
+        Number of cells where each species is present, as a dict of species -> cells.
+        """
+        return {name: int(np.count_nonzero(self.has(name))) for name in self.species}
+
+    def cell_at(self, x, y):
+        """
+        Flat index, within the window, of the cell that holds the map coordinates x, y (None outside it).
+        """
+        row = int(np.floor((self.y_max - y) / self.cell_height))
+        col = int(np.floor((x - self.x_min) / self.cell_width))
+        if not (0 <= row < self.nrows and 0 <= col < self.ncols):
+            return None
+        return row * self.ncols + col
+
+    def species_at(self, x, y):
+        """
+        Names of the species present at the map coordinates x, y.
+        """
+        cell = self.cell_at(x, y)
+        position = np.searchsorted(self.cells, cell) if cell is not None else len(self.cells)
+        if position == len(self.cells) or self.cells[position] != cell:
+            return []
+        words = self.words[position]
+        return [name for i, name in enumerate(self.species) if int(words[i // 64]) >> (i % 64) & 1]
+
+    def select(self, all_of=(), any_of=(), none_of=()):
+        """
+        Boolean array, over the index cells, of the cells where every species of all_of, at least one of
+        any_of (if given) and none of none_of are present, tested on the packed words.
+        """
+        def word_masks(names):
+            masks = np.zeros(self.words.shape[1], dtype=np.uint64)
+            for name in names:
+                i = self._bits[name]
+                masks[i // 64] |= np.uint64(1) << np.uint64(i % 64)
+            return masks
+
+        selected = np.ones(len(self.cells), dtype=bool)
+        for masks, test in [(word_masks(all_of), 'all'), (word_masks(any_of), 'any'), (word_masks(none_of), 'none')]:
+            if not masks.any():
+                continue
+            hits = self.words & masks
+            if test == 'all':
+                selected &= (hits == masks).all(axis=1)
+            elif test == 'any':
+                selected &= hits.any(axis=1)
+            else:
+                selected &= ~hits.any(axis=1)
+        return selected
+
+    def cooccurrence(self, *names):
+        """
+        Flat indices, within the window, of the cells where all the named species occur together.
+        """
+        return self.cells[self.select(all_of=names)]
+
+    def positions(self, species_range):
+        """
+        Positions, within the index cells, of the cells of a species' range (on the grid of the index),
+        e.g., to read values gathered at the index cells at the species' cells.
+        """
+        row0 = int(round((self.y_max - species_range.y_max) / self.cell_height))
+        col0 = int(round((species_range.x_min - self.x_min) / self.cell_width))
+        rows, cols = np.divmod(species_range.indices.astype(np.int64), species_range.ncols)
+        return np.searchsorted(self.cells, (rows + row0) * self.ncols + cols + col0)
+
+    def gather(self, raster_path, block_rows=None):
+        """
+        Values of a raster on the grid of the index (e.g., aligned TDep) at the index cells, as float64
+        with NaN for NoData. Only the strips of the window that hold index cells are read.
+        """
+        import arcpy as ap
+
+        block_rows = block_rows or raster_blocks.BLOCK_SIZE
+        out = np.full(len(self.cells), np.nan)
+        # The cells are sorted, so the cells of each strip are a contiguous slice
+        bounds = np.searchsorted(self.cells, np.arange(0, self.nrows + block_rows, block_rows) * self.ncols)
+        for i, row_start in enumerate(range(0, self.nrows, block_rows)):
+            if bounds[i] == bounds[i + 1]:
+                continue
+            nrows = min(block_rows, self.nrows - row_start)
+            lower_left = ap.Point(self.x_min, self.y_max - (row_start + nrows) * self.cell_height)
+            block = raster_blocks.read_block(raster_path, lower_left, self.ncols, nrows)
+            out[bounds[i]:bounds[i + 1]] = block.ravel()[self.cells[bounds[i]:bounds[i + 1]] - row_start * self.ncols]
+        return out
+
+    def to_range(self, values):
+        """
+        SpeciesRange over the index cells holding values (one per index cell), e.g., to write a summary
+        of the index cells with SpeciesRange.to_raster.
+        """
+        return SpeciesRange(self.template, self.x_min, self.y_max, self.cell_width, self.cell_height,
+                            self.nrows, self.ncols, self.cells, np.asarray(values, dtype=np.float32))
+
+def index_path(out_dir):
+    """
+    Path of the presence index of out_dir.
+    """
+    return os.path.join(out_dir, INDEX_NAME)
+
+
+def load_presence_index(out_dir, range_paths=None, rebuild=False):
+    """
+    Presence index of out_dir, read from presence_index.npz or built from the cached species ranges
+    (every range in out_dir/spp_ranges unless range_paths is given) and saved. The index is built again
+    if a range file changed since it was saved, or if rebuild is set.
+    """
+    if range_paths is None:
+        ranges_dir = os.path.join(out_dir, RANGES_DIR_NAME)
+        range_paths = [os.path.join(ranges_dir, name) for name in sorted(os.listdir(ranges_dir))
+                       if name.endswith('.npz')]
+    path = index_path(out_dir)
+    if os.path.exists(path) and not rebuild:
+        index = PresenceIndex.load(path)
+        if index.stamps == range_stamps(range_paths):
+            return index
+        print('Species ranges changed since the presence index was saved, building it again')
+    index = PresenceIndex.build(range_paths)
+    index.save(path)
+    return index
@@ -0,0 +1,234 @@
+"""
+#### Module Information ####
+
+Module name: raster_blocks.py
+
+Purpose of module: Read rasters in windows as NumPy arrays, apply a function block by block, and
+    write the result back as a single raster. Only one block of each input is held in memory
+    at a time, so the memory needed is set by the block size rather than the CONUS grid.
+    ArcPy is imported by the functions that call it, so the modules built on this one can be imported
+    without ArcGIS (e.g., by benchmarks.py for the array work of the stages).
+    Rasters of the array store (see array_store.py) are read by their folder with NumPy alone, and can
+    be the template of the blocks and of the rasters written.
+
+Used by: most stages and modules that read or write rasters in blocks (see README_Py.md)
+
+Date Created: 2026-10-18
+
+"""
+
+# Import the necessary modules
+import os
+import tempfile
+import numpy as np
+
+from array_store import META_NAME, StoreRaster, is_store_raster
+
+# Number of rows and columns read per block; 2048 x 2048 float64 is 32 MB per array
+BLOCK_SIZE = 2048
+
+# Bytes of raster blocks read and written by this process so far, used by run_profile.py
+IO_BYTES = {'read': 0, 'written': 0}
+
+
+def block_size_for_memory(memory_limit_mb):
+    """
+    Rows per block so that about 16 float64 block arrays fit in the memory limit (MB), or None for
+    no limit (BLOCK_SIZE is used).
+    """
+    if not memory_limit_mb:
+        return None
+    block_size = int((memory_limit_mb * 1024 ** 2 / (16 * 8)) ** 0.5)
+    return min(max(256, block_size), 4096)
+
+
+def setup_worker(memory_limit_mb=None, scratch_dir=None):
+    """
+    Set up ArcPy in a worker process (see species_parallel.py): check out Spatial Analyst and give the
+    worker its own scratch workspace in scratch_dir, so temporary block rasters from different workers
+    do not share a geodatabase. The scratch_dir is removed by the main process when the pool is done.
+    Returns the rows per block for the memory limit (see block_size_for_memory), passed to each
+    species as block_rows.
+    """
+    import arcpy as ap
+
+    ap.env.overwriteOutput = True
+    ap.CheckOutExtension("Spatial")
+    ap.env.scratchWorkspace = tempfile.mkdtemp(prefix='spp_worker_', dir=scratch_dir)
+    return block_size_for_memory(memory_limit_mb)
+
+
+def open_raster(raster):
+    """
+    Raster object of a raster path: a StoreRaster for a raster of the array store, otherwise an ap.Raster.
+    Both have the grid properties used here (height, width, meanCellWidth, meanCellHeight, extent and
+    spatialReference). Raster objects are returned as they are.
+    """
+    if isinstance(raster, StoreRaster):
+        return raster
+    if is_store_raster(raster):
+        return StoreRaster.open_path(raster)
+    import arcpy as ap
+
+    return raster if isinstance(raster, ap.Raster) else ap.Raster(raster)
+
+
+def iter_blocks(template, block_size=None, block_cols=None):
+    """
+    Yield (lower_left, ncols, nrows) windows that tile the template raster.
+
+    block_size: rows per block; defaults to BLOCK_SIZE
+    block_cols: columns per block; defaults to block_size (square blocks). Pass the raster width
+        to read full-width row strips.
+    """
+    import arcpy as ap
+
+    raster = open_raster(template)
+    block_size = block_size or BLOCK_SIZE
+    block_cols = block_cols or block_size
+    cell_width = raster.meanCellWidth
+    cell_height = raster.meanCellHeight
+    for y in range(0, raster.height, block_size):
+        for x in range(0, raster.width, block_cols):
+            ncols = min(block_cols, raster.width - x)
+            nrows = min(block_size, raster.height - y)
+            lower_left = ap.Point(raster.extent.XMin + x * cell_width, raster.extent.YMin + y * cell_height)
+            yield lower_left, ncols, nrows
+
+
+def read_block(raster, lower_left, ncols, nrows):
+    """
+    Read one window of a raster as a float64 array with NoData set to NaN. Rasters of the array store
+    are read from the chunks that overlap the window (see array_store.py), others with ArcPy.
+    """
+    if is_store_raster(raster):
+        arr = StoreRaster.open_path(raster).read_block(lower_left.X, lower_left.Y, ncols, nrows)
+    else:
+        import arcpy as ap
+
+        arr = ap.RasterToNumPyArray(raster, lower_left, ncols, nrows, nodata_to_value=np.nan)
+    IO_BYTES['read'] += arr.nbytes
+    return arr.astype(np.float64, copy=False)
+
+
+def file_stamp(raster_path):
+    """
+    Size and modified time of the files that hold a raster: every file of the gdb folder for a raster in
+    a file gdb (its tables can not be told apart by name), the meta.json of a raster of the array store
+    (written last by every save), otherwise the raster file itself. The lock files ArcGIS adds to a gdb
+    while it is open are left out.
+    """
+    if is_store_raster(raster_path):
+        raster_path = os.path.join(raster_path, META_NAME)
+    path = raster_path
+    while path and not path.lower().endswith('.gdb') and os.path.dirname(path) != path:
+        path = os.path.dirname(path)
+    if path.lower().endswith('.gdb') and os.path.isdir(path):
+        return [[name, os.stat(os.path.join(path, name)).st_size, os.stat(os.path.join(path, name)).st_mtime_ns]
+                for name in sorted(os.listdir(path)) if not name.endswith('.lock')]
+    stat = os.stat(raster_path)
+    return [[os.path.basename(raster_path), stat.st_size, stat.st_mtime_ns]]
+
+
+def align_to_template(in_raster, template, out_raster_save_path):
+    """
+    Resample a raster (e.g., a TDep grid) onto the cell size, extent and snap of the template
+    raster so that blocks from both line up cell for cell. Only needs to be done once per
+    input grid, not once per species.
+    """
+    import arcpy as ap
+
+    if not ap.Exists(out_raster_save_path):
+        ap.env.cellSize = template
+        ap.env.snapRaster = template
+        ap.env.extent = template
+        ap.env.outputCoordinateSystem = ap.Describe(template).spatialReference
+        ap.sa.Float(in_raster).save(out_raster_save_path)
+        ap.env.extent = None
+    return out_raster_save_path
+
+
+def block_apply(func, in_rasters, out_raster_save_path, template, block_size=None):
+    """
+    Apply func to aligned blocks of the input rasters and save the result as one raster.
+
+    func: called as func(*blocks) with one float64 array per input raster; must return an array
+        of the same shape with NaN for NoData
+    in_rasters: list of raster paths on the same grid as the template
+    out_raster_save_path: path of the output raster
+    template: raster that sets the grid, extent and spatial reference of the output
+
+    Blocks that are entirely NoData are not written. Returns the output path, or None if every
+    block was NoData.
+    """
+    saved = block_apply_multi(lambda *blocks: {0: func(*blocks)}, in_rasters, {0: out_raster_save_path},
+                              template, block_size)
+    return saved.get(0)
+
+
+def block_apply_multi(func, in_rasters, out_raster_save_paths, template, block_size=None):
+    """
+    Apply func to aligned blocks of the input rasters and save several outputs from the same pass.
+
+    func: called as func(*blocks) with one float64 array per input raster; must return a dict with
+        the same keys as out_raster_save_paths and one array per key (NaN for NoData)
+    in_rasters: list of raster paths on the same grid as the template
+    out_raster_save_paths: dict of key -> path of the output raster
+    template: raster that sets the grid, extent and spatial reference of the outputs
+
+    Each input block is read once no matter how many outputs are derived from it. Blocks that are
+    entirely NoData are not written. Returns a dict of key -> output path for the outputs that
+    had data.
+    """
+    raster = open_raster(template)
+    block_rasters = {key: [] for key in out_raster_save_paths}
+    for lower_left, ncols, nrows in iter_blocks(template, block_size):
+        blocks = [read_block(in_raster, lower_left, ncols, nrows) for in_raster in in_rasters]
+        results = func(*blocks)
+        for key, result in results.items():
+            if np.isnan(result).all():
+                continue
+            block_rasters[key].append(block_to_raster(result, lower_left, raster))
+
+    # Mosaic the blocks of each output back into a single raster
+    saved = {}
+    for key, out_raster_save_path in out_raster_save_paths.items():
+        if mosaic_blocks(block_rasters[key], out_raster_save_path, raster):
+            saved[key] = out_raster_save_path
+    return saved
+
+
+def block_to_raster(result, lower_left, raster, nodata=None):
+    """
+    Convert one block of results (NaN for NoData) to a temporary float32 raster placed at lower_left
+    on the grid of the template raster object.
+    nodata: NoData value of an integer block, which is written as a 32-bit integer raster instead
+        (e.g., indices too large to be held exactly as float32)
+    """
+    import arcpy as ap
+
+    if nodata is None:
+        result = result.astype(np.float32)
+    else:
+        result = result.astype(np.int32)
+    IO_BYTES['written'] += result.nbytes
+    return ap.NumPyArrayToRaster(result, lower_left, raster.meanCellWidth, raster.meanCellHeight,
+                                 value_to_nodata=np.nan if nodata is None else nodata)
+
+
+def mosaic_blocks(block_rasters, out_raster_save_path, raster, pixel_type='32_BIT_FLOAT'):
+    """
+    Mosaic temporary block rasters into a single output raster with the spatial reference and cell size
+    of the template raster object, then delete the blocks. Returns False if there were no blocks.
+    pixel_type: '32_BIT_SIGNED' for blocks written with a nodata value (see block_to_raster)
+    """
+    import arcpy as ap
+
+    if not block_rasters:
+        return False
+    out_gdb, out_raster_name = os.path.split(out_raster_save_path)
+    ap.management.MosaicToNewRaster(block_rasters, out_gdb, out_raster_name, raster.spatialReference,
+                                    pixel_type, raster.meanCellWidth, 1)
+    for block_raster in block_rasters:
+        ap.management.Delete(block_raster)
+    return True
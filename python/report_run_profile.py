@@ -0,0 +1,36 @@
+"""
+#### Script Information ####
+
+Script name: report_run_profile.py
+
+Purpose of script: Report the slowest stages, species and (species, element, endpoint) units of the
+    last run of each stage, from the profile records the per-species stages write to out_dir/profile
+    (wall and CPU time, peak memory, raster bytes read and written, cells processed; see run_profile.py).
+    The report is printed and saved as profile_report.txt in out_dir/profile.
+
+Placement in script series: After any of s4-s9 (or run_pipeline.py)
+Outputs needed from: s4_select_horn_spp_calc_proportion.py, s5_calculate_wilson_exceedance.py,
+    s6a/s6b/s6, s7_calculate_summary_rasters.py, s8_basal_area_weight_growth_effects.py, s9a/s9b
+    or s5_s9_species_pass.py
+
+Date Created: 2026-10-18
+
+"""
+
+# Import the necessary modules
+import os
+
+# Profile records of the per-species stages, see run_profile.py
+from run_profile import PROFILE_DIR_NAME, profile_report
+
+# Set path general output directory
+root_dir = <'Insert root directory to converted rasters here'>
+out_dir = os.path.join(root_dir, <'Insert folder directory here'>)
+
+# Number of species and units listed
+top = 20
+
+# Print the report and save it next to the records
+lines = profile_report(out_dir, top)
+with open(os.path.join(out_dir, PROFILE_DIR_NAME, 'profile_report.txt'), 'w') as f:
+    f.write('\n'.join(lines) + '\n')
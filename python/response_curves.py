@@ -0,0 +1,292 @@
+"""
+#### Module Information ####
+
+Module name: response_curves.py
+
+Purpose of module: Array-based evaluation of the Horn et al. (2018) species response curves
+    for both endpoints (growth and survival) and both elements (N and S).
+    The growth and survival curves have the same form, exp(coef * (ln(dep / cl1) / cl2)^2),
+    and only differ in the exponent coefficient (-0.5 for growth, -5.0 for survival), so a
+    single code path covers the forward effect (s6a, s6b) and its basal area weighting (s8), the
+    inverse deposition level (s9a, s9b) and the domain of the curve.
+    The Spatial Analyst chain used previously (Divide, Ln, Divide, Square, Times, Exp for the
+    numerator and again for the denominator inside a Con) created a full-extent intermediate
+    raster for every step. The kernels here work on one block of cells at a time and reuse a
+    single output buffer, so the only full-size object is the saved result.
+
+    The effect of a species only depends on the deposition at a cell, so it can also be tabulated
+    once per species on a fine deposition grid (ResponseTable) and every cell looked up by its bin
+    instead of evaluating the log and exp chain. The grid is refined until every bin is within a set
+    tolerance of the exact formula; cells in the bins at min_dep and dep_max (where the effect jumps)
+    and beyond the table are evaluated exactly.
+
+Used by: effect_rasters.py, species_pass.py, tree_effects.py, benchmarks.py, deposition_scenarios.py
+
+Date Created: 2026-10-18
+
+"""
+
+# Import the necessary modules
+from collections import namedtuple
+
+import numpy as np
+
+# Exponent coefficient and default rate reduction (x in "prevent an x% reduction") per endpoint
+# The survival coefficient is the growth coefficient over t = 10
+ENDPOINTS = {
+    'growth': {'coef': -0.5, 'reduction': 0.05},
+    'survival': {'coef': -5.0, 'reduction': 0.01},
+}
+
+# Lookup tables: starting bin width (kg/ha/yr), largest error allowed against the exact effect (relative
+# to the effect where it is above 1), default upper end of the table (larger values are evaluated exactly)
+# and largest number of bins
+LOOKUP_STEP = 0.01
+LOOKUP_TOLERANCE = 1e-4
+LOOKUP_DEP_LIMIT = 50.0
+LOOKUP_MAX_BINS = 2 ** 18
+
+# Species parameters for one endpoint and element, e.g., (n1, n2, min_n, max_n, ndep_max)
+# dep_max is None for species without a curve maximum (nitrogen-growth increasers)
+CurveParams = namedtuple('CurveParams', ['cl1', 'cl2', 'min_dep', 'max_dep', 'dep_max'])
+
+
+def log_response(dep, params, endpoint, out=None):
+    """
+    Log of the response curve, coef * (ln(dep / cl1) / cl2)^2, evaluated in place.
+
+    dep: deposition values (scalar or array)
+    params: CurveParams for the species
+    endpoint: 'growth' or 'survival'
+    out: optional float64 buffer the same shape as dep to write into
+    """
+    if out is None:
+        out = np.array(dep, dtype=np.float64)
+    np.divide(dep, params.cl1, out=out)
+    np.log(out, out=out)
+    out *= 1.0 / params.cl2
+    np.square(out, out=out)
+    out *= ENDPOINTS[endpoint]['coef']
+    return out
+
+
+def effect(dep, params, endpoint, out=None):
+    """
+    Proportional effect of deposition on a species, exp(f(dep)) / exp(f(ref)) - 1.
+
+    The reference deposition is dep_max where dep > dep_max and min_dep elsewhere, matching
+    the Con used in the original raster calculation. Both references are constants for a
+    species, so the denominator is two scalars instead of a raster. The division is done in
+    log space (exp(a - a_ref) - 1 via expm1) so no extra buffers are needed and the ratio
+    does not underflow to 0/0 far from the curve optimum.
+
+    dep: deposition values for one block
+    params: CurveParams for the species; if dep_max is None, min_dep is used for the reference
+    endpoint: 'growth' or 'survival'
+    out: optional float64 buffer the same shape as dep to write into
+
+    Cells with deposition below min_dep are outside the response curve and are returned as NaN.
+    """
+    dep_max = params.min_dep if params.dep_max is None else params.dep_max
+    # Scalar denominators, computed once per species
+    log_ref_low = float(log_response(params.min_dep, params, endpoint))
+    log_ref_high = float(log_response(dep_max, params, endpoint))
+
+    out = log_response(dep, params, endpoint, out=out)
+    out -= log_ref_low
+    np.subtract(out, log_ref_high - log_ref_low, out=out, where=np.greater(dep, dep_max))
+    np.expm1(out, out=out)
+    # Mask any locations where the deposition is below the domain of the response curve
+    out[np.less(dep, params.min_dep)] = np.nan
+    return out
+
+
+def ba_weighted_effect(proportion, effects):
+    """
+    Basal area weighted effect (s8): the effect at each cell times the species' proportion of the
+    national basal area there. Cells where either is NoData (NaN) stay NoData.
+    """
+    return np.multiply(proportion, effects)
+
+
+def deposition_level(params, endpoint, reduction=None):
+    """
+    Deposition level needed to prevent an x% reduction in the rate relative to dep_max.
+
+    Same calculation as the original s9a/s9b rasters:
+        dep = cl1 * exp(sqrt(ln(dep_max / cl1)^2 + ln(1 - x) / coef))
+    Note the ln(1 - x) term is not multiplied by cl2^2 (n2/s2), as in those scripts.
+
+    params: CurveParams for the species; dep_max may be a scalar or an array
+    endpoint: 'growth' or 'survival'
+    reduction: x as a proportion; defaults to 0.05 for growth and 0.01 for survival
+    """
+    if reduction is None:
+        reduction = ENDPOINTS[endpoint]['reduction']
+    right_side = np.square(np.log(np.divide(params.dep_max, params.cl1)))
+    left_side = np.log(1.0 - reduction) / ENDPOINTS[endpoint]['coef']
+    return params.cl1 * np.exp(np.sqrt(left_side + right_side))
+
+
+def domain_mask(dep, params):
+    """
+    True where deposition is within the domain of the response curve (min_dep <= dep <= max_dep).
+    """
+    return np.greater_equal(dep, params.min_dep) & np.less_equal(dep, params.max_dep)
+
+
+def endpoint_effects(dep_blocks, params_by_endpoint, range_mask=None, tables=None):
+    """
+    Effects for several endpoints and elements from one read of the deposition data.
+
+    dep_blocks: dict of element -> deposition block, e.g., {'n': n_block, 's': s_block}
+    params_by_endpoint: dict of (endpoint, element) -> CurveParams; species without a critical
+        load for an endpoint are simply left out
+    range_mask: optional boolean block, True outside the species' range; those cells are set to NaN
+    tables: optional dict of (endpoint, element) -> ResponseTable, used instead of the exact formula
+
+    Returns a dict of (endpoint, element) -> effect block.
+    """
+    effects = {}
+    for (endpoint, element), params in params_by_endpoint.items():
+        dep = dep_blocks[element]
+        if tables is not None:
+            out = tables[(endpoint, element)].evaluate(dep)
+        else:
+            out = effect(dep, params, endpoint, out=np.empty(np.shape(dep)))
+        if range_mask is not None:
+            out[range_mask] = np.nan
+        effects[(endpoint, element)] = out
+    return effects
+
+
+class ResponseTable(object):
+    """
+    Effect of one species, endpoint and element tabulated in deposition bins. Each bin holds the exact
+    effect at its center; bins that hold min_dep or dep_max, where the effect jumps, hold -inf (the
+    effect is always above -1) and their cells are evaluated exactly, as are cells beyond the table.
+
+    params: CurveParams for the species; endpoint: 'growth' or 'survival'
+    dep_floor: lowest deposition of the table; None starts at min_dep and sets deposition below
+        min_dep to NaN, as effect does
+    high_at_max: use the dep_max reference at dep == dep_max too (as tree_effects does)
+    step, tolerance, dep_limit: see LOOKUP_STEP, LOOKUP_TOLERANCE and LOOKUP_DEP_LIMIT; bins are made
+        narrower until every bin is within tolerance of the exact effect over its width.
+    max_bins: if the tolerance needs more bins than this (a very steep curve, or more bins than there
+        are cells to look up), every cell is evaluated exactly (values is None)
+    max_error: largest difference from the exact effect at the edges of the bins (relative where the
+        effect is above 1), None if no table was built
+    """
+
+    def __init__(self, params, endpoint, dep_floor=None, high_at_max=False, step=LOOKUP_STEP,
+                 tolerance=LOOKUP_TOLERANCE, dep_limit=LOOKUP_DEP_LIMIT, max_bins=LOOKUP_MAX_BINS):
+        self.params = params
+        self.endpoint = endpoint
+        self.mask_below_min = dep_floor is None
+        self.high_at_max = high_at_max
+        self.dep_max = float(params.min_dep if params.dep_max is None else params.dep_max)
+        # Scalar references, as in effect
+        self.log_ref_low = float(log_response(params.min_dep, params, endpoint))
+        self.log_ref_high = float(log_response(self.dep_max, params, endpoint))
+
+        start = float(params.min_dep if dep_floor is None else dep_floor)
+        jumps = [self.dep_max] + ([float(params.min_dep)] if self.mask_below_min else [])
+        n = max(1, int(np.ceil((dep_limit - start) / step)))
+        self.values = None
+        self.max_error = None
+        if n > max_bins:
+            return
+        while True:
+            width = (dep_limit - start) / n
+            edges = start + width * np.arange(n + 1)
+            centers = edges[:-1] + width / 2
+            high = self._is_high(centers)
+            values = self.exact(centers, high)
+            # Bins within rounding of a jump are evaluated exactly
+            at_jump = np.zeros(n, dtype=bool)
+            for jump in jumps:
+                at_jump |= (edges[:-1] - width * 1e-6 <= jump) & (jump <= edges[1:] + width * 1e-6)
+            # The effect has one turning point, so it is furthest from the center value at an edge of the bin
+            error = np.maximum(np.abs(self.exact(edges[:-1], high) - values), np.abs(self.exact(edges[1:], high) - values))
+            error /= np.maximum(1.0, np.abs(values))
+            error[np.isnan(error)] = 0.0 # NaN in the table where the exact effect is NaN too
+            self.max_error = float(np.nanmax(np.where(at_jump, 0.0, error)))
+            # The error falls about in step with the bin width, which gives the bins needed
+            needed = int(np.ceil(1.1 * n * self.max_error / tolerance))
+            if self.max_error <= tolerance or needed > max_bins:
+                break
+            n = max(2 * n, needed)
+
+        if self.max_error <= tolerance:
+            # One -inf bin on both sides, so deposition outside the table is evaluated exactly
+            values[at_jump] = -np.inf
+            self.values = np.concatenate([[-np.inf], values, [-np.inf]])
+            self.origin = start - width
+            self.scale = 1.0 / width
+
+    def _is_high(self, dep):
+        return np.greater_equal(dep, self.dep_max) if self.high_at_max else np.greater(dep, self.dep_max)
+
+    def exact(self, dep, high=None):
+        """
+        Exact effect of deposition values; high: True where the dep_max reference is used (by default
+        above dep_max, or at and above it with high_at_max).
+        """
+        dep = np.asarray(dep, dtype=np.float64)
+        if high is None:
+            high = self._is_high(dep)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            out = log_response(dep, self.params, self.endpoint, out=np.empty(dep.shape))
+        out -= np.where(high, self.log_ref_high, self.log_ref_low)
+        np.expm1(out, out=out)
+        if self.mask_below_min:
+            out[np.less(dep, self.params.min_dep)] = np.nan
+        return out
+
+    def evaluate(self, dep):
+        """
+        Effect of deposition values (scalar or array), as effect returns it (or as tree_effects with
+        dep_floor and high_at_max set).
+        """
+        shape = np.shape(dep)
+        dep = np.asarray(dep, dtype=np.float64).reshape(-1)
+        if self.values is None:
+            return self.exact(dep).reshape(shape)
+        index = np.subtract(dep, self.origin)
+        index *= self.scale
+        with np.errstate(invalid='ignore'): # NaN deposition gives an index that is clipped to a -inf bin
+            index = index.astype(np.intp)
+        out = np.take(self.values, index, mode='clip')
+        redo = out == -np.inf
+        if redo.any():
+            out[redo] = self.exact(dep[redo])
+        return out.reshape(shape)
+
+    def check(self, dep):
+        """
+        Largest difference between the table and the exact effect at deposition values, e.g., the
+        TDep values of a species' cells.
+        """
+        difference = np.abs(self.evaluate(dep) - self.exact(dep))
+        return float(np.nanmax(difference)) if np.isfinite(difference).any() else 0.0
+
+
+def lookup_tables(params_by_endpoint, dep_blocks, step=LOOKUP_STEP, tolerance=LOOKUP_TOLERANCE):
+    """
+    ResponseTable of every endpoint and element, for endpoint_effects(..., tables=...). Each table
+    reaches the largest deposition of its element (at least LOOKUP_DEP_LIMIT), so no cell is beyond it,
+    and has at most one bin per 8 cells, as a larger table costs more to build than it saves.
+
+    params_by_endpoint: dict of (endpoint, element) -> CurveParams
+    dep_blocks: dict of element -> deposition values the tables are used for
+    """
+    dep_limits = {}
+    max_bins = {}
+    for element, dep in dep_blocks.items():
+        dep = np.asarray(dep)
+        finite = dep[np.isfinite(dep)]
+        dep_limits[element] = max(LOOKUP_DEP_LIMIT, float(finite.max()) if finite.size else 0.0)
+        max_bins[element] = min(LOOKUP_MAX_BINS, dep.size // 8)
+    return {(endpoint, element): ResponseTable(params, endpoint, step=step, tolerance=tolerance,
+                                               dep_limit=dep_limits[element], max_bins=max_bins[element])
+            for (endpoint, element), params in params_by_endpoint.items()}
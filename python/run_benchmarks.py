@@ -0,0 +1,63 @@
+"""
+#### Script Information ####
+
+Script name: run_benchmarks.py
+
+Purpose of script: Time every stage of the script series (s2 - s9) on seeded synthetic inputs and save
+    the results as JSON, optionally comparing them with the results of another version. See
+    benchmarks.py for what each stage's benchmark covers and synthetic_inputs.py for the inputs.
+    The synthetic inputs are generated in work_dir/inputs on the first run and re-used afterwards.
+
+Usage: python run_benchmarks.py work_dir --preset laptop
+    python run_benchmarks.py work_dir --preset full --repeat 1 --label my-branch
+    python run_benchmarks.py work_dir --stages s6 s7 --compare baseline_results.json
+    (exits with 1 if a stage is slower than the baseline by more than --tolerance)
+
+Placement in script series: Development; not needed to produce the outputs
+Outputs needed from: None (the inputs are synthetic)
+
+Date Created: 2026-10-18
+
+"""
+
+# Import the necessary modules
+import argparse
+import os
+import sys
+import timeit
+
+# Stage benchmarks and synthetic inputs, see benchmarks.py and synthetic_inputs.py
+from benchmarks import STAGE_ORDER, TOLERANCE, compare_results, run_benchmarks
+from synthetic_inputs import PRESETS
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark s2 - s9 on synthetic inputs')
+    parser.add_argument('work_dir', help='folder for the synthetic inputs and the benchmark outputs')
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='laptop', help='grid size and species count')
+    parser.add_argument('--nrows', type=int, help='grid rows (overrides the preset)')
+    parser.add_argument('--ncols', type=int, help='grid columns (overrides the preset)')
+    parser.add_argument('--species', type=int, help='number of species (overrides the preset)')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the synthetic inputs')
+    parser.add_argument('--stages', nargs='+', default=STAGE_ORDER, help='stages to time')
+    parser.add_argument('--repeat', type=int, default=3, help='runs of each benchmark')
+    parser.add_argument('--label', help='name of the version measured, saved with the results')
+    parser.add_argument('--results', help='results file, default work_dir/benchmark_results.json')
+    parser.add_argument('--compare', help='results file of a baseline to compare with')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE, help='relative change reported as slower')
+    args = parser.parse_args()
+
+    # Record start time
+    start_time = timeit.default_timer()
+
+    # Begin the benchmarks
+    preset = PRESETS[args.preset]
+    results_path = args.results or os.path.join(args.work_dir, 'benchmark_results.json')
+    run_benchmarks(args.work_dir, args.nrows or preset['nrows'], args.ncols or preset['ncols'],
+                   args.species or preset['n_species'], args.seed, preset['cell_size'], args.stages,
+                   args.repeat, results_path, args.label)
+    slower = compare_results(args.compare, results_path, args.tolerance) if args.compare else []
+
+    # Calculate time elapsed and print
+    elapsed_min = (timeit.default_timer() - start_time) / 60
+    print('Benchmarks took ', elapsed_min, 'minutes')
+    sys.exit(1 if slower else 0)
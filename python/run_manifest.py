@@ -0,0 +1,297 @@
+"""
+#### Module Information ####
+
+Module name: run_manifest.py
+
+Purpose of module: Run manifest for incremental re-runs of the per-species stages. The scripts used to
+    skip an output whenever it existed (ap.Exists), so editing one species' n1/n2 in growth.csv or
+    swapping in a new TDep raster left stale outputs that silently survived a re-run, and the only
+    safe option was to delete whole geodatabases and recompute every species.
+    The manifest (run_manifest.json in out_dir) records, for each output raster, a key hashed from
+    everything the output depends on: the content of the input rasters (TDep and the species'
+    proportion values), the species' parameter row, the equation variant (product, endpoint, element,
+    reduction) and the code version (the source of the modules that calculate it). A re-run only
+    recomputes outputs whose key changed, whose raster is missing, or that have no record yet.
+
+    Input rasters are hashed by content. The hash is kept in the manifest with a stamp of the files that
+    hold the raster (the whole gdb folder for rasters in a file gdb), so a raster is only read again
+    for hashing when those files change.
+
+    Several scripts can run at the same time on the same out_dir (see pipeline.py): each save merges
+    the records this process changed into the file on disk, under a lock file.
+
+    Outputs that are one value over the species' range (the deposition levels of s9a/s9b) are recorded
+    as that value plus the path of the species' cached range (see species_ranges.py), which is the
+    mask of the cells it covers; the raster itself is only written on request (see save_level).
+
+Used by: effect_rasters.py, species_pass.py, pipeline.py, ba_sum.py, s7_calculate_summary_rasters.py, deposition_scenarios.py
+
+Date Created: 2026-10-18
+
+"""
+
+# Import the necessary modules
+import hashlib
+import json
+import os
+import time
+from contextlib import contextmanager
+import numpy as np
+
+from raster_blocks import align_to_template, file_stamp, iter_blocks, read_block
+from species_ranges import SpeciesRange
+
+# Manifest file saved in out_dir
+MANIFEST_NAME = 'run_manifest.json'
+
+# Seconds to wait for the manifest lock before treating it as left over from a killed process
+LOCK_TIMEOUT = 120
+
+# Modules whose code sets the values of the per-species products. effect_rasters.py (s6, s9) and
+# species_pass.py (s5_s9) write the same products from them, so their keys only use these modules
+KERNEL_MODULES = ('response_curves.py', 'species_ranges.py')
+
+
+def hash_parts(**parts):
+    """
+    Hash of a set of named values (numbers, strings, lists, dicts), independent of their order.
+    """
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def code_version(*module_names):
+    """
+    Hash of the source of the listed modules in this folder, e.g., code_version('response_curves.py').
+    Any change to the calculation code gives a new version, so its outputs are recomputed.
+    """
+    sha = hashlib.sha256()
+    for module_name in module_names:
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), module_name), 'rb') as f:
+            sha.update(f.read())
+    return sha.hexdigest()
+
+
+def raster_hash(raster_path, block_size=None):
+    """
+    Hash of the cell values and placement of a raster, read one block at a time.
+    """
+    sha = hashlib.sha256()
+    for lower_left, ncols, nrows in iter_blocks(raster_path, block_size):
+        sha.update('{} {} {} {}'.format(lower_left.X, lower_left.Y, ncols, nrows).encode())
+        sha.update(read_block(raster_path, lower_left, ncols, nrows).tobytes())
+    return sha.hexdigest()
+
+
+@contextmanager
+def file_lock(lock_path, timeout=LOCK_TIMEOUT):
+    """
+    Hold a lock file while the block runs, so only one process at a time updates the manifest.
+    A lock file older than the timeout is left over from a process that was killed while saving; it is
+    removed once and the lock is tried again. Newer lock files belong to a live process and are waited on.
+    """
+    broken = False
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            pass
+        try:
+            stale = time.time() - os.path.getmtime(lock_path) > timeout
+        except FileNotFoundError:
+            continue # Released in the meantime
+        if stale and not broken:
+            broken = True
+            try:
+                os.remove(lock_path)
+            except FileNotFoundError:
+                pass
+            continue
+        time.sleep(0.1)
+    try:
+        yield
+    finally:
+        os.close(fd)
+        try:
+            os.remove(lock_path)
+        except FileNotFoundError:
+            pass
+
+
+class RunManifest(object):
+    """
+    Keys of the outputs written by earlier runs and content hashes of the input rasters.
+
+    path: manifest file
+    outputs: dict of output raster path -> {'key': hash of its inputs, 'written': False if every value
+        was NoData, so no raster was saved}; outputs saved by save_level also have 'level' (the value
+        over the range) and 'range' (the cached range it covers), and 'written' is False until the
+        raster is written
+    inputs: dict of input raster path -> {'stamp': file_stamp, 'hash': raster_hash}
+    """
+
+    def __init__(self, path, outputs=None, inputs=None):
+        self.path = path
+        self.outputs = outputs or {}
+        self.inputs = inputs or {}
+        self.changed_inputs = set()
+        self._updated = {'outputs': set(), 'inputs': set()} # Records changed by this process
+
+    @classmethod
+    def load(cls, out_dir):
+        """
+        Manifest of out_dir, empty if no run has saved one yet.
+        """
+        path = os.path.join(out_dir, MANIFEST_NAME)
+        if not os.path.exists(path):
+            return cls(path)
+        with open(path) as f:
+            manifest = json.load(f)
+        return cls(path, manifest['outputs'], manifest['inputs'])
+
+    def save(self):
+        """
+        Merge the records changed by this process into the manifest file, keeping records saved by other
+        processes in the meantime. Written to a temporary file first so an interrupted save keeps the last one.
+        """
+        with file_lock(self.path + '.lock'):
+            if os.path.exists(self.path):
+                with open(self.path) as f:
+                    on_disk = json.load(f)
+            else:
+                on_disk = {'outputs': {}, 'inputs': {}}
+            for records in ['outputs', 'inputs']:
+                on_disk[records].update({path: getattr(self, records)[path] for path in self._updated[records]})
+                setattr(self, records, on_disk[records])
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(on_disk, f, indent=1, sort_keys=True)
+            os.replace(tmp_path, self.path)
+
+    def input_hash(self, raster_path):
+        """
+        Content hash of an input raster, re-read only if its files changed since the last run.
+        Rasters that were (re-)hashed are added to changed_inputs.
+        """
+        stamp = file_stamp(raster_path)
+        record = self.inputs.get(raster_path)
+        if record is None or record['stamp'] != stamp:
+            content = raster_hash(raster_path)
+            if record is None or record['hash'] != content:
+                self.changed_inputs.add(raster_path)
+            record = self.inputs[raster_path] = {'stamp': stamp, 'hash': content}
+            self._updated['inputs'].add(raster_path)
+        return record['hash']
+
+    def is_current(self, out_raster_save_path, key):
+        """
+        True if the output was made from the same inputs and its raster still exists.
+        """
+        import arcpy as ap
+
+        record = self.outputs.get(out_raster_save_path)
+        return (record is not None and record['key'] == key
+                and (not record['written'] or ap.Exists(out_raster_save_path)))
+
+    def update(self, records):
+        """
+        Add the records returned by a species task (dict of output path -> record) and save.
+        """
+        if records:
+            self.outputs.update(records)
+            self._updated['outputs'].update(records)
+            self.save()
+
+
+def prepare_tdep(out_dir, template, elements, tdep_suffixes, manifest):
+    """
+    Align the TDep rasters in tdep.gdb (e.g., n_tw_1719) to the grid of the template (a proportion raster)
+    in Scratch.gdb, once per element and period, and hash their content. An aligned copy is made again
+    when its TDep raster changed since the last run.
+
+    Returns (tdep_aligned, tdep_hashes): dicts of (element, period) -> aligned raster / content hash.
+    """
+    import arcpy as ap
+
+    # Set scratch workspace to hold the TDep rasters aligned to the species grid
+    scratch_gdb_path = os.path.join(out_dir, 'Scratch.gdb')
+    if not ap.Exists(scratch_gdb_path):
+        ap.CreateFileGDB_management(out_dir, 'Scratch.gdb')
+
+    tdep_aligned = {}
+    tdep_hashes = {}
+    for element in elements:
+        for suffix in tdep_suffixes:
+            tdep_Raster = os.path.join(out_dir, 'tdep.gdb//{}_tw_{}'.format(element, suffix))
+            tdep_aligned_path = os.path.join(scratch_gdb_path, '{}_tw_{}_aligned'.format(element, suffix))
+            tdep_hashes[(element, suffix)] = manifest.input_hash(tdep_Raster)
+            if tdep_Raster in manifest.changed_inputs and ap.Exists(tdep_aligned_path):
+                ap.management.Delete(tdep_aligned_path) # Re-align a TDep raster that was replaced
+            tdep_aligned[(element, suffix)] = align_to_template(tdep_Raster, template, tdep_aligned_path)
+    manifest.save()
+    return tdep_aligned, tdep_hashes
+
+
+def save_output(species_range, values, out_raster_save_path, key, records):
+    """
+    Write values at the species' cells (see SpeciesRange.to_raster) and add the output's record to
+    records. An existing raster is deleted when the new values are all NoData, so it does not go stale.
+    Returns the output path, or None if nothing was written.
+    """
+    import arcpy as ap
+
+    saved = species_range.to_raster(values, out_raster_save_path)
+    if saved is None and ap.Exists(out_raster_save_path):
+        ap.management.Delete(out_raster_save_path)
+    records[out_raster_save_path] = {'key': key, 'written': saved is not None}
+    return saved
+
+
+def save_level(species_range, level, out_raster_save_path, key, records, range_path, write_raster=False):
+    """
+    Record a value that is the same at every cell of the species' range (e.g., a deposition level) as
+    one number plus the range it covers (range_path, the species' cached range), and add the output's
+    record to records. The raster is only written when write_raster is set, or later by
+    materialize_levels; otherwise a raster left from an earlier run is deleted, so it does not go stale.
+    Returns the record.
+    """
+    import arcpy as ap
+
+    if write_raster:
+        save_output(species_range, np.full(len(species_range), level), out_raster_save_path, key, records)
+    else:
+        if ap.Exists(out_raster_save_path):
+            ap.management.Delete(out_raster_save_path)
+        records[out_raster_save_path] = {'key': key, 'written': False}
+    records[out_raster_save_path].update(level=float(level), range=range_path)
+    return records[out_raster_save_path]
+
+
+def level_records(manifest, gdb_path):
+    """
+    Records of the outputs in a gdb saved by save_level, as a dict of raster name -> record.
+    """
+    gdb_path = os.path.normpath(gdb_path)
+    return {os.path.basename(path): record for path, record in manifest.outputs.items()
+            if 'level' in record and os.path.normpath(os.path.dirname(path)) == gdb_path}
+
+
+def materialize_levels(manifest, gdb_path):
+    """
+    Write the rasters of the outputs in a gdb that were saved as a level only (see save_level), each
+    over the cells of its range, and record them as written.
+    Returns the paths of the rasters written.
+    """
+    import arcpy as ap
+
+    records = {}
+    for name, record in sorted(level_records(manifest, gdb_path).items()):
+        out_raster_save_path = os.path.join(gdb_path, name)
+        if record['written'] and ap.Exists(out_raster_save_path):
+            continue
+        species_range = SpeciesRange.load(record['range'])
+        saved = species_range.to_raster(np.full(len(species_range), record['level']), out_raster_save_path)
+        records[out_raster_save_path] = dict(record, written=saved is not None)
+        print('Wrote deposition level', record['level'], 'over the range of', name)
+    manifest.update(records)
+    return sorted(path for path, record in records.items() if record['written'])
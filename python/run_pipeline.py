@@ -0,0 +1,46 @@
+"""
+#### Script Information ####
+
+Script name: run_pipeline.py
+
+Purpose of script: Run the script series (s1 - s9) from one config file instead of editing the
+    <'Insert ...'> placeholders into every script and running the scripts by hand in order.
+    Independent stages (e.g., s5, s6a, s6b, s9a and s9b after s4) run at the same time up to the
+    max_workers budget of the config, and an interrupted run resumes with the stages that did not
+    finish. See pipeline.py for the stages and the config file, and pipeline_config.json for an example.
+
+Usage: python run_pipeline.py pipeline_config.json
+    python run_pipeline.py pipeline_config.json --restart (run every stage again)
+
+Placement in script series: Runs #1 - #9
+Outputs needed from: the inputs of s1_ba_export_to_single_gdb.py, growth.csv, survival.csv and tdep.gdb
+
+Date Created: 2026-10-18
+
+"""
+
+# Import the necessary modules
+import argparse
+import sys
+import timeit
+
+# Stage graph and scheduler, see pipeline.py
+from pipeline import run_pipeline
+
+# Worker processes re-import this script, so only run the pipeline from the main process
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run the s1 - s9 scripts from a config file')
+    parser.add_argument('config_path', help='JSON config file, see pipeline_config.json')
+    parser.add_argument('--restart', action='store_true', help='ignore the saved state and run every stage')
+    args = parser.parse_args()
+
+    # Record start time
+    start_time = timeit.default_timer()
+
+    # Begin the pipeline
+    status = run_pipeline(args.config_path, args.restart)
+
+    # Calculate time elapsed and print
+    elapsed_min = (timeit.default_timer() - start_time) / 60
+    print('Pipeline took ', elapsed_min, 'minutes:', status)
+    sys.exit(1 if any(value in ('failed', 'blocked') for value in status.values()) else 0)
@@ -0,0 +1,277 @@
+"""
+#### Module Information ####
+
+Module name: run_profile.py
+
+Purpose of module: Profile records of the per-species stages. Each script used to print only its
+    total elapsed minutes, so a slow run could not be traced to I/O, to one species with a huge range,
+    or to the percentile step in s7.
+    Every unit of work (a stage's species, and within a species an element and endpoint) is timed
+    with profile_unit, which records its wall time, CPU time, peak memory (RSS), the bytes of raster
+    blocks read and written (see raster_blocks.IO_BYTES), the bytes read and written on disk by the
+    process (where the platform reports them) and the number of cells processed (see count_cells).
+    Records are appended as JSON lines to out_dir/profile, one file per stage and process, so worker
+    processes never write to the same file. profile_report summarizes the slowest stages, species
+    and units of the last run of each stage.
+
+    A CPU time well below the wall time means the unit was waiting, mostly on reading or writing rasters.
+    Peak RSS is the peak of the unit on Linux; elsewhere it is the peak of the process up to the end
+    of the unit.
+
+Used by: every stage that records a run profile, and report_run_profile.py (see README_Py.md)
+
+Date Created: 2026-10-18
+
+"""
+
+# Import the necessary modules
+import glob
+import json
+import os
+import sys
+import time
+import timeit
+from contextlib import contextmanager
+
+import raster_blocks
+
+# Folder in out_dir that holds the profile records
+PROFILE_DIR_NAME = 'profile'
+
+# Environment variables that pass the profile folder, stage and run to worker processes
+PROFILE_DIR_ENV = 'SPP_PROFILE_DIR'
+PROFILE_STAGE_ENV = 'SPP_PROFILE_STAGE'
+PROFILE_RUN_ENV = 'SPP_PROFILE_RUN'
+
+# Units that are open in this process, outermost first
+_active_units = []
+
+
+def start_profile(out_dir, stage=None):
+    """
+    Write the profile records of this process, and of the worker processes it starts, to out_dir/profile.
+
+    stage: name of the stage in the records; defaults to the name of the script that is run, e.g.,
+        's6a_effects_eqn_growth' (the pipeline runs stages as e.g. s6a_n.py)
+    A stage that is already started in this process (e.g., s5_s9_species_pass.py calling
+    run_species_pass) keeps its name and run.
+    """
+    if os.environ.get(PROFILE_DIR_ENV):
+        return
+    profile_dir = os.path.join(out_dir, PROFILE_DIR_NAME)
+    os.makedirs(profile_dir, exist_ok=True)
+    os.environ[PROFILE_DIR_ENV] = profile_dir
+    os.environ[PROFILE_STAGE_ENV] = stage or os.path.splitext(os.path.basename(sys.argv[0]))[0] or 'interactive'
+    os.environ[PROFILE_RUN_ENV] = time.strftime('%Y-%m-%dT%H:%M:%S')
+
+
+def _read_peak_rss():
+    """
+    Peak resident memory of this process in bytes, or None where it can not be read.
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        pass
+    else:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024 # bytes on macOS, KB on Linux
+    try:
+        import psutil
+    except ImportError:
+        return None
+    memory = psutil.Process().memory_info()
+    return getattr(memory, 'peak_wset', memory.rss) # Peak working set on Windows
+
+
+def _reset_peak_rss():
+    """
+    Reset the peak resident memory of this process to the current value (Linux only).
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def _read_disk_bytes():
+    """
+    (bytes read, bytes written) on disk by this process so far, or (None, None) where they can not be read.
+    """
+    try:
+        with open('/proc/self/io') as f:
+            counters = dict(line.split(': ') for line in f.read().splitlines())
+        return int(counters['read_bytes']), int(counters['write_bytes'])
+    except (OSError, KeyError, ValueError):
+        pass
+    try:
+        import psutil
+        io = psutil.Process().io_counters()
+        return io.read_bytes, io.write_bytes
+    except (ImportError, AttributeError, OSError):
+        return None, None
+
+
+def _fold_peak_rss():
+    """
+    Add the peak memory since the last reset to every open unit, then reset it, so a unit that starts
+    inside another does not lose the peak of the outer unit.
+    """
+    peak = _read_peak_rss()
+    if peak is not None:
+        for unit in _active_units:
+            unit['peak_rss'] = max(unit['peak_rss'] or 0, peak)
+    _reset_peak_rss()
+
+
+def count_cells(n):
+    """
+    Add n processed cells to every open unit, e.g., count_cells(len(species_range)).
+    """
+    for unit in _active_units:
+        unit['cells'] += int(n)
+
+
+def _write_record(record):
+    """
+    Append a record to this process's file in the profile folder, if start_profile was called.
+    """
+    profile_dir = os.environ.get(PROFILE_DIR_ENV)
+    if not profile_dir:
+        return
+    path = os.path.join(profile_dir, '{}_{}.jsonl'.format(record['stage'], os.getpid()))
+    with open(path, 'a') as f:
+        f.write(json.dumps(record) + '\n')
+
+
+@contextmanager
+def profile_unit(species=None, element=None, endpoint=None):
+    """
+    Time the block as one unit of the stage and write its record (see start_profile). Units can be
+    nested, e.g., one per element inside the unit of a species.
+
+    species: species raster, e.g., 's121_proportion'; element: 'n' or 's'; endpoint: e.g., 'growth'
+    Yields the record, which holds the totals once the block has finished.
+    """
+    _fold_peak_rss()
+    disk_read, disk_written = _read_disk_bytes()
+    unit = {'stage': os.environ.get(PROFILE_STAGE_ENV, ''), 'run': os.environ.get(PROFILE_RUN_ENV, ''),
+            'species': species, 'element': element, 'endpoint': endpoint, 'depth': len(_active_units),
+            'pid': os.getpid(), 'start': time.time(), 'status': 'failed', 'cells': 0, 'peak_rss': None}
+    raster_read, raster_written = raster_blocks.IO_BYTES['read'], raster_blocks.IO_BYTES['written']
+    start_wall, start_cpu = timeit.default_timer(), time.process_time()
+    _active_units.append(unit)
+    try:
+        yield unit
+        unit['status'] = 'done'
+    finally:
+        _fold_peak_rss()
+        _active_units.remove(unit)
+        unit['wall_s'] = timeit.default_timer() - start_wall
+        unit['cpu_s'] = time.process_time() - start_cpu
+        unit['raster_bytes_read'] = raster_blocks.IO_BYTES['read'] - raster_read
+        unit['raster_bytes_written'] = raster_blocks.IO_BYTES['written'] - raster_written
+        end_read, end_written = _read_disk_bytes()
+        unit['disk_bytes_read'] = end_read - disk_read if disk_read is not None else None
+        unit['disk_bytes_written'] = end_written - disk_written if disk_written is not None else None
+        _write_record(unit)
+
+
+def load_profile(out_dir, last_run=True):
+    """
+    Records in out_dir/profile, as a list of dicts.
+    last_run: keep only the records of the last run of each stage
+    """
+    records = []
+    for path in sorted(glob.glob(os.path.join(out_dir, PROFILE_DIR_NAME, '*.jsonl'))):
+        with open(path) as f:
+            records.extend(json.loads(line) for line in f if line.strip())
+    if last_run:
+        last = {}
+        for record in records:
+            last[record['stage']] = max(last.get(record['stage'], ''), record['run'])
+        records = [record for record in records if record['run'] == last[record['stage']]]
+    return records
+
+
+def _totals(records):
+    """
+    Sum of the measures of a group of records; peak RSS is the largest of the group.
+    """
+    total = {'n': len(records), 'failed': sum(record['status'] != 'done' for record in records)}
+    for measure in ['wall_s', 'cpu_s', 'cells', 'raster_bytes_read', 'raster_bytes_written',
+                    'disk_bytes_read', 'disk_bytes_written']:
+        values = [record[measure] for record in records if record[measure] is not None]
+        total[measure] = sum(values) if values else None
+    peaks = [record['peak_rss'] for record in records if record['peak_rss'] is not None]
+    total['peak_rss'] = max(peaks) if peaks else None
+    return total
+
+
+def _format_row(name, total, elapsed=None):
+    """
+    One line of the report.
+    """
+    def mb(value):
+        return '{:9.1f}'.format(value / 1024 ** 2) if value is not None else '      n/a'
+    cpu_share = total['cpu_s'] / total['wall_s'] if total['wall_s'] else 0.0
+    return '{:<40} {:>9} {:9.1f} {:9.1f} {:6.0%} {} {} {} {:>13,} {:>5}'.format(
+        name[:40], '{:.1f}'.format(elapsed) if elapsed is not None else '', total['wall_s'], total['cpu_s'],
+        cpu_share, mb(total['peak_rss']), mb(total['raster_bytes_read']), mb(total['raster_bytes_written']),
+        total['cells'], total['failed'] or '')
+
+
+def profile_report(out_dir, top=10):
+    """
+    Print the stages, the slowest species and the slowest (species, element, endpoint) units of the
+    last run of each stage, and return the report as a list of lines.
+
+    Stage elapsed is the time from the first unit's start to the last unit's end; wall and CPU are
+    summed over the species (several run at the same time with more than one worker). cpu% is CPU
+    over wall time; a low share points to time spent reading and writing rasters.
+    """
+    records = load_profile(out_dir)
+    header = '{:<40} {:>9} {:>9} {:>9} {:>6} {:>9} {:>9} {:>9} {:>13} {:>5}'.format(
+        '', 'elapsed s', 'wall s', 'cpu s', 'cpu%', 'peak MB', 'read MB', 'write MB', 'cells', 'fail')
+    lines = []
+
+    # Stages: the outermost units of each process, so nested units are not counted twice
+    lines += ['Stages (last run of each)', header]
+    stages = {}
+    for record in records:
+        stages.setdefault(record['stage'], []).append(record)
+    for stage, stage_records in sorted(stages.items(), key=lambda item: -sum(
+            record['wall_s'] for record in item[1] if record['depth'] == 0)):
+        elapsed = (max(record['start'] + record['wall_s'] for record in stage_records)
+                   - min(record['start'] for record in stage_records))
+        lines.append(_format_row(stage, _totals([record for record in stage_records if record['depth'] == 0]),
+                                 elapsed))
+
+    # Species: the unit of the whole species in each stage
+    species = [record for record in records if record['species'] and not record['element']]
+    lines += ['', 'Slowest species', header]
+    for record in sorted(species, key=lambda record: -record['wall_s'])[:top]:
+        lines.append(_format_row('{} {}'.format(record['stage'], record['species']), _totals([record])))
+
+    # Units: (stage, species, element, endpoint), summed over the period batches of a species
+    units = {}
+    for record in records:
+        if record['element'] or record['endpoint']:
+            key = (record['stage'], record['species'] or '', record['element'] or '', record['endpoint'] or '')
+            units.setdefault(key, []).append(record)
+    unit_totals = sorted(((key, _totals(unit_records)) for key, unit_records in units.items()),
+                         key=lambda item: -item[1]['wall_s'])
+    lines += ['', 'Slowest units (stage, species, element, endpoint)', header]
+    for key, total in unit_totals[:top]:
+        lines.append(_format_row(' '.join(part for part in key if part), total))
+
+    print('\n'.join(lines))
+    return lines
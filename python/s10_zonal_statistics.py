@@ -0,0 +1,80 @@
+"""
+#### Script Information ####
+
+Script name: s10_zonal_statistics.py
+
+Purpose of script: Summarize the aggregate rasters of s7 (e.g., the 5th percentile of the deposition
+    level needed to prevent a 5% growth reduction) by state, county, ecoregion or any other zones:
+    count, sum, mean, min, max and the chosen percentiles of every raster for every zone
+
+Note: Every raster of aggregate.gdb is summarized from one streamed read per zone layer (see
+    zonal_statistics.py), instead of running Zonal Statistics as Table once per raster and zone layer.
+    Zone layers are polygons (rasterized once onto the national forest grid and cached in zones.gdb)
+    or a zone raster on that grid. Results are tidy csv tables in out_dir/zonal, one row per zone
+    and raster, with the key fields of each zone (e.g., STUSPS).
+
+Placement in script series: #10 (after s7)
+Outputs needed from: s7_calculate_summary_rasters.py, s3_ba_sum_natl_forest.py
+
+Author: Justin G. Coughlin, M.S.
+Date Created: 2026-10-18
+Email: justin.coughlin@outlook.com
+
+"""
+
+# Import the necessary modules
+import os
+import timeit
+import arcpy as ap
+
+# Streamed zonal statistics of many rasters at once, see zonal_statistics.py
+from zonal_statistics import tidy_columns, write_columns, write_csv, zonal_statistics, zone_layer
+from run_profile import profile_unit, start_profile
+
+# Set up environment
+ap.env.overwriteOutput = True
+ap.CheckOutExtension("Spatial")
+ap.env.parallelProcessingFactor = "100%"
+
+# Set path general output directory
+root_dir = <'Insert root directory to converted rasters here'>
+out_dir = os.path.join(root_dir, <'Insert folder directory here'>)
+natl_forest_raster = os.path.join(out_dir, 'ba_null.gdb', 'ba_null_natl_forest') # Output from s3_ba_sum_natl_forest.py
+aggregate_gdb_path = os.path.join(out_dir, 'aggregate.gdb') # Output from s7_calculate_summary_rasters.py
+zonal_out_path = os.path.join(out_dir, 'zonal')
+
+# Zone layers: name -> [polygon feature class, [key fields]], or name -> zone raster on the national forest grid
+zone_layers = {} # e.g., {'state': ['C:/gis/states.shp', ['STUSPS']], 'ecoregion': ['C:/gis/na_cec_eco_l1.shp', ['NA_L1CODE', 'NA_L1NAME']]}
+
+# Percentiles of every zone (as proportions), e.g., [0.05, 0.5] for the 5th percentile and the median
+probs = [0.05, 0.5]
+memory_budget_mb = 4096 # Memory for the values kept for the percentiles; lower it on smaller machines
+save_columns = False # Also save the tables as one .npy file per column (zonal/{layer}_columns)
+
+# Record start time
+start_time = timeit.default_timer()
+start_profile(out_dir)
+if not os.path.exists(zonal_out_path): # Create the directory if it does not exist
+    os.makedirs(zonal_out_path)
+
+# Every aggregate raster is summarized in the same pass
+ap.env.workspace = aggregate_gdb_path
+rasters = {raster: os.path.join(aggregate_gdb_path, raster) for raster in ap.ListRasters() or []}
+print('Rasters to summarize:', sorted(rasters))
+
+for layer, zones in zone_layers.items():
+    # Polygons are rasterized once onto the national forest grid, a zone raster is used as it is
+    zone_raster_path, key_fields, keys = zone_layer(zones, natl_forest_raster, out_dir, layer)
+
+    print('Summarizing by', layer, '...')
+    with profile_unit(layer):
+        labels, cells, stats = zonal_statistics(zone_raster_path, rasters, probs, memory_budget_mb=memory_budget_mb)
+    columns = tidy_columns(labels, cells, stats, key_fields, keys)
+    out_csv_path = write_csv(columns, os.path.join(zonal_out_path, '{}_zonal_statistics.csv'.format(layer)))
+    if save_columns:
+        write_columns(columns, os.path.join(zonal_out_path, '{}_columns'.format(layer)))
+    print(len(labels), 'zones of', layer, 'saved to', out_csv_path, '\n')
+
+# Calculate time elapsed and print
+elapsed_min = (timeit.default_timer() - start_time) / 60
+print('zonal statistics took', elapsed_min, 'minutes')
@@ -0,0 +1,70 @@
+"""
+#### Script Information ####
+
+Script name: s11_deposition_scenarios.py
+
+Purpose of script: Map the effects of deposition scenarios, e.g., N deposition reduced by 10, 20, 30
+    and 50%: number of species in exceedance, exceeded basal area proportion, basal area weighted
+    effect and 5th percentile of the effects across species, for every scenario, endpoint and element,
+    plus zonal tables of these rasters by state, county or ecoregion
+
+Note: Scenarios scale the TDep deposition uniformly, by region (a zone raster or polygons, e.g.,
+    states), and/or replace it with another deposition raster. All scenarios are evaluated in one pass
+    over the species' cached ranges (see deposition_scenarios.py) instead of rerunning s5 - s8 and s7
+    on a scaled TDep raster once per scenario. Outputs go to one gdb per scenario (scenario_{name}.gdb),
+    and scenarios already calculated with the same settings and inputs are skipped.
+
+Placement in script series: #11 (after s4 and the TDep rasters; independent of s5 - s10)
+Outputs needed from: s3_ba_sum_natl_forest.py, s4_select_horn_spp_calc_proportion.py
+
+Author: Justin G. Coughlin, M.S.
+Date Created: 2026-10-18
+Email: justin.coughlin@outlook.com
+
+"""
+
+# Import the necessary modules
+import os
+import timeit
+import arcpy as ap
+
+# Every scenario evaluated in one pass over the species, see deposition_scenarios.py
+from deposition_scenarios import AGGREGATES, run_deposition_scenarios, scenario_zonal_tables
+
+# Set up environment
+ap.env.overwriteOutput = True
+ap.CheckOutExtension("Spatial")
+ap.env.parallelProcessingFactor = "100%"
+
+# Set path general output directory
+root_dir = <'Insert root directory to converted rasters here'>
+out_dir = os.path.join(root_dir, <'Insert folder directory here'>)
+
+# Create variable lists for looping thru
+response_variables = ['growth', 'survival']
+elements = ['n', 's']
+tdep_suffix = '1719' # TDep raster period the scenarios start from, i.e., n_tw_1719 / s_tw_1719
+
+# Scenarios: name -> {'scale': factor, 'regions': zone raster or [polygons, key field], 'region_scales': {region: factor},
+# 'rasters': {element: substitute deposition raster}, 'elements': [elements the scales apply to]}; {} is the baseline
+scenarios = {'baseline': {}, 'n_minus_10': {'scale': 0.9, 'elements': ['n']}, 'n_minus_20': {'scale': 0.8, 'elements': ['n']}, 'n_minus_30': {'scale': 0.7, 'elements': ['n']}, 'n_minus_50': {'scale': 0.5, 'elements': ['n']}}
+aggregates = AGGREGATES # Any of 'exceedance_count', 'exceeded_proportion', 'ba_weighted_effect', 'effect_percentile'
+percentile = 5 # Percentile of the effects across species
+memory_budget_mb = 4096 # Memory for the arrays of one strip of rows; lower it on smaller machines
+
+# Zone layers of the zonal tables, as in s10: name -> [polygon feature class, [key fields]] or zone raster
+zone_layers = {} # e.g., {'state': ['C:/gis/states.shp', ['STUSPS']]}
+probs = [0.05, 0.5] # Percentiles of every zone (as proportions)
+
+# Record start time
+start_time = timeit.default_timer()
+
+# Begin the scenarios; requires growth.csv and survival.csv in the root directory
+saved = run_deposition_scenarios(root_dir, out_dir, scenarios, response_variables, elements, tdep_suffix,
+                                 aggregates, percentile, memory_budget_mb)
+if zone_layers:
+    scenario_zonal_tables(out_dir, saved, zone_layers, probs, memory_budget_mb=memory_budget_mb)
+
+# Calculate time elapsed and print
+elapsed_min = (timeit.default_timer() - start_time) / 60
+print('deposition scenarios took', elapsed_min, 'minutes')
@@ -0,0 +1,71 @@
+"""
+#### Script Information ####
+
+Script name: s1_ba_export_to_array_store.py
+
+Purpose of script: Export the .img basal area rasters to a chunked, compressed array store that can
+    be read by window with NumPy alone
+
+Note: s1_ba_export_to_single_gdb.py copies the rasters into ba.gdb one at a time, and ba.gdb can
+    only be read through ArcPy. Here rasters are converted several at a time in a pool of worker
+    processes (set workers below) into out_dir/ba_store, with their geotransform, coordinate system and
+    NoData saved alongside (see array_store.py). Rasters already in the store are skipped, so an
+    interrupted run resumes with the rasters that were not finished.
+
+Placement in script series: #1 (alongside or instead of s1_ba_export_to_single_gdb.py)
+Pre-setup: Same as s1_ba_export_to_single_gdb.py
+
+Author: Justin G. Coughlin, M.S.
+Date Created: 2026-10-18
+Email: justin.coughlin@outlook.com
+
+"""
+
+# Import the necessary modules
+import os
+import timeit
+
+# Rasters are converted in a pool of worker processes, see array_store.py
+from array_store import CHUNK_SIZE, ingest_rasters, list_rasters
+
+# Create path to directory holding data, call it root directory
+root_dir = <'Insert root directory to converted rasters here'>
+
+# Create general output directory for all succeeding scripts / create directory if not already exists
+out_dir = os.path.join(root_dir, <'Insert folder directory here'>)
+
+# Create path within root dir to find .img files for export to the store
+ba_data_path = os.path.join(root_dir, 'raster_maps')
+
+# Folder of the array store within the output folder
+ba_store_path = os.path.join(out_dir, 'ba_store')
+
+# Rows and columns per chunk of the store
+chunk_size = CHUNK_SIZE
+
+# Rasters converted at the same time and memory limit per worker process (MB), see species_parallel.py
+workers = 1
+memory_limit_mb = None
+
+# Worker processes re-import this script, so only run the conversion from the main process
+if __name__ == '__main__':
+    if not os.path.exists(out_dir): # Create the directory if it does not exist
+        os.makedirs(out_dir)
+
+    # Record start time
+    start_time = timeit.default_timer()
+
+    # Walk the root input path to get the .img files of every RasterMaps folder
+    img_paths = []
+    for (dirpath, dirnames, filenames) in os.walk(ba_data_path):
+        if os.path.basename(dirpath) == 'RasterMaps':
+            img_paths += [os.path.join(dirpath, filename) for filename in sorted(filenames)
+                          if filename.lower().endswith('.img')]
+    print('Raster count should be 324: Raster count == ', len(img_paths))  # check raster count
+
+    ingest_rasters(img_paths, ba_store_path, workers, memory_limit_mb, chunk_size)
+    print('Rasters in the store:', len(list_rasters(ba_store_path)))
+
+    # Calculate time elapsed and print
+    elapsed_min = (timeit.default_timer() - start_time) / 60
+    print('export to array store took', elapsed_min, 'minutes')
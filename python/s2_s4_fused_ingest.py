@@ -0,0 +1,125 @@
+"""
+#### Script Information ####
+
+Script name: s2_s4_fused_ingest.py
+
+Purpose of script: Derive the national forest basal area raster and the Horn species proportion
+    rasters straight from the converted rasters of s1, instead of running s2, s3 and s4
+
+Note: s2 writes a nulled copy of all 324 rasters only so s3 and s4 can read them. Here zero is taken
+    as NoData as the rasters are read (see ba_sum.py): one pass sums all 324 rasters into
+    ba_null_natl_forest (tile by tile, resumable, with ba_species_totals.csv), and a second pass reads
+    only the 94 Horn species rasters and writes their proportion rasters, caching each species' range
+    from the values as they are written. ba_null.gdb then only holds ba_null_natl_forest.
+    If s1_ba_export_to_array_store.py was run, the rasters are read from its array store (out_dir/ba_store)
+    with NumPy instead of from the gdb through ArcPy (see array_store.py); set read_from_store below.
+    Outputs are the same as those of s2 - s4 for the later scripts.
+
+Placement in script series: #2 - #4 (instead of s2_setzero_null.py, s3_ba_sum_natl_forest.py and
+    s4_select_horn_spp_calc_proportion.py)
+Outputs needed from: s1_ba_export_to_single_gdb.py or s1_ba_export_to_array_store.py
+
+Author: Justin G. Coughlin, M.S.
+Date Created: 2026-10-18
+Email: justin.coughlin@outlook.com
+
+"""
+
+# Import the necessary modules
+import os
+import timeit
+import arcpy as ap
+
+# Tiles of the sum and species of the proportions are processed in a pool of worker processes, see ba_sum.py
+from ba_sum import run_proportions, sum_rasters
+
+# Rasters of the array store are read with NumPy alone, see array_store.py
+from array_store import list_rasters
+from presence_index import load_presence_index
+from run_profile import start_profile
+from species_params import HORN_SPP_CODES
+from species_ranges import restamp_ranges
+
+# Set up environment
+ap.env.overwriteOutput = True
+ap.CheckOutExtension("Spatial")
+ap.env.parallelProcessingFactor = "100%" # Parallel processing assists in the speed of the script
+
+# Direct paths to root directory and output directory
+root_dir = <'Insert root directory to converted rasters here'>
+out_dir = os.path.join(root_dir, <'Insert folder directory here'>)
+ba_gdb_path = os.path.join(out_dir, <'Insert gdb name here for Wilson et al. 2013 rasters'>)
+
+# Array store of s1_ba_export_to_array_store.py, read instead of the gdb when it holds the rasters
+ba_store_path = os.path.join(out_dir, 'ba_store')
+read_from_store = True
+
+# Output gdbs of the national forest raster and the proportion rasters
+ba_null_gdb_path = os.path.join(out_dir, 'ba_null.gdb')
+spp_prop_ba_gdb_path = os.path.join(out_dir, 'spp_proportion_ba.gdb')
+
+# Tiles or species processed at the same time and memory limit per worker process (MB), see species_parallel.py
+workers = 1
+memory_limit_mb = None
+
+# Create list for horn species codes to extract only these from raster source folder
+horn_spp_code_list = ['s' + str(horn_spp_code) for horn_spp_code in HORN_SPP_CODES]
+
+# Worker processes re-import this script, so only run the calculation from the main process
+if __name__ == '__main__':
+    # If the output gdbs do not exist then create them
+    if not ap.Exists(ba_null_gdb_path):
+        ap.CreateFileGDB_management(out_dir, 'ba_null.gdb')
+    if not ap.Exists(spp_prop_ba_gdb_path):
+        ap.CreateFileGDB_management(out_dir, 'spp_proportion_ba.gdb')
+
+    # Basal area rasters from the array store if s1_ba_export_to_array_store.py filled it, otherwise from the gdb
+    if read_from_store and list_rasters(ba_store_path):
+        ba_source_path = ba_store_path
+        ba_raster_list = list_rasters(ba_store_path)
+    else:
+        # Set input workspace so ArcPy can find basal area rasters
+        ba_source_path = ba_gdb_path
+        ap.env.workspace = ba_gdb_path
+        ba_raster_list = ap.ListRasters()
+    print('Reading the basal area rasters from', ba_source_path)
+    print('Raster count should be 324: Raster count == ', len(ba_raster_list))  # check raster count
+
+    # Record start time; time and memory of every tile and species are recorded in out_dir/profile, see run_profile.py
+    start_time = timeit.default_timer()
+    start_profile(out_dir)
+
+    # Make sure all rasters are present or no left-over intermediary calculation rasters from copy process (script #1)
+    if len(ba_raster_list) == 324:
+        # Pass 1: national forest basal area, zero read as NoData (s2 + s3)
+        print('Summing rasters...')
+        ba_natl_raster_path = os.path.join(ba_null_gdb_path, 'ba_null_natl_forest')
+        sum_rasters([os.path.join(ba_source_path, raster) for raster in ba_raster_list], ba_natl_raster_path,
+                    os.path.join(out_dir, 'ba_species_totals.csv'), os.path.join(out_dir, 'ba_sum_tiles'),
+                    workers, memory_limit_mb, zero_as_nodata=True)
+
+        # Pass 2: proportion of the Horn species only (s4)
+        horn_raster_list = [raster for raster in ba_raster_list if raster in horn_spp_code_list]
+        results = run_proportions([os.path.join(ba_source_path, raster) for raster in horn_raster_list],
+                                  ba_natl_raster_path, spp_prop_ba_gdb_path, out_dir, workers, memory_limit_mb,
+                                  zero_as_nodata=True)
+        counter = sum(1 for _, _, error in results if error is None) # Number of species processed
+
+        # The ranges were cached as each raster was written; record the stamps of the finished gdb
+        restamp_ranges([result for _, result, error in results if error is None], out_dir)
+
+        # Line break if 94 species are not present at the end of processing
+        if counter != len(horn_spp_code_list):
+            print('***Full list of Horn species not calc\'d***', '-', 'only', counter, 'spp processed, should be 94 total')
+
+        # Presence index of the species from their cached ranges, saved as presence_index.npz in out_dir
+        presence_index = load_presence_index(out_dir)
+        print('Species richness per cell: up to', presence_index.richness().max())
+    else:
+        print('Raster list count incorrect, troubleshooting is needed')
+        # If raster count != 324, will break out of loop: needs troubleshooting
+        pass
+
+    # Calculate time elapsed and print
+    elapsed_min = (timeit.default_timer() - start_time) / 60
+    print('***FINISHED**** Fused ingest of s2 - s4 took ', elapsed_min, 'minutes')
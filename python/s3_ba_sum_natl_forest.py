@@ -5,6 +5,11 @@ Script name: s3_ba_sum_natl_forest.py
 
 Purpose of script: Summation of the national forest basal area from the 323 basal area rasters
 
+Note: The sum is streamed one tile at a time across all rasters (see ba_sum.py), so tiles can run in
+    parallel (set workers below), memory is set by the tile size, and an interrupted run resumes with
+    the tiles that were not finished. The same pass saves each species' total basal area and number of
+    cells with data to ba_species_totals.csv.
+
 Placement in script series: #3
 Outputs needed from: s1_ba_export_to_single_gdb.py, s2_setzero_null.py
 
@@ -20,6 +25,10 @@ import os
 import timeit
 import arcpy as ap
 
+# Tiles of the sum are processed in a pool of worker processes, see ba_sum.py
+from ba_sum import sum_rasters
+from run_profile import start_profile
+
 # Set up environment
 ap.env.overwriteOutput = True
 ap.CheckOutExtension("Spatial")
@@ -28,6 +37,10 @@ ap.env.parallelProcessingFactor = "100%" # Parallel processing assists in the sp
 root_dir = <'Insert root directory to converted rasters here'> 
 out_dir = os.path.join(root_dir, <'Insert folder directory here'>)
 
+# Tiles summed at the same time and memory limit per worker process (MB), see species_parallel.py
+workers = 1
+memory_limit_mb = None
+
 # Set scratch workspace manually to store temporary rasters from calculations
 # so that remnants are not stored in output gdb if process is interrupted
 # Create scratch gdb first
@@ -36,28 +49,34 @@ if not ap.Exists(scratch_gdb_path): # Create the directory if it does not exist
     ap.CreateFileGDB_management(out_dir, 'scratch.gdb')
 ap.env.scratchWorkspace = os.path.join(root_dir, 'scratch.gdb')
 
-# Start summing process to derive national forest raster
-start_time = timeit.default_timer()
-
-# Set output path for summed raster
-ba_null_gdb_path = os.path.join(out_dir, 'ba_null.gdb')
-# Set input workspace so arcpy can find basal area rasters
-ap.env.workspace = ba_null_gdb_path
-
-# List the rasters 
-ba_raster_list = ap.ListRasters()
-print('Raster count should be 324: Raster count == ', len(ba_raster_list))  # check raster count
-
-# Make sure all rasters are present or no left-over intermediary calculaion rasters from copy process (script #1)
-if len(ba_raster_list) == 324:
-    print('Summing rasters...')
-    outCellStatistics = ap.sa.CellStatistics(ba_raster_list, "SUM", "DATA")
-    outCellStatistics.save(os.path.join(ba_null_gdb_path, 'ba_null_natl_forest'))
-else:
-    print('Raster list count incorrect')
-    # If raster count != 324, will break out of loop: needs troubleshooting
-    pass
-
-# Calculate time elapsed and print
-elapsed_min = (timeit.default_timer() - start_time) / 60
-print('Summing rasters to get national forest raster took ', elapsed_min, 'minutes')
+# Worker processes re-import this script, so only run the calculation from the main process
+if __name__ == '__main__':
+    # Start summing process to derive national forest raster
+    start_time = timeit.default_timer()
+    start_profile(out_dir)
+
+    # Set output path for summed raster
+    ba_null_gdb_path = os.path.join(out_dir, 'ba_null.gdb')
+    # Set input workspace so arcpy can find basal area rasters
+    ap.env.workspace = ba_null_gdb_path
+
+    # List the rasters, leaving out the national raster of an earlier run
+    ba_raster_list = [raster for raster in ap.ListRasters() if raster != 'ba_null_natl_forest']
+    print('Raster count should be 324: Raster count == ', len(ba_raster_list))  # check raster count
+
+    # Make sure all rasters are present or no left-over intermediary calculaion rasters from copy process (script #1)
+    if len(ba_raster_list) == 324:
+        print('Summing rasters...')
+        # Same result as CellStatistics(ba_raster_list, "SUM", "DATA"), summed tile by tile
+        sum_rasters([os.path.join(ba_null_gdb_path, raster) for raster in ba_raster_list],
+                    os.path.join(ba_null_gdb_path, 'ba_null_natl_forest'),
+                    os.path.join(out_dir, 'ba_species_totals.csv'), os.path.join(out_dir, 'ba_sum_tiles'),
+                    workers, memory_limit_mb)
+    else:
+        print('Raster list count incorrect')
+        # If raster count != 324, will break out of loop: needs troubleshooting
+        pass
+
+    # Calculate time elapsed and print
+    elapsed_min = (timeit.default_timer() - start_time) / 60
+    print('Summing rasters to get national forest raster took ', elapsed_min, 'minutes')
@@ -21,18 +21,27 @@ import os
 import timeit
 import arcpy as ap
 
+# Species are divided in a pool of worker processes, see species_parallel.py
+from raster_blocks import setup_worker
+from run_profile import count_cells, start_profile
+from species_parallel import run_species_parallel
+
+# The range of each species is cached for the later stages, see species_ranges.py
+from species_ranges import load_species_range, restamp_ranges
+
+# Species present at each cell, one bit per species, built from the cached ranges, see presence_index.py
+from presence_index import load_presence_index
+
+# List of the Horn et al. (2018) species, shared with s2_s4_fused_ingest.py, see species_params.py
+from species_params import HORN_SPP_CODES
+
 # Set up environment
 ap.env.overwriteOutput = True
 ap.CheckOutExtension("Spatial")
 ap.env.parallelProcessingFactor = "100%" # Parallel processing assists in the speed of the script
 
 # List of the Horn et al. (2018) species
-horn_spp_code_num_list = [11, 12, 15, 17, 19, 64, 65, 68, 69, 71, 73, 81, 93, 94, 95, 97, 105, 106, 108,
-                          110, 111, 121, 122, 125, 126, 129, 131, 132, 133, 202, 221, 222, 241, 242,
-                          261, 263, 264, 313, 316, 317, 318, 371, 372, 375, 391, 402, 403, 407, 408,
-                          409, 461, 462, 531, 541, 543, 544, 552, 602, 611, 621, 631, 641, 653, 691,
-                          693, 694, 701, 711, 731, 741, 743, 746, 762, 802, 805, 806, 809, 812, 820,
-                          823, 826, 827, 831, 832, 833, 835, 837, 901, 922, 931, 951, 971, 972, 975]
+horn_spp_code_num_list = HORN_SPP_CODES
 
 # Create list for horn species codes to extract only these from raster source folder
 horn_spp_code_list = map(str, horn_spp_code_num_list)
@@ -44,41 +53,76 @@ root_dir = <'Insert root directory to converted rasters here'>
 out_dir = os.path.join(root_dir, <'Insert folder directory here'>)
 ba_gdb_path = os.path.join(out_dir, 'ba_null.gdb') # Output .gdb from s2_setzero_null.py
 
-# Path to output for proportional calculations; if gdb does not exist then create it
+# Path to output for proportional calculations
 spp_prop_ba_gdb_path = os.path.join(out_dir, 'spp_proportion_ba.gdb')
-if not ap.Exists(spp_prop_ba_gdb_path): # Create the directory if it does not exist
-    ap.CreateFileGDB_management(out_dir, 'spp_proportion_ba.gdb')
-
-# Set input workspace so ArcPy can find basal area rasters
-ap.env.workspace = ba_gdb_path
-
-# Set path for ba national raster
-ba_natl_raster = ap.ListRasters('ba_null_natl_forest')[0]
-# create list of all ba raster for all species
-ba_spp_raster_list = ap.ListRasters('s*')
-
-# Record start time
-start_time = timeit.default_timer()
-
-# Loop through the 94 species of interest to determine the proportion to total basal area
-counter = 0 # Start a counter to report out the number processes
-for ba_spp_raster in ba_spp_raster_list:
-    if ba_spp_raster in horn_spp_code_list:  # Limit processing to Horn species rasters
-        print(ba_spp_raster)
-        # Perform division: horn raster / national ba raster
-        out_divide = ap.sa.Divide(ba_spp_raster, ba_natl_raster)
-        # Save output with species' name
-        out_divide_raster_name = '{}_proportion'.format(ba_spp_raster)
-        print('Working on division for:  ', out_divide_raster_name)
-        out_divide_save_path = os.path.join(spp_prop_ba_gdb_path, out_divide_raster_name)
-        print(0'***SAVING***  ', out_divide_raster_name, 'as ', out_divide_save_path)
-        out_divide.save(out_divide_save_path)
-        counter += 1
-
-# Line break if 94 species are not present at the end of processing
-if counter != horn_spp_code_list_length:
-    print('***Full list of Horn species not calc\'d***', '-', 'only', counter, 'spp processed, should be 94 total')
-
-# Calculate time elapsed and print
-elapsed_min = (timeit.default_timer() - start_time) / 60
-print('Calculating proportion and saving to gdb took ', elapsed_min, 'minutes')
+
+# Species processed at the same time and memory limit per worker process (MB), see species_parallel.py
+workers = 1
+memory_limit_mb = None
+
+
+def divide_species(ba_spp_raster, ba_gdb_path, ba_natl_raster_path, spp_prop_ba_gdb_path, block_rows=None):
+    """
+    Divide one species' basal area raster by the national forest basal area raster, save the
+    proportion and cache the species' range. Run once per species, possibly in a worker process.
+    block_rows: rows per strip when reading the range (set by species_parallel.py for a memory limit)
+    """
+    ba_spp_raster_path = os.path.join(ba_gdb_path, ba_spp_raster)
+    # Perform division: horn raster / national ba raster
+    out_divide = ap.sa.Divide(ba_spp_raster_path, ba_natl_raster_path)
+    # Save output with species' name
+    out_divide_raster_name = '{}_proportion'.format(ba_spp_raster)
+    print('Working on division for:  ', out_divide_raster_name)
+    out_divide_save_path = os.path.join(spp_prop_ba_gdb_path, out_divide_raster_name)
+    print('***SAVING***  ', out_divide_raster_name, 'as ', out_divide_save_path)
+    out_divide.save(out_divide_save_path)
+    # Cache the cells of the species' range so s5, s6 and s8 only process occupied cells
+    species_range = load_species_range(out_divide_save_path, os.path.dirname(spp_prop_ba_gdb_path), rebuild=True,
+                                       block_rows=block_rows)
+    print('Range of', out_divide_raster_name, ':', len(species_range), 'cells,', species_range.nrows, 'x',
+          species_range.ncols, 'window')
+    count_cells(len(species_range))
+    return out_divide_save_path
+
+
+# Worker processes re-import this script, so only run the calculation from the main process
+if __name__ == '__main__':
+    # If the proportion gdb does not exist then create it
+    if not ap.Exists(spp_prop_ba_gdb_path): # Create the directory if it does not exist
+        ap.CreateFileGDB_management(out_dir, 'spp_proportion_ba.gdb')
+
+    # Set input workspace so ArcPy can find basal area rasters
+    ap.env.workspace = ba_gdb_path
+
+    # Set path for ba national raster
+    ba_natl_raster = ap.ListRasters('ba_null_natl_forest')[0]
+    # create list of all ba raster for all species
+    ba_spp_raster_list = ap.ListRasters('s*')
+
+    # Record start time; time and memory of every species are recorded in out_dir/profile, see run_profile.py
+    start_time = timeit.default_timer()
+    start_profile(out_dir)
+
+    # Loop through the 94 species of interest to determine the proportion to total basal area
+    # Limit processing to Horn species rasters
+    tasks = [(ba_spp_raster, dict(ba_spp_raster=ba_spp_raster, ba_gdb_path=ba_gdb_path,
+                                  ba_natl_raster_path=os.path.join(ba_gdb_path, ba_natl_raster),
+                                  spp_prop_ba_gdb_path=spp_prop_ba_gdb_path))
+             for ba_spp_raster in ba_spp_raster_list if ba_spp_raster in horn_spp_code_list]
+    results = run_species_parallel(divide_species, tasks, workers, memory_limit_mb, setup_worker)
+    counter = sum(1 for _, _, error in results if error is None) # Number of species processed
+
+    # The ranges were cached as each raster was written; record the stamps of the finished gdb
+    restamp_ranges([result for _, result, error in results if error is None], out_dir)
+
+    # Line break if 94 species are not present at the end of processing
+    if counter != horn_spp_code_list_length:
+        print('***Full list of Horn species not calc\'d***', '-', 'only', counter, 'spp processed, should be 94 total')
+
+    # Presence index of the species from their cached ranges, saved as presence_index.npz in out_dir
+    presence_index = load_presence_index(out_dir)
+    print('Species richness per cell: up to', presence_index.richness().max())
+
+    # Calculate time elapsed and print
+    elapsed_min = (timeit.default_timer() - start_time) / 60
+    print('Calculating proportion and saving to gdb took ', elapsed_min, 'minutes')
@@ -10,7 +10,15 @@ Placement in script series: #5
 Outputs needed from: s1_ba_export_to_single_gdb.py, s2_setzero_null.py, 
     s3_ba_sum_natl_forest.py, s4_select_horn_spp_calc_proportion.py
 Adjustment for TDep: Runs will be adjusted based on TDep raster years. Change suffix where necessary.
-    I.e.,  line 83  tdep_Raster = os.path.join(out_dir, 'tdep.gdb//{}_tw_1719'.format(element))
+    I.e.,  tdep_suffix = '0002'
+
+Note: Exceedances are saved as bit masks of the species in exceedance at each cell of the presence
+    index (e.g., exceedance_masks_n_1719.npz / exceedance_masks_s_1719.npz, see exceedance_masks.py) instead of
+    one float raster per species, element and endpoint. TDep is read once per element at the cells with
+    species and every species' cached range once, and the same pass writes the summary rasters to
+    N_dep_{tdep_suffix}.gdb / S_dep_{tdep_suffix}.gdb: number of species in exceedance, exceeded basal area proportion and
+    magnitude of exceedance (TDep - critical load), for each endpoint. Set write_rasters to also write
+    the per-species exceedance rasters.
 
 Author: Justin G. Coughlin, M.S.
 Date Created: 2020-12-10
@@ -23,6 +31,18 @@ import os
 import timeit
 import arcpy as ap
 
+# Species parameter tables are loaded once instead of scanned with a search cursor per raster
+from species_params import load_species_params, species_to_process
+
+# Exceedance of every species as bits over the cells with species, see exceedance_masks.py
+from exceedance_masks import SUMMARIES, calculate_exceedance, masks_path
+from presence_index import load_presence_index
+from run_manifest import RunManifest, prepare_tdep
+from run_profile import profile_unit, start_profile
+
+# Exceedance is only calculated at the cells of each species' range, see species_ranges.py
+from species_ranges import RANGES_DIR_NAME, load_species_range, range_cache_path
+
 # Set up environment
 ap.env.overwriteOutput = True
 ap.CheckOutExtension("Spatial")
@@ -36,6 +56,15 @@ out_dir = os.path.join(root_dir, <'Insert folder directory here'>)
 # Set path to input proportional rasters gdb created in #3: select_horn_spp_calc_proportion
 spp_prop_ba_gdb_path = os.path.join(out_dir, 'spp_proportion_ba.gdb')
 
+# Create variable lists for looping thru
+response_variables = ['growth', 'survival']
+elements = ['n', 's']
+tdep_suffix = '1719' # TDep raster period, i.e., n_tw_1719 / s_tw_1719
+
+# Also write the proportion where each species is in exceedance as one raster per species, element and
+# endpoint ({spp}_exc_{element}_{response variable}_{tdep_suffix}), as earlier versions of this script did
+write_rasters = False
+
 # Set scratch workspace to hold intermediary calculated rasters
 scratch_gdb_path = os.path.join(out_dir, 'Scratch.gdb')
 if not ap.Exists(scratch_gdb_path):
@@ -57,15 +86,15 @@ if not ap.Exists(survival_table_check_path): # Create the directory if it does n
 
 # Create output gdbs
 # Additionally import tdep values tables into output gdbs in preparation for next step: reduction calculations
-n_out_path = os.path.join(out_dir, 'N_dep_1719.gdb')
+n_out_path = os.path.join(out_dir, 'N_dep_{}.gdb'.format(tdep_suffix))
 if not ap.Exists(n_out_path): # Create the directory if it does not exist
-    ap.CreateFileGDB_management(out_dir, 'N_dep_1719.gdb')
+    ap.CreateFileGDB_management(out_dir, 'N_dep_{}.gdb'.format(tdep_suffix))
     ap.TableToGeodatabase_conversion(Input_Table=growthTable, Output_Geodatabase=n_out_path)
     ap.TableToGeodatabase_conversion(Input_Table=survivalTable, Output_Geodatabase=n_out_path)
 
-s_out_path = os.path.join(out_dir, 'S_dep_1719.gdb')
+s_out_path = os.path.join(out_dir, 'S_dep_{}.gdb'.format(tdep_suffix))
 if not ap.Exists(s_out_path): # Create the directory if it does not exist
-    ap.CreateFileGDB_management(out_dir, 'S_dep_1719.gdb')
+    ap.CreateFileGDB_management(out_dir, 'S_dep_{}.gdb'.format(tdep_suffix))
     ap.TableToGeodatabase_conversion(Input_Table=growthTable, Output_Geodatabase=s_out_path)
     ap.TableToGeodatabase_conversion(Input_Table=survivalTable, Output_Geodatabase=s_out_path)
 
@@ -75,77 +104,65 @@ tdep_gdb_path = os.path.join(out_dir, 'tdep.gdb')
 if not ap.Exists(tdep_gdb_path): # Create the directory if it does not exist
     ap.CreateFileGDB_management(out_dir, 'tdep.gdb')
 
-# Record start time
+# Record start time; time and memory of every element are recorded in out_dir/profile, see run_profile.py
 start_time = timeit.default_timer()
+start_profile(out_dir)
 
-# Create variable lists for looping thru
-response_variables = ['growth', 'survival']
-elements = ['n', 's']
+# Load the growth and survival tables once
+species_params = load_species_params(root_dir, response_variables)
+
+# Set input workspace so arcpy can find proportional rasters, list them and drop species
+# without a critical load (no n1 or s1 value) before any raster is read
+ap.env.workspace = spp_prop_ba_gdb_path
+spp_raster_list = ap.ListRasters()
+spp_prop_ba_raster_list = species_to_process(spp_raster_list, species_params, elements)
+
+# Species present at each cell, from the species' cached ranges (cached here if s4 did not)
+for spp_raster in spp_raster_list:
+    if not os.path.exists(range_cache_path(os.path.join(spp_prop_ba_gdb_path, spp_raster), out_dir)):
+        load_species_range(os.path.join(spp_prop_ba_gdb_path, spp_raster), out_dir)
+presence_index = load_presence_index(out_dir)
+
+# Set tdep raster paths n_tw_{tdep_suffix} or s_tw_{tdep_suffix} [e.g., 2000-2002 run]
+# All proportion rasters share the national forest grid, so TDep only needs to be aligned once; a TDep
+# raster replaced in tdep.gdb is aligned again (see run_manifest.prepare_tdep)
+template = os.path.join(spp_prop_ba_gdb_path, spp_prop_ba_raster_list[0][0])
+tdep_aligned, _ = prepare_tdep(out_dir, template, elements, [tdep_suffix], RunManifest.load(out_dir))
 
-# Set tdep raster paths n_tw_1719 or s_tw_1719 [e.g., 2000-2002 run] - currently se for 17-19
 for element in elements:
-    # path to tdep raster
-    tdep_Raster = os.path.join(out_dir, 'tdep.gdb//{}_tw_1719'.format(element)) # Assumes tdep gdb name is tdep.gdb
-    for response_variable in response_variables:
-        # Set input workspace so arcpy can find proportional rassters
-        ap.env.workspace = spp_prop_ba_gdb_path
-        # Set save paths (will be either of the S_dep or N_dep geodatabases created above)
-        gdb_save_path = os.path.join(out_dir, '{}'.format(element).capitalize() + '_dep_1719.gdb')
-
-        # List proportional rasters for looping through
-        spp_prop_ba_raster_list = ap.ListRasters()
-        for spp_raster in spp_prop_ba_raster_list:
-            # Create save names and save paths for raster so can check if already exists in output gdb;
-            # Skip if already done
-            out_raster_name = '{0}_exc_{1}_{2}_1719'.format(spp_raster, element, response_variable)
-            out_raster_save_path = os.path.join(gdb_save_path, out_raster_name)
-            ap.env.scratchWorkspace = os.path.join(out_dir, 'Scratch.gdb')
-            print('**Check**: element, response variables match for in and out file names:',\
-                out_raster_name + ':', element, response_variable)
-            if ap.Exists(out_raster_save_path):
-                print('Out file name = ', out_raster_name)
-                print(' >>> EXISTS IN OUTPUT EXCEEDANCE gdb, go to next raster', '\n')
-                pass
-            else:
-                print('Does not exist in output gdb, process raster ', spp_raster)
-                print('Exceedance raster will be saved to : ', out_raster_save_path, '\n')
-                # Create path to proportional raster
-                spp_raster_path = os.path.join(spp_prop_ba_gdb_path, spp_raster)
-                # Set environments to handle differing resolutions rasters
-                # Set the cell size environment using a raster dataset
-                ap.env.cellSize = spp_raster_path
-                # set output coordinate system
-                spatial_ref = ap.Describe(spp_raster_path).spatialReference
-                ap.env.outputCoordinateSystem = spatial_ref
-                # Set snap raster environment
-                ap.env.snapRaster = spp_raster_path
-                inTrueRaster = spp_raster
-                inFalseConstant = 0
-                spp_code = int(spp_raster.split('_')[0][1:])
-                # Set path to tdep value table to iterate thru values below
-                table = os.path.join(spp_prop_ba_gdb_path, '{}').format(response_variable)
-                # Use Cursor to access each row within fields
-                with ap.da.SearchCursor(table, ['spp_code', '{}1'.format(element)]) as cursor:
-                    print('Checking for critical load values...')
-                    for row in cursor:
-                        if row[0] == spp_code and row[1] is None:
-                            # Skipping over species with flat responses, ie no values in n1 or s1
-                            print('No critical load value, skipping ', spp_raster, ', row = ', row, '\n')
-                            print('-----------------------')
-                        elif row[0] == spp_code and row[1] is not None:
-                            print('Found critical load value, calculating exceedance raster...')
-                            # 'row' is a tuple, and looks like this, for e.g. for species # 121: (121, 12.32753)
-                            whereClause = "VALUE >={}".format(row[1])
-                            # 'Value' is pulled from the second number in row, that comes from the table,
-                            # Value for n1 or s1
-                            outCon = ap.sa.Con(tdep_Raster, inTrueRaster, inFalseConstant, whereClause)
-                            # Set non-exceedances to null 
-                            inTrueRaster2 = outCon
-                            inFalseRaster = outCon
-                            whereClause2 = "VALUE = 0" 
-                            outSetNull = ap.sa.SetNull(inTrueRaster2, inFalseRaster, whereClause2)
-                            outSetNull.save(os.path.join(out_raster_save_path))
-                            print('***EXCEEDANCE saved to***', out_raster_save_path, '\n')
+    # Set save paths (will be either of the S_dep or N_dep geodatabases created above)
+    gdb_save_path = os.path.join(out_dir, '{}'.format(element).capitalize() + '_dep_{}.gdb'.format(tdep_suffix))
+    with profile_unit(element=element):
+        # TDep at every cell with species, then every species' exceedance as one bit per cell
+        dep = presence_index.gather(tdep_aligned[(element, tdep_suffix)])
+        masks, summaries = calculate_exceedance(presence_index, element, dep, species_params, response_variables,
+                                                tdep_suffix, os.path.join(out_dir, RANGES_DIR_NAME))
+        masks.save(masks_path(out_dir, element, tdep_suffix))
+        print('Exceedance masks of', element.upper(), 'saved:', masks.nbytes() / 1024 ** 2, 'MB')
+
+        # Summary rasters of each endpoint, e.g., N_dep_1719.gdb/exceedance_count_growth_1719
+        for response_variable in response_variables:
+            for summary in SUMMARIES:
+                out_raster_save_path = os.path.join(gdb_save_path, '{}_{}_{}'.format(summary, response_variable,
+                                                                                     tdep_suffix))
+                values = summaries[response_variable][summary]
+                presence_index.to_range(values).to_raster(values, out_raster_save_path)
+                print('***{} saved to***'.format(summary.upper()), out_raster_save_path)
+
+    if write_rasters:
+        # Proportion where each species is in exceedance, from the masks
+        for spp_raster, spp_code in spp_prop_ba_raster_list:
+            species_range = load_species_range(os.path.join(spp_prop_ba_gdb_path, spp_raster), out_dir)
+            positions = presence_index.positions(species_range)
+            for response_variable in response_variables:
+                if species_params[response_variable].curve_params(spp_code, element) is None:
+                    continue # Skipping over species with flat responses, ie no values in n1 or s1
+                out_raster_save_path = os.path.join(gdb_save_path, '{0}_exc_{1}_{2}_{3}'.format(
+                    spp_raster, element, response_variable, tdep_suffix))
+                species_range.to_raster(masks.species_values(spp_raster, response_variable, species_range,
+                                                             positions), out_raster_save_path)
+                print('***EXCEEDANCE saved to***', out_raster_save_path)
+    print('')
 
 # Calculate time elapsed and print
 elapsed_min = (timeit.default_timer() - start_time)/60
@@ -0,0 +1,71 @@
+"""
+#### Script Information ####
+
+Script name: s5_s9_species_pass.py
+
+Purpose of script: Calculate the exceedance, growth/survival effect, basal area weighted effect
+    and deposition level rasters for every species in a single pass. Equivalent to running
+    s5_calculate_wilson_exceedance.py, s6a/s6b, s8_basal_area_weight_growth_effects.py and s9a/s9b,
+    but the proportion and TDep values of each species are read once for every product,
+    and the effect rasters do not need to be read back for the basal area weighting.
+    Remove a product from the products list to skip writing it.
+Placement in script series: #5 - #9 (alternative to s5, s6a, s6b, s8, s9a and s9b; s7 still runs on the outputs)
+Outputs needed from: s1_ba_export_to_single_gdb.py, s2_setzero_null.py,
+    s3_ba_sum_natl_forest.py, s4_select_horn_spp_calc_proportion.py
+Adjustment for TDep: Runs will be adjusted based on TDep raster years. Change suffix where necessary.
+    I.e.,  tdep_suffix = '0002'. A list of periods (e.g., species_pass.TDEP_PERIODS) runs all of them as a time axis,
+    reading each species' range and parameters once for every period.
+
+Date Created: 2026-10-18
+
+"""
+
+# Import the necessary modules
+import os
+import timeit
+import arcpy as ap
+
+# Fused calculation of every per-species product, see species_pass.py
+from species_pass import run_species_pass
+
+# Set up environment
+ap.env.overwriteOutput = True
+ap.CheckOutExtension("Spatial")
+ap.env.parallelProcessingFactor = "100%" # Parallel processing assists in the speed
+
+# Set path general output directory
+root_dir = <'Insert root directory to converted rasters here'>
+out_dir = os.path.join(root_dir, <'Insert folder directory here'>)
+
+# Create variable lists for looping thru
+products = ['exceedance', 'effect', 'ba_weighted_effect', 'deposition_level']
+response_variables = ['growth', 'survival']
+elements = ['s', 'n']
+tdep_suffix = '1719' # TDep raster period, i.e., n_tw_1719 / s_tw_1719
+# To run every 3-year period from 2000-2002 to 2017-2019 in the same pass (outputs saved to one gdb per
+# period, e.g., N_growth_effect_0002.gdb), list them (species_pass.TDEP_PERIODS): tdep_suffix = ['0002', ..., '1719']
+reductions = {'growth': 0.05, 'survival': 0.01} # x for the deposition level needed to prevent an x% reduction
+
+# Species processed at the same time and memory limit per worker process (MB), see species_parallel.py
+# Keep workers = 1 on machines with little memory; each worker holds its own blocks
+workers = 1
+memory_limit_mb = None
+
+# Effects looked up from a table of each species' response curve, starting at this deposition step
+# (kg/ha/yr) and refined until within lookup_tolerance of the exact effect; None evaluates the exact
+# formula at every cell, see response_curves.py
+lookup_step = None
+lookup_tolerance = 1e-4
+
+# Worker processes re-import this script, so only run the calculation from the main process
+if __name__ == '__main__':
+    # Record start time
+    start_time = timeit.default_timer()
+
+    # Begin the species pass; requires growth.csv and survival.csv in the root directory
+    run_species_pass(root_dir, out_dir, products, response_variables, elements, tdep_suffix, reductions,
+                     workers, memory_limit_mb, lookup_step, lookup_tolerance)
+
+    # Calculate time elapsed and print
+    elapsed_min = (timeit.default_timer() - start_time) / 60
+    print('Creating species pass rasters took ', elapsed_min, 'minutes')
@@ -0,0 +1,63 @@
+"""
+#### Script Information ####
+
+Script name: s6_effects_eqn_all_endpoints.py
+
+Purpose of script: Calculate species effects on growth and survival rates for N and S deposition
+    in a single pass. Equivalent to running s6a_effects_eqn_growth.py and s6b_effects_eqn_survival.py,
+    but each block of the species proportion and TDep rasters is read once for all four endpoints.
+Placement in script series: #6 (alternative to s6a + s6b)
+Outputs needed from: s1_ba_export_to_single_gdb.py, s2_setzero_null.py, 
+    s3_ba_sum_natl_forest.py, s4_select_horn_spp_calc_proportion.py
+Adjustment for TDep: Runs will be adjusted based on TDep raster years. Change suffix where necessary.
+    I.e.,  tdep_suffix = '0002'
+
+Date Created: 2026-10-18
+
+"""
+
+# Import the necessary modules
+import os
+import timeit
+import arcpy as ap
+
+# Shared effect calculation for all endpoints, see effect_rasters.py and response_curves.py
+from effect_rasters import run_effects
+
+# Set up environment
+ap.env.overwriteOutput = True
+ap.CheckOutExtension("Spatial")
+ap.env.parallelProcessingFactor = "100%" # Parallel processing assists in the speed
+
+# Set path general output directory
+root_dir = <'Insert root directory to converted rasters here'> 
+out_dir = os.path.join(root_dir, <'Insert folder directory here'>)
+
+# Create variable lists for looping thru
+response_variables = ['growth', 'survival']
+elements = ['s', 'n']
+tdep_suffix = '1719' # TDep raster period, i.e., n_tw_1719 / s_tw_1719
+
+# Species processed at the same time and memory limit per worker process (MB), see species_parallel.py
+# Keep workers = 1 on machines with little memory; each worker holds its own blocks
+workers = 1
+memory_limit_mb = None
+
+# Effects looked up from a table of each species' response curve, starting at this deposition step
+# (kg/ha/yr) and refined until within lookup_tolerance of the exact effect; None evaluates the exact
+# formula at every cell, see response_curves.py
+lookup_step = None
+lookup_tolerance = 1e-4
+
+# Worker processes re-import this script, so only run the calculation from the main process
+if __name__ == '__main__':
+    # Record start time
+    start_time = timeit.default_timer()
+
+    # Begin the growth and survival rate effect calculation
+    run_effects(root_dir, out_dir, response_variables, elements, tdep_suffix, workers, memory_limit_mb,
+                lookup_step, lookup_tolerance)
+
+    # Calculate time elapsed and print
+    elapsed_min = (timeit.default_timer() - start_time) / 60
+    print('Creating growth and survival effect rasters took ', elapsed_min, 'minutes')
@@ -13,12 +13,18 @@ Outputs needed from: s1_ba_export_to_single_gdb.py, s2_setzero_null.py,
 Adjustment for TDep: Runs will be adjusted based on TDep raster years. Change suffix where necessary.
     I.e.,  line 83  tdep_Raster = os.path.join(out_dir, 'tdep.gdb//{}_tw_0002'.format(element))
 
-Note: This script is burdensome on RAM usage. A minimum of 64 GB RAM is needed for to run this script.
-    If that amount of RAM s unavailable, tiling can be done within the script then mosaicked back together.
-    A tiling/mosaic code chunk is not currently contained within the script.
+Note: Rasters are processed in row blocks across all species (see cell_statistics.py), so RAM usage is
+    set by memory_budget_mb below rather than by the size of the grid.
 
     Additionally, this script can be used for the outputs from 9a and 9b to determine the fifth
     percentile of deposition needed to prevent an x% reduction in growth or survival.
+    The deposition level is one number over each species' range, so with constant_levels below the
+    percentile is found once per distinct set of species present at a cell, from the levels and ranges
+    saved by s9a/s9b, without writing or reading the species rasters (see cell_statistics.py).
+
+    A percentile raster is only recomputed when the inputs (the manifest keys of the levels, or the
+    content of level rasters written before the manifest) or the percentile changed since it was
+    written (see run_manifest.py).
 
 Author: Justin G. Coughlin, M.S.
 Date Created: 2020-12-10
@@ -30,9 +36,19 @@ Email: justin.coughlin@outlook.com
 # Import the necessary modules
 import os
 import timeit
-import numpy as np
 import arcpy as ap
 
+# Streaming per-cell percentile across the species rasters, or once per set of species present
+from cell_statistics import percentile_raster, signature_percentile_raster
+
+# Time and memory of each percentile raster are recorded in out_dir/profile, see run_profile.py
+from run_profile import profile_unit, start_profile
+
+# s9a/s9b save the deposition levels as one number per species, see run_manifest.py
+from effect_rasters import deposition_level_path
+from run_manifest import RunManifest, code_version, hash_parts, level_records, materialize_levels
+from species_ranges import SpeciesRange
+
 # Set up environment
 ap.env.overwriteOutput = True
 ap.CheckOutExtension("Spatial")
@@ -41,6 +57,7 @@ ap.env.parallelProcessingFactor = "100%"
 # Set path general output directory
 root_dir = <'Insert root directory to converted rasters here'> 
 out_dir = os.path.join(root_dir, <'Insert folder directory here'>)
+natl_forest_raster = os.path.join(out_dir, 'ba_null.gdb', 'ba_null_natl_forest') # Output from s3_ba_sum_natl_forest.py
 aggregate_out_path = os.path.join(out_dir, 'aggregate.gdb')
 if not ap.Exists(aggregate_out_path): # Create the directory if it does not exist
     ap.CreateFileGDB_management(out_dir, 'aggregate.gdb')
@@ -48,25 +65,42 @@ if not ap.Exists(aggregate_out_path): # Create the directory if it does not exis
 # Create variable lists for looping thru
 response_variables = ['survival', 'growth']
 elements = ['s', 'n']
+percentile = 5 # Set the percentile here, replace '5' with desired percentile
+memory_budget_mb = 4096 # Memory used for one block of the species stack; lower it on smaller machines
+
+# Percentile of the deposition levels from the saved levels and species ranges (True), or from the
+# level rasters (False, written first if s9a/s9b did not write them)
+constant_levels = True
+save_signature_index = False # Also save the index of the set of species present at each cell
 
 # Record start time
 start_time = timeit.default_timer()
-print('Beginning the raster to numpy process...')
+start_profile(out_dir)
+manifest = RunManifest.load(out_dir)
+print('Beginning the percentile process...')
 
 # Begin the aggregate calculation; default setting is 5th percentile
 for response_variable in response_variables:
     for element in elements:
-        rdxn_path = os.path.join(out_dir, '{}_{}_deposition_5_red.gdb'.format(element.capitalize(), response_variable))
+        rdxn_path = deposition_level_path(out_dir, response_variable, element)
+        records = level_records(manifest, rdxn_path)
         ap.env.workspace = rdxn_path
-        rasters = ap.ListRasters()
-        out_raster_name = 'dep_percentile_5_{}_{}'.format(response_variable, element)
+        unrecorded = sorted(set(ap.ListRasters() or []) - set(records))
+        # Rasters written without a saved level (earlier runs) are read from the gdb
+        levels = records if constant_levels and not unrecorded else {}
+        out_raster_name = 'dep_percentile_{}_{}_{}'.format(percentile, response_variable, element)
         out_raster_save_path = os.path.join(os.path.join(out_dir, 'aggregate.gdb'), out_raster_name)
-        if ap.Exists(out_raster_save_path):
+        # Key of the inputs: the manifest key of each level, or the content of rasters without one
+        inputs = {name: record['key'] for name, record in records.items()}
+        inputs.update({name: manifest.input_hash(os.path.join(rdxn_path, name)) for name in unrecorded})
+        key = hash_parts(product='percentile', percentile=percentile, inputs=inputs,
+                         code=code_version('cell_statistics.py'))
+        if manifest.is_current(out_raster_save_path, key):
             print('out file name = ', out_raster_name)
-            print(' >>> EXISTS IN OUTPUT gdb: ', out_raster_save_path)
+            print(' >>> UP TO DATE IN OUTPUT gdb: ', out_raster_save_path)
             print('going to next raster', '\n')
         else:
-            print('does not exist in output gdb, .....process raster ', out_raster_name)
+            print('missing or out of date in output gdb, .....process raster ', out_raster_name)
             print('redxn raster will be saved to : ', out_raster_save_path, '\n')
             print('**setting the environment including cell size, spatial ref, and snap')
             
@@ -74,39 +108,32 @@ for response_variable in response_variables:
             # set output coordinate system
             spatial_ref = ap.SpatialReference(5070) # 5070 = Equal Area Conus Albers
             ap.env.outputCoordinateSystem = spatial_ref
-            ap.env.cellSize = rdxn_path
-            ap.env.snapRaster = rdxn_path
-            
-            # Create rasters to numpy arrays. Append the arrays.
-            arrs = []
-            for raster in rasters:
-                print('Converting raster to numpy for: ', raster, 'in ', rdxn_path)
-                arrs.append(ap.RasterToNumPyArray(raster, nodata_to_value=100000)) # NAs to 100000
-                # The master array
-            
-            # Create median effect raster to use as the extent 
-            print('Creating median raster for extent...')
-            CellStat = ap.sa.CellStatistics(rasters, 'MEDIAN')
-            # ---- Save the result out to a new raster ------
-            print('Setting up new raster dataset...')
-            lower_left = CellStat.extent.lowerLeft  # ---- needed to produce output
-            cell_size = CellStat.meanCellHeight  # ---- we will use this for x and y
-            
-            # Convert appended arrays into full stack, mask NAs that have been converted
-            print('Converting appended arrays to full stack array...')
-            a = np.array(arrs)
-            ma = np.ma.masked_values(a, 100000.000000)
-            ma_nan = np.ma.filled(ma, np.nan)
-            
+
             # Conduct the fifth percentile calculation
+            # Aggregate calculation. Calculates the percentile through the species axis for each cell, excluding NAs.
+            # The national forest raster sets the extent and cell size; all species rasters share its grid.
             print('Calculating percentile including NAs...')
-            # Aggregate calculation. Calculates the percentile through the '0' axis (i.e., vertically, nort horizontally) 
-            percentile_5 = np.nanpercentile(ma_nan, 5, axis=0) # Set the percentile here, replace '5' with desired percentile.
-            print('Converting numpy to raster...')
-            out_percentile = ap.NumPyArrayToRaster(percentile_5, lower_left, cell_size, cell_size)
-            out_percentile.save(out_raster_save_path)
-            del a, ma, ma_nan, out_percentile # Clean up environment
+            with profile_unit(element=element, endpoint=response_variable):
+                if levels:
+                    # One percentile per set of species present, scattered back to the cells
+                    names = sorted(levels)
+                    index_raster_save_path = os.path.join(aggregate_out_path, 'dep_signature_index_{}_{}'.format(
+                        response_variable, element)) if save_signature_index else None
+                    signature_percentile_raster([SpeciesRange.load(levels[name]['range']) for name in names],
+                                                [levels[name]['level'] for name in names], percentile,
+                                                out_raster_save_path, natl_forest_raster, memory_budget_mb,
+                                                index_raster_save_path)
+                else:
+                    # Write the rasters of levels that s9a/s9b saved without them
+                    materialize_levels(manifest, rdxn_path)
+                    ap.env.workspace = rdxn_path
+                    raster_paths = [os.path.join(rdxn_path, raster) for raster in ap.ListRasters() or []]
+                    if not raster_paths:
+                        raise ValueError('No deposition levels or rasters found for {} {} in {}; run s9a/s9b first'.format(
+                            response_variable, element, rdxn_path))
+                    percentile_raster(raster_paths, percentile, out_raster_save_path, natl_forest_raster, memory_budget_mb)
+            manifest.update({out_raster_save_path: {'key': key, 'written': True}})
 
 # Calculate time elapsed and print
 elapsed_min = (timeit.default_timer() - start_time) / 60
-print('creating aggregate effect rasters took', elapsed_min, 'minutes')
\ No newline at end of file
+print('creating aggregate effect rasters took', elapsed_min, 'minutes')
\ No newline at end of file
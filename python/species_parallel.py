@@ -0,0 +1,179 @@
+"""
+#### Module Information ####
+
+Module name: species_parallel.py
+
+Purpose of module: Spread per-species raster work across a pool of worker processes.
+    Most of the Spatial Analyst tools used per species are single-threaded, so on a multi-core
+    server the serial 'for spp_raster in ap.ListRasters()' loops use one core for most of the run.
+    Each species writes its own outputs, so results do not depend on the number of workers.
+    Progress is reported in species order, and a species that fails is reported at the end
+    instead of stopping the run. If a worker dies (e.g., over its memory limit), only the species
+    it was running is reported as failed and the remaining species go on in a new pool.
+
+    Scripts that use a pool must keep their processing under "if __name__ == '__main__':",
+    because on Windows each worker re-imports the main script.
+
+Used by: effect_rasters.py, species_pass.py, ba_sum.py, array_store.py, s4 and s8 (see README_Py.md)
+
+Date Created: 2026-10-18
+
+"""
+
+# Import the necessary modules
+import inspect
+import os
+import shutil
+import tempfile
+import timeit
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from run_profile import profile_unit
+
+# Default number of worker processes: one per core, leaving one for the main process
+DEFAULT_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+
+# Rows per block returned by the worker setup, in a worker process (see raster_blocks.setup_worker)
+_worker_block_rows = None
+
+
+def _limit_memory(memory_limit_mb):
+    """
+    Cap the address space of the current process where the platform supports it (Linux, macOS).
+    On Windows the limit is only applied through the block size (see raster_blocks.setup_worker).
+    """
+    try:
+        import resource
+    except ImportError:
+        return
+    limit = int(memory_limit_mb * 1024 ** 2)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _init_worker(memory_limit_mb, worker_setup, scratch_dir):
+    """
+    Run once in each worker process before any species is processed.
+    """
+    global _worker_block_rows
+    if memory_limit_mb:
+        _limit_memory(memory_limit_mb)
+    if worker_setup is not None:
+        _worker_block_rows = worker_setup(memory_limit_mb, scratch_dir)
+
+
+def _run_task(func, label, kwargs):
+    """
+    Run one species and return (label, result, error, elapsed seconds); errors are returned as the
+    formatted traceback so one failed species does not abort the others. The species is recorded as
+    one unit of the stage's profile (see run_profile.py). Functions with a block_rows argument get
+    the block size of the worker's memory limit.
+    """
+    start_time = timeit.default_timer()
+    if _worker_block_rows and 'block_rows' in inspect.signature(func).parameters:
+        kwargs = dict(kwargs, block_rows=_worker_block_rows)
+    try:
+        with profile_unit(species=label):
+            result = func(**kwargs)
+        error = None
+    except Exception:
+        result = None
+        error = traceback.format_exc()
+    return label, result, error, timeit.default_timer() - start_time
+
+
+def _run_pool(func, tasks, indices, workers, memory_limit_mb, worker_setup, scratch_dir, report):
+    """
+    Run the tasks at indices in one pool, submitting at most one species per worker at a time so the
+    species running when a worker dies are known.
+    Returns (indices of the species running when the pool broke, indices not started yet); both are
+    empty when every species finished.
+    """
+    pending = list(indices)
+    running = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(memory_limit_mb, worker_setup, scratch_dir)) as executor:
+        while pending or running:
+            while pending and len(running) < workers:
+                i = pending.pop(0)
+                label, kwargs = tasks[i]
+                running[executor.submit(_run_task, func, label, kwargs)] = i
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            if any(isinstance(future.exception(), BrokenProcessPool) for future in done):
+                # The pool can not continue; keep the species that finished before it broke
+                broken = []
+                for future, i in running.items():
+                    if future.done() and future.exception() is None:
+                        report(i, future.result())
+                    else:
+                        broken.append(i)
+                return sorted(broken), pending
+            for future in done:
+                report(running.pop(future), future.result())
+    return [], []
+
+
+def run_species_parallel(func, tasks, workers=1, memory_limit_mb=None, worker_setup=None, on_result=None):
+    """
+    Run func once per species, in a pool of worker processes.
+
+    func: top-level function (so it can be sent to a worker), called as func(**kwargs)
+    tasks: list of (label, kwargs) in species order, e.g., [('s121_proportion', {...}), ...]
+    workers: number of worker processes; 1 runs in the current process without a pool
+    memory_limit_mb: memory limit for each worker, in MB (None for no limit)
+    worker_setup: optional top-level function called as worker_setup(memory_limit_mb, scratch_dir) once in
+        each worker, e.g., raster_blocks.setup_worker to check out Spatial Analyst and set the scratch
+        workspace in scratch_dir (a temporary folder removed when the run is done). It may return a block
+        size, passed to func as block_rows if func takes it. Not called when workers is 1.
+    on_result: optional function called in the main process as on_result(result) for each species that
+        finished, in species order, e.g., to record its outputs in the run manifest as the run goes
+
+    Returns a list of (label, result, error) in the same order as tasks. error is None for species
+    that finished and the traceback text for species that failed.
+    """
+    n_tasks = len(tasks)
+    finished = [None] * n_tasks
+    next_to_report = 0
+
+    def report(i, outcome):
+        # Print progress in species order as soon as every earlier species is finished
+        nonlocal next_to_report
+        finished[i] = outcome
+        while next_to_report < n_tasks and finished[next_to_report] is not None:
+            label, result, error, elapsed = finished[next_to_report]
+            status = 'FAILED' if error else 'done'
+            print('[{}/{}] {} {} ({:.1f} s)'.format(next_to_report + 1, n_tasks, label, status, elapsed))
+            if on_result is not None and not error:
+                on_result(result)
+            next_to_report += 1
+
+    if workers <= 1:
+        # The current process is already set up by the calling script
+        for i, (label, kwargs) in enumerate(tasks):
+            report(i, _run_task(func, label, kwargs))
+    else:
+        scratch_dir = tempfile.mkdtemp(prefix='spp_workers_')
+        try:
+            pending = list(range(n_tasks))
+            while pending:
+                broken, pending = _run_pool(func, tasks, pending, workers, memory_limit_mb, worker_setup,
+                                            scratch_dir, report)
+                # A worker died (e.g., it went over its memory limit). If several species were running,
+                # run each of them on its own to find the one that kills its worker
+                for i in broken:
+                    if len(broken) == 1 or _run_pool(func, tasks, [i], 1, memory_limit_mb, worker_setup,
+                                                     scratch_dir, report)[0]:
+                        report(i, (tasks[i][0], None, 'Worker process died (memory limit {} MB?)'.format(
+                            memory_limit_mb), 0.0))
+        finally:
+            shutil.rmtree(scratch_dir, ignore_errors=True)
+
+    # Report failed species at the end of the run
+    failed = [(label, error) for label, _, error, _ in finished if error]
+    if failed:
+        print('***{} of {} species FAILED***'.format(len(failed), n_tasks))
+        for label, error in failed:
+            print('---', label, '---')
+            print(error)
+    return [(label, result, error) for label, result, error, _ in finished]
@@ -0,0 +1,176 @@
+"""
+#### Module Information ####
+
+Module name: species_params.py
+
+Purpose of module: Load the Horn et al. (2018) species parameter tables (growth.csv, survival.csv)
+    once into memory. Replaces the per-raster ap.da.SearchCursor scans over the growth/survival
+    tables, which re-read the whole table for every species (often twice).
+    Lookups by spp_code are a dict index into column arrays, and whole parameter columns
+    (e.g., every species' n1) are available as arrays for batched calculations.
+
+Used by: every stage that reads growth.csv or survival.csv (see README_Py.md)
+
+Date Created: 2026-10-18
+
+"""
+
+# Import the necessary modules
+import csv
+import os
+import numpy as np
+
+from response_curves import CurveParams
+
+# Parameter columns read from the growth and survival tables, by element
+PARAM_COLUMNS = {
+    'n': ['n1', 'n2', 'min_n', 'max_n', 'ndep_max'],
+    's': ['s1', 's2', 'min_s', 'max_s', 'sdep_max'],
+}
+
+# Values treated as missing in the csv files
+MISSING_VALUES = ('', 'NA', 'NaN', 'nan', 'NULL', '<Null>')
+
+# spp codes of the Horn et al. (2018) species selected by s4_select_horn_spp_calc_proportion.py and s2_s4_fused_ingest.py
+HORN_SPP_CODES = [11, 12, 15, 17, 19, 64, 65, 68, 69, 71, 73, 81, 93, 94, 95, 97, 105, 106, 108,
+                  110, 111, 121, 122, 125, 126, 129, 131, 132, 133, 202, 221, 222, 241, 242,
+                  261, 263, 264, 313, 316, 317, 318, 371, 372, 375, 391, 402, 403, 407, 408,
+                  409, 461, 462, 531, 541, 543, 544, 552, 602, 611, 621, 631, 641, 653, 691,
+                  693, 694, 701, 711, 731, 741, 743, 746, 762, 802, 805, 806, 809, 812, 820,
+                  823, 826, 827, 831, 832, 833, 835, 837, 901, 922, 931, 951, 971, 972, 975]
+
+
+def spp_code_from_raster(spp_raster):
+    """
+    USFS spp code from a raster name, e.g., 's121_proportion' -> 121.
+    """
+    return int(spp_raster.split('_')[0][1:])
+
+
+class SpeciesParams(object):
+    """
+    Species parameter table for one endpoint (growth or survival) held as column arrays.
+
+    codes: int array of spp codes, one per row
+    columns: dict of column name -> float64 array, NaN where the table has no value
+    """
+
+    def __init__(self, endpoint, codes, columns):
+        self.endpoint = endpoint
+        self.codes = np.asarray(codes, dtype=np.int64)
+        self.columns = columns
+        self._index = {int(code): i for i, code in enumerate(self.codes)}
+        self._validate()
+
+    @classmethod
+    def from_csv(cls, csv_path, endpoint):
+        """
+        Read a growth or survival csv, keeping spp_code and the parameter columns of both elements.
+        """
+        names = [name for element in PARAM_COLUMNS for name in PARAM_COLUMNS[element]]
+        codes = []
+        values = {name: [] for name in names}
+        with open(csv_path, newline='') as f:
+            for row in csv.DictReader(f):
+                codes.append(int(float(row['spp_code'])))
+                for name in names:
+                    value = (row.get(name) or '').strip() # Short rows give None
+                    values[name].append(np.nan if value in MISSING_VALUES else float(value))
+        columns = {name: np.array(values[name], dtype=np.float64) for name in names}
+        return cls(endpoint, codes, columns)
+
+    def _validate(self):
+        """
+        Check the table before any raster is read. spp codes must be unique. A species has a critical
+        load for an element if n1/s1 is present (all exceedance needs, s5); the response curves (s6, s9)
+        also need n2/s2 and min_n/min_s, so species with an n1/s1 value but missing the others are
+        reported and only dropped where the full curve is requested.
+        """
+        if len(self._index) != len(self.codes):
+            raise ValueError('Duplicate spp_code in {} table'.format(self.endpoint))
+        self._has_cl = {}
+        self._has_curve = {}
+        for element, names in PARAM_COLUMNS.items():
+            has_cl1 = ~np.isnan(self.columns[names[0]])
+            usable = has_cl1 & ~np.isnan(self.columns[names[1]]) & ~np.isnan(self.columns[names[2]])
+            if (has_cl1 & ~usable).any():
+                print('**Check** {} table: spp codes {} have {} but are missing {} or {}; skipping them for '
+                      'the response curves'.format(self.endpoint, self.codes[has_cl1 & ~usable].tolist(),
+                                                   names[0], names[1], names[2]))
+            self._has_cl[element] = has_cl1
+            self._has_curve[element] = usable
+
+    def __contains__(self, spp_code):
+        return spp_code in self._index
+
+    def column(self, name):
+        """
+        Whole parameter column as a float64 array, e.g., column('n1').
+        """
+        return self.columns[name]
+
+    def has_critical_load(self, spp_code, element, full_curve=False):
+        """
+        True if the species is in the table and has an n1/s1 value for the element.
+        full_curve: also require n2/s2 and min_n/min_s, as the response curves and deposition levels do
+        """
+        i = self._index.get(spp_code)
+        return i is not None and bool((self._has_curve if full_curve else self._has_cl)[element][i])
+
+    def curve_params(self, spp_code, element, full_curve=False):
+        """
+        CurveParams (n1/s1, n2/s2, min, max, dep_max) for one species and element, or None if the
+        species has no critical load value (or, with full_curve, is missing n2/s2 or min_n/min_s).
+        Missing values are NaN, except a missing dep_max, which is returned as None.
+        """
+        if not self.has_critical_load(spp_code, element, full_curve):
+            return None
+        i = self._index[spp_code]
+        values = [float(self.columns[name][i]) for name in PARAM_COLUMNS[element]]
+        if np.isnan(values[4]):
+            values[4] = None
+        return CurveParams(*values)
+
+    def curve_param_columns(self, element, spp_codes=None, full_curve=False):
+        """
+        CurveParams of arrays (one value per species) for batched calculations. Defaults to every
+        species with a critical load for the element; dep_max is NaN where the table has no value.
+        """
+        if spp_codes is None:
+            spp_codes = self.codes_with_critical_load(element, full_curve)
+        rows = np.array([self._index[code] for code in spp_codes], dtype=np.int64)
+        return CurveParams(*[self.columns[name][rows] for name in PARAM_COLUMNS[element]])
+
+    def codes_with_critical_load(self, element, full_curve=False):
+        """
+        spp codes that have an n1/s1 value for the element (and n2/s2 and min_n/min_s with full_curve).
+        """
+        return self.codes[(self._has_curve if full_curve else self._has_cl)[element]]
+
+
+def load_species_params(root_dir, response_variables=('growth', 'survival')):
+    """
+    Load growth.csv and/or survival.csv from the root directory. Returns a dict of
+    response variable -> SpeciesParams.
+    """
+    return {response_variable: SpeciesParams.from_csv(os.path.join(root_dir, '{}.csv'.format(response_variable)),
+                                                      response_variable)
+            for response_variable in response_variables}
+
+
+def species_to_process(spp_raster_list, species_params, elements, full_curve=False):
+    """
+    Pair each species raster with its spp code and drop species that have no critical load for any
+    of the requested response variables and elements, so they are skipped before any raster I/O.
+    full_curve: also drop species missing the other parameters of the response curves (s6, s9)
+    Returns a list of (spp_raster, spp_code).
+    """
+    to_process = []
+    for spp_raster in spp_raster_list:
+        spp_code = spp_code_from_raster(spp_raster)
+        if any(table.has_critical_load(spp_code, element, full_curve)
+               for table in species_params.values() for element in elements):
+            to_process.append((spp_raster, spp_code))
+        else:
+            print('No critical load value, **skipping** ', spp_raster)
+    return to_process
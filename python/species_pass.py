@@ -0,0 +1,257 @@
+"""
+#### Module Information ####
+
+Module name: species_pass.py
+
+Purpose of module: Fused "species pass" that reads the species proportion values and the TDep values
+    at the species' cells once and derives every per-species product from them: the exceedance (s5),
+    the growth/survival effect (s6a, s6b), the basal area weighted effect (s8) and the deposition
+    level needed to prevent an x% reduction (s9a, s9b).
+    Running the scripts one after the other re-reads the same proportion and TDep data in each
+    script, and s8 reads the effect rasters back after s6 writes them. Here each product is
+    calculated from values already in memory, and any product can be written or skipped.
+    Outputs use the same geodatabases and raster names as the individual scripts, so s7 and
+    re-runs of the individual scripts see the same files. Outputs are only recomputed when their
+    inputs, parameters or code changed since they were written (see run_manifest.py).
+
+    Several TDep periods (e.g., every 3-year period from 2000-2002 to 2017-2019) can be run as a time
+    axis: the species' range, parameters and reference values are loaded once, the TDep values of
+    all periods are gathered into one (periods x cells) array and each product is calculated for all
+    periods at once. Period outputs go to one gdb per period, e.g., N_growth_effect_0002.gdb.
+
+Used by: s5_s9_species_pass.py
+
+Date Created: 2026-10-18
+
+"""
+
+# Import the necessary modules
+import os
+import numpy as np
+import arcpy as ap
+
+from effect_rasters import DEPOSITION_LEVEL_NAMES
+from raster_blocks import setup_worker
+from response_curves import LOOKUP_TOLERANCE, ba_weighted_effect, deposition_level, effect, lookup_tables
+from run_manifest import KERNEL_MODULES, RunManifest, code_version, hash_parts, prepare_tdep, save_level, save_output
+from run_profile import count_cells, profile_unit, start_profile
+from species_params import load_species_params, species_to_process
+from species_parallel import run_species_parallel
+from species_ranges import load_species_range, range_cache_path
+
+# Output gdb and raster name of each product, formatted with the capitalized element (E), element (e),
+# response variable (rv), TDep period (tdep) and species raster (spp)
+PRODUCTS = {
+    'exceedance': ('{E}_dep_{tdep}.gdb', '{spp}_exc_{e}_{rv}_{tdep}'),
+    'effect': ('{E}_{rv}_effect.gdb', '{spp}_effect'),
+    'ba_weighted_effect': ('{E}_basal_area_prop_{rv}_effect.gdb', '{spp}_effect_basalarea'),
+    'deposition_level': None, # Set by response variable, see DEPOSITION_LEVEL_NAMES
+}
+
+# 3-year TDep periods from 2000-2002 to 2017-2019, e.g., '0002' for n_tw_0002
+TDEP_PERIODS = ['{:02d}{:02d}'.format(year % 100, (year + 2) % 100) for year in range(2000, 2018)]
+
+# Memory for the (periods x cells) arrays of one species, in MB; periods are processed in batches that fit
+PERIOD_BATCH_MB = 1024
+
+
+def product_path(out_dir, product, spp_raster, element, response_variable, tdep_suffix, by_period=False):
+    """
+    Path of one product raster for a species, element and response variable.
+
+    by_period: save to a gdb for the TDep period, e.g., N_growth_effect_0002.gdb, for products whose
+        names do not already include the period (the deposition level does not depend on TDep)
+    """
+    gdb_name, raster_name = PRODUCTS[product] or DEPOSITION_LEVEL_NAMES[response_variable]
+    if by_period and product != 'deposition_level' and '{tdep}' not in gdb_name:
+        gdb_name = gdb_name.replace('.gdb', '_{tdep}.gdb')
+    names = dict(E=element.capitalize(), e=element, rv=response_variable, tdep=tdep_suffix, spp=spp_raster)
+    return os.path.join(out_dir, gdb_name.format(**names), raster_name.format(**names))
+
+
+def run_species_pass(root_dir, out_dir, products, response_variables, elements, tdep_suffix='1719',
+                     reductions=None, workers=1, memory_limit_mb=None, lookup_step=None,
+                     lookup_tolerance=LOOKUP_TOLERANCE):
+    """
+    Create the requested products for every species in spp_proportion_ba.gdb.
+
+    products: list of products to write, any of 'exceedance', 'effect', 'ba_weighted_effect',
+        'deposition_level'
+    response_variables: list of endpoints, e.g., ['growth', 'survival']
+    elements: list of elements, e.g., ['n', 's']
+    tdep_suffix: TDep raster period, e.g., '1719' for n_tw_1719 / s_tw_1719, or a list of periods
+        (e.g., TDEP_PERIODS) to run every period in the same pass, with outputs saved by period
+    reductions: dict of response variable -> x for the deposition level, e.g., {'growth': 0.05};
+        defaults to 0.05 for growth and 0.01 for survival
+    workers: number of species processed at the same time (see species_parallel.py)
+    memory_limit_mb: memory limit for each worker, in MB (None for no limit)
+    lookup_step: evaluate the effects from lookup tables starting at this deposition step (kg/ha/yr),
+        within lookup_tolerance of the exact effect (see response_curves.ResponseTable); None
+        evaluates the exact formula at every cell
+    """
+    unknown = set(products) - set(PRODUCTS)
+    if unknown:
+        raise ValueError('Unknown products {}; choose from {}'.format(sorted(unknown), sorted(PRODUCTS)))
+    reductions = reductions or {}
+    by_period = not isinstance(tdep_suffix, str)
+    tdep_suffixes = list(tdep_suffix) if by_period else [tdep_suffix]
+
+    # Set path to input proportional rasters created in s4_select_horn_spp_calc_proportion.py
+    spp_prop_ba_gdb_path = os.path.join(out_dir, 'spp_proportion_ba.gdb')
+
+    # Load the growth/survival tables once; species without a critical load are dropped up front
+    species_params = load_species_params(root_dir, response_variables)
+
+    # Outputs are only recomputed when their inputs changed since the last run
+    manifest = RunManifest.load(out_dir)
+    code = code_version(*KERNEL_MODULES)
+    lookup = (lookup_step, lookup_tolerance) if lookup_step else None
+    if lookup:
+        code = hash_parts(code=code, lookup=lookup) # Switching the lookup tables on or off recomputes the outputs
+
+    # Time and memory of every species, element and endpoint are recorded in out_dir/profile
+    start_profile(out_dir)
+
+    # Create output gdbs
+    for product in products:
+        for response_variable in response_variables:
+            for element in elements:
+                for suffix in tdep_suffixes:
+                    gdb_path = os.path.dirname(product_path(out_dir, product, '', element, response_variable,
+                                                            suffix, by_period))
+                    if not ap.Exists(gdb_path): # Create the directory if it does not exist
+                        ap.CreateFileGDB_management(out_dir, os.path.basename(gdb_path))
+
+    ap.env.workspace = spp_prop_ba_gdb_path
+    spp_raster_list = ap.ListRasters()
+
+    # All proportion rasters share the national forest grid, so TDep only needs to be aligned once
+    template = os.path.join(spp_prop_ba_gdb_path, spp_raster_list[0])
+    tdep_aligned, tdep_hashes = prepare_tdep(out_dir, template, elements, tdep_suffixes, manifest)
+
+    tasks = [(spp_raster, dict(spp_raster=spp_raster, spp_code=spp_code, species_params=species_params,
+                               out_dir=out_dir, products=products, response_variables=response_variables,
+                               elements=elements, tdep_aligned=tdep_aligned, tdep_suffixes=tdep_suffixes,
+                               reductions=reductions, by_period=by_period, manifest=manifest,
+                               tdep_hashes=tdep_hashes, code=code, lookup=lookup))
+             for spp_raster, spp_code in species_to_process(spp_raster_list, species_params, elements)]
+    return run_species_parallel(species_pass, tasks, workers, memory_limit_mb, setup_worker, manifest.update)
+
+
+def species_pass(spp_raster, spp_code, species_params, out_dir, products, response_variables, elements,
+                 tdep_aligned, tdep_suffixes, reductions, by_period, manifest, tdep_hashes, code, lookup=None,
+                 block_rows=None):
+    """
+    Create the requested products of one species that are missing or out of date. The proportion
+    values at the species' cells are read once, and the TDep values once per element and period,
+    and shared by every product. Run once per species by run_species_pass, possibly in a worker process.
+
+    tdep_aligned: dict of (element, period) -> TDep raster aligned to the species grid
+    tdep_suffixes: list of TDep periods; products are calculated for all of them at once
+    by_period: save outputs by period (see product_path)
+    manifest: RunManifest of earlier runs (see run_manifest.py)
+    tdep_hashes: dict of (element, period) -> content hash of the TDep raster
+    code: code version of the calculation
+    lookup: (step, tolerance) of the lookup tables, or None for the exact formula
+    block_rows: rows per strip when reading and writing (set by species_parallel.py for a memory limit)
+
+    Returns the manifest records (output path -> record) of the outputs written.
+    """
+    spp_raster_path = os.path.join(out_dir, 'spp_proportion_ba.gdb', spp_raster)
+    species_range = load_species_range(spp_raster_path, out_dir, block_rows=block_rows)
+    range_hash = species_range.content_hash()
+    records = {}
+    for element in elements:
+        # Collect the products and periods that are missing or out of date, skip if already done
+        params_by_response = {}
+        out_raster_save_paths = {}
+        keys = {}
+        for response_variable in response_variables:
+            params = species_params[response_variable].curve_params(spp_code, element)
+            if params is None:
+                print('No critical load value, **skipping** ', spp_code, element, response_variable)
+                continue
+            # Only the exceedance can be calculated from n1/s1 alone, as in s5
+            full_curve = species_params[response_variable].has_critical_load(spp_code, element, full_curve=True)
+            for product in products:
+                if product != 'exceedance' and not full_curve:
+                    print('{0}2 or min_{0} is missing, **skipping** {1}'.format(element, product), spp_code,
+                          response_variable)
+                    continue
+                for period, suffix in enumerate(tdep_suffixes):
+                    out_raster_save_path = product_path(out_dir, product, spp_raster, element, response_variable,
+                                                        suffix, by_period)
+                    if product == 'deposition_level' and period > 0:
+                        continue # The deposition level does not depend on TDep
+                    elif product == 'deposition_level' and not params.dep_max:
+                        print('{}dep_max is null, **skipping** deposition level'.format(element), spp_code)
+                        continue
+                    # Key of everything the output depends on; only the deposition level uses the reduction
+                    # and it does not depend on TDep
+                    level = product == 'deposition_level'
+                    key = hash_parts(product=product, element=element, response_variable=response_variable,
+                                     params=list(params), range=range_hash, code=code,
+                                     tdep=None if level else tdep_hashes[(element, suffix)],
+                                     reduction=reductions.get(response_variable) if level else None)
+                    if manifest.is_current(out_raster_save_path, key):
+                        print(' >>> UP TO DATE IN OUTPUT gdb: ', out_raster_save_path)
+                    else:
+                        out_raster_save_paths[(response_variable, product, period)] = out_raster_save_path
+                        keys[(response_variable, product, period)] = key
+                        params_by_response[response_variable] = params
+        if not out_raster_save_paths:
+            continue
+
+        for response_variable, params in params_by_response.items():
+            print('Values for spp code', spp_code, element, response_variable, '=', params)
+
+        def save(key, values):
+            save_output(species_range, values, out_raster_save_paths[key], keys[key], records)
+
+        for response_variable, params in params_by_response.items():
+            if (response_variable, 'deposition_level', 0) in out_raster_save_paths:
+                with profile_unit(spp_raster, element, response_variable):
+                    # Written over the range, and recorded as one level as s9a/s9b do (see run_manifest.save_level)
+                    level = deposition_level(params, response_variable, reductions.get(response_variable))
+                    key = (response_variable, 'deposition_level', 0)
+                    save_level(species_range, level, out_raster_save_paths[key], keys[key], records,
+                               range_cache_path(spp_raster_path, out_dir), write_raster=True)
+                    count_cells(len(species_range))
+
+        # Read TDep for a batch of periods at a time as a (periods x cells) array, shared by both
+        # response variables, and calculate every product for all periods of the batch at once
+        periods = sorted({period for _, product, period in out_raster_save_paths if product != 'deposition_level'})
+        batch_size = max(1, int(PERIOD_BATCH_MB * 1024 ** 2 // (4 * 8 * max(1, len(species_range)))))
+        for batch_start in range(0, len(periods), batch_size):
+            batch = periods[batch_start:batch_start + batch_size]
+            with profile_unit(spp_raster, element):
+                dep = np.vstack([species_range.gather(tdep_aligned[(element, tdep_suffixes[period])])
+                                 for period in batch])
+            for response_variable, params in params_by_response.items():
+                with profile_unit(spp_raster, element, response_variable):
+                    wanted = {product for rv, product, period in out_raster_save_paths
+                              if rv == response_variable and period in batch}
+                    results = {}
+                    if 'exceedance' in wanted:
+                        # Proportion where TDep >= critical load; non-exceedances (and 0) are set to null
+                        exceeded = np.greater_equal(dep, params.cl1) & (species_range.values != 0)
+                        results['exceedance'] = np.where(exceeded, species_range.values, np.nan)
+                    if 'effect' in wanted or 'ba_weighted_effect' in wanted:
+                        # Deposition below min_dep is set to NoData
+                        if lookup:
+                            # One table for every period of the batch
+                            table = lookup_tables({(response_variable, element): params}, {element: dep},
+                                                  *lookup)[(response_variable, element)]
+                            results['effect'] = table.evaluate(dep)
+                        else:
+                            results['effect'] = effect(dep, params, response_variable)
+                        results['ba_weighted_effect'] = ba_weighted_effect(species_range.values, results['effect'])
+                    for row, period in enumerate(batch):
+                        for product in sorted(results):
+                            if (response_variable, product, period) in out_raster_save_paths:
+                                save((response_variable, product, period), results[product][row])
+                    count_cells(dep.size)
+        print('***{} saved for***'.format(element.upper()), spp_raster, ':',
+              sorted({(rv, product) for rv, product, _ in out_raster_save_paths}), 'periods:',
+              [tdep_suffixes[period] for period in periods], '\n')
+    return records
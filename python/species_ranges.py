@@ -0,0 +1,244 @@
+"""
+#### Module Information ####
+
+Module name: species_ranges.py
+
+Purpose of module: Compact (sparse) representation of a species' range on the national forest grid.
+    Each basal area proportion raster from s4_select_horn_spp_calc_proportion.py covers all of
+    CONUS, but most species only occupy a small part of it. A SpeciesRange keeps the bounding-box
+    window of the species' cells plus the flat indices (within the window) and values of the cells
+    that have data. The effect, exceedance, basal area weighting and deposition level stages
+    gather their inputs at these cells only and write their outputs over the window only, so
+    regionally limited species read, calculate and write a fraction of the national grid.
+
+    Ranges are cached as .npz files in out_dir/spp_ranges, one per proportion raster, by s4 (or
+    s2_s4_fused_ingest.py) or the first stage that needs them, with the file stamp of the proportion
+    raster (see raster_blocks.file_stamp); a range whose raster was re-created since is built again.
+
+Used by: the stages s4 to s9 and the modules that gather at species cells (see README_Py.md)
+
+Date Created: 2026-10-18
+
+"""
+
+# Import the necessary modules
+import hashlib
+import os
+import numpy as np
+
+import raster_blocks
+from raster_blocks import block_to_raster, file_stamp, mosaic_blocks
+
+# Folder in out_dir that holds the cached species ranges
+RANGES_DIR_NAME = 'spp_ranges'
+
+
+class SpeciesRange(object):
+    """
+    Cells of one species on a raster grid.
+
+    template: path of the raster that sets the grid and spatial reference (the proportion raster)
+    x_min, y_max: upper left corner of the bounding-box window
+    cell_width, cell_height: cell size of the grid
+    nrows, ncols: size of the window in cells
+    indices: sorted flat (row-major) indices of the cells with data, within the window
+    values: values of the template raster at those cells (float32)
+    block_rows: rows per strip when the range is gathered or written (see row_strips); None for
+        raster_blocks.BLOCK_SIZE
+    stamp: file stamp of the template raster when the range was cached (see load_species_range), or None
+    """
+
+    def __init__(self, template, x_min, y_max, cell_width, cell_height, nrows, ncols, indices, values):
+        self.template = template
+        self.x_min = x_min
+        self.y_max = y_max
+        self.cell_width = cell_width
+        self.cell_height = cell_height
+        self.nrows = nrows
+        self.ncols = ncols
+        self.indices = indices
+        self.values = values
+        self.block_rows = None
+        self.stamp = None
+
+    @classmethod
+    def from_raster(cls, raster_path, block_rows=None):
+        """
+        Build the range of a raster by reading it in full-width row strips and keeping the cells
+        that are not NoData. Only one strip of the raster is held in memory at a time.
+        """
+        import arcpy as ap
+
+        raster = ap.Raster(raster_path)
+        block_rows = block_rows or raster_blocks.BLOCK_SIZE
+        extent = raster.extent
+
+        def strips():
+            for row_start in range(0, raster.height, block_rows):
+                nrows = min(block_rows, raster.height - row_start)
+                lower_left = ap.Point(extent.XMin, extent.YMax - (row_start + nrows) * raster.meanCellHeight)
+                block = ap.RasterToNumPyArray(raster, lower_left, raster.width, nrows, nodata_to_value=np.nan)
+                raster_blocks.IO_BYTES['read'] += block.nbytes
+                yield row_start, block
+
+        return cls.from_strips(raster_path, raster, strips())
+
+    @classmethod
+    def from_strips(cls, template, raster, strips):
+        """
+        Build a range from full-width row strips of a raster, e.g., strips calculated while the raster
+        is written, so it does not need to be read back.
+
+        template: path saved as the range's template (the raster the strips belong to)
+        raster: raster object with the grid of the strips (cell size, extent)
+        strips: iterable of (row_start, block) in row order, with NaN for NoData
+        """
+        extent = raster.extent
+        cell_width, cell_height = raster.meanCellWidth, raster.meanCellHeight
+        rows, cols, values = [], [], []
+        for row_start, block in strips:
+            block_row, block_col = np.nonzero(~np.isnan(block))
+            rows.append(block_row + row_start)
+            cols.append(block_col)
+            values.append(block[block_row, block_col].astype(np.float32))
+        rows, cols, values = np.concatenate(rows), np.concatenate(cols), np.concatenate(values)
+
+        # Bounding-box window of the cells with data
+        if rows.size:
+            row_min, row_max, col_min, col_max = rows.min(), rows.max(), cols.min(), cols.max()
+        else:
+            row_min, row_max, col_min, col_max = 0, -1, 0, -1
+        nrows, ncols = int(row_max - row_min + 1), int(col_max - col_min + 1)
+        index_dtype = np.int32 if nrows * ncols < np.iinfo(np.int32).max else np.int64
+        indices = ((rows - row_min) * ncols + (cols - col_min)).astype(index_dtype)
+        return cls(str(template), extent.XMin + col_min * cell_width, extent.YMax - row_min * cell_height,
+                   cell_width, cell_height, nrows, ncols, indices, values)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Read a range saved with save().
+        """
+        with np.load(path, allow_pickle=False) as npz:
+            species_range = cls(str(npz['template']), float(npz['x_min']), float(npz['y_max']),
+                                float(npz['cell_width']), float(npz['cell_height']), int(npz['nrows']),
+                                int(npz['ncols']), npz['indices'], npz['values'])
+            if 'stamp' in npz.files:
+                species_range.stamp = [[str(name), int(size), int(mtime)] for name, size, mtime in npz['stamp']]
+        return species_range
+
+    def save(self, path):
+        """
+        Save the range as an .npz file.
+        """
+        stamp = np.array(self.stamp or [], dtype=object).astype(str).reshape(-1, 3)
+        np.savez(path, template=self.template, x_min=self.x_min, y_max=self.y_max,
+                 cell_width=self.cell_width, cell_height=self.cell_height, nrows=self.nrows,
+                 ncols=self.ncols, indices=self.indices, values=self.values, stamp=stamp)
+
+    def __len__(self):
+        return len(self.indices)
+
+    def content_hash(self):
+        """
+        Hash of the window, cell indices and values, e.g., to tell whether the proportion raster changed.
+        """
+        sha = hashlib.sha256()
+        sha.update(repr((self.x_min, self.y_max, self.cell_width, self.cell_height, self.nrows, self.ncols)).encode())
+        sha.update(np.ascontiguousarray(self.indices, dtype=np.int64).tobytes())
+        sha.update(np.ascontiguousarray(self.values, dtype=np.float32).tobytes())
+        return sha.hexdigest()
+
+    def nbytes(self):
+        """
+        Memory used by the indices and values, in bytes.
+        """
+        return self.indices.nbytes + self.values.nbytes
+
+    def row_strips(self, block_rows=None):
+        """
+        Yield (lower_left, nrows, row_start, cells) for full-width row strips of the window, where
+        cells is the slice of indices/values that falls in the strip. Strips without cells are skipped.
+        """
+        import arcpy as ap
+
+        block_rows = block_rows or self.block_rows or raster_blocks.BLOCK_SIZE
+        # The indices are sorted, so the cells of each strip are a contiguous slice
+        bounds = np.searchsorted(self.indices, np.arange(0, self.nrows + block_rows, block_rows) * self.ncols)
+        for i, row_start in enumerate(range(0, self.nrows, block_rows)):
+            if bounds[i] == bounds[i + 1]:
+                continue
+            nrows = min(block_rows, self.nrows - row_start)
+            lower_left = ap.Point(self.x_min, self.y_max - (row_start + nrows) * self.cell_height)
+            yield lower_left, nrows, row_start, slice(bounds[i], bounds[i + 1])
+
+    def gather(self, raster_path, block_rows=None):
+        """
+        Values of another raster on the same grid (e.g., aligned TDep or an effect raster) at the
+        species' cells, as float64 with NaN for NoData. Only the window is read, one strip at a time.
+        """
+        out = np.full(len(self), np.nan)
+        for lower_left, nrows, row_start, cells in self.row_strips(block_rows):
+            block = raster_blocks.read_block(raster_path, lower_left, self.ncols, nrows)
+            out[cells] = block.ravel()[self.indices[cells] - row_start * self.ncols]
+        return out
+
+    def to_raster(self, values, out_raster_save_path, block_rows=None):
+        """
+        Save values at the species' cells (NaN for NoData) as a raster covering the window only.
+        Returns the output path, or None if every value is NaN.
+        """
+        import arcpy as ap
+
+        raster = ap.Raster(self.template)
+        block_rasters = []
+        for lower_left, nrows, row_start, cells in self.row_strips(block_rows):
+            if np.isnan(values[cells]).all():
+                continue
+            block = np.full(nrows * self.ncols, np.nan, dtype=np.float32)
+            block[self.indices[cells] - row_start * self.ncols] = values[cells]
+            block_rasters.append(block_to_raster(block.reshape(nrows, self.ncols), lower_left, raster))
+        if mosaic_blocks(block_rasters, out_raster_save_path, raster):
+            return out_raster_save_path
+        return None
+
+
+def range_cache_path(spp_raster_path, out_dir):
+    """
+    Path of the cached range of a proportion raster, e.g., out_dir/spp_ranges/s121_proportion.npz.
+    """
+    return os.path.join(out_dir, RANGES_DIR_NAME, '{}.npz'.format(os.path.basename(spp_raster_path)))
+
+
+def load_species_range(spp_raster_path, out_dir, rebuild=False, block_rows=None):
+    """
+    Range of a proportion raster, read from the out_dir/spp_ranges cache or built from the raster
+    and cached. The cached range is only used if the raster's file stamp is the one it was cached with.
+    rebuild: build and cache the range even if it is already cached (used by s4 when the proportion
+    raster is re-created).
+    block_rows: rows per strip for reading the raster and for the range's reads and writes (e.g., the
+        block size of a worker with a memory limit, see raster_blocks.setup_worker)
+    """
+    range_path = range_cache_path(spp_raster_path, out_dir)
+    stamp = file_stamp(spp_raster_path)
+    species_range = SpeciesRange.load(range_path) if os.path.exists(range_path) and not rebuild else None
+    if species_range is None or species_range.stamp != stamp:
+        species_range = SpeciesRange.from_raster(spp_raster_path, block_rows)
+        species_range.stamp = stamp
+        os.makedirs(os.path.dirname(range_path), exist_ok=True)
+        species_range.save(range_path)
+    species_range.block_rows = block_rows
+    return species_range
+
+
+def restamp_ranges(spp_raster_paths, out_dir):
+    """
+    Save the current file stamp of each proportion raster with its cached range, once the stage that
+    wrote the rasters and their ranges is done. A raster in a file gdb is stamped with the whole gdb, so
+    writing later species changes the stamp of the ones written before.
+    """
+    for spp_raster_path in spp_raster_paths:
+        range_path = range_cache_path(spp_raster_path, out_dir)
+        species_range = SpeciesRange.load(range_path)
+        species_range.stamp = file_stamp(spp_raster_path)
+        species_range.save(range_path)
@@ -0,0 +1,49 @@
+"""
+#### Script Information ####
+
+Script name: summarize_tree_effects.py
+
+Purpose of script: Summarize the tree-level effects by species and by state (median and 5th percentile
+    of every endpoint and year), the Python equivalent of the species and state summaries at the end
+    of r/calculate_effects.R. Only trees inside the domain of the response curves in every year are
+    included, as in the R script. The table is loaded once and every statistic is calculated from one
+    partition of the trees per grouping, instead of one group_by per endpoint and statistic.
+    Results are tidy tables (one row per group, endpoint and year) rather than one xlsx sheet per endpoint.
+
+Placement in script series: Tree-level (FIA) analysis, replaces the summary section of calculate_effects.R
+Outputs needed from: calculate_tree_effects.py or r/calculate_effects.R (tree_level_effects_2000_2019.csv)
+
+Date Created: 2026-10-18
+
+"""
+
+# Import the necessary modules
+import os
+import timeit
+
+# Grouped percentiles of the tree-level effects, see group_statistics.py
+from group_statistics import YEAR_SUFFIXES, summarize_tree_effects
+
+# Set path to the folder with tree_level_effects_2000_2019.csv
+file_dir = <'Insert process_files directory here'>
+
+# Input and output tables
+tree_effects_csv_path = os.path.join(file_dir, 'tree_level_effects_2000_2019.csv')
+out_csv_paths = {
+    'species': os.path.join(file_dir, 'species_effect_trends.csv'),
+    'state': os.path.join(file_dir, 'state_effect_trends.csv'),
+}
+
+# Percentiles (the median is always included) and TDep years summarized
+probs = [0.05] # Set percentiles here, 5th percentile
+suffixes = YEAR_SUFFIXES
+
+# Record start time
+start_time = timeit.default_timer()
+
+# Begin the species and state summaries
+summarize_tree_effects(tree_effects_csv_path, out_csv_paths, probs, suffixes)
+
+# Calculate time elapsed and print
+elapsed_min = (timeit.default_timer() - start_time) / 60
+print('Summarizing tree effects took ', elapsed_min, 'minutes')
@@ -0,0 +1,323 @@
+"""
+#### Module Information ####
+
+Module name: synthetic_inputs.py
+
+Purpose of module: Seeded synthetic inputs for the benchmarks (see benchmarks.py), standing in for the
+    Wilson et al. (2013) basal area rasters, the TDep grids and the growth/survival tables (about
+    200 GB for the real inputs). The grid size and number of species are set by the caller, from a
+    laptop-sized grid to the full CONUS grid (PRESETS).
+
+    Species ranges are sparse, like the real ones: each species occupies a noisy elliptical patch of
+    the grid with a log-normal size (a few species cover a large part of CONUS, most a small region),
+    and basal area is zero at part of the cells inside the patch. TDep surfaces are smooth fields
+    with an east-west gradient. The parameter tables have the columns of growth.csv and survival.csv,
+    including species without a critical load and nitrogen increasers without a dep_max.
+
+    The inputs are written once to a folder and re-used while the seed and size do not change:
+        species/s{code}.npz: basal area of each species at its non-zero cells, as a SpeciesRange
+            (see species_ranges.py) on the synthetic grid
+        tdep_{element}_{period}.npy: TDep surface (float32, rows x cols)
+        growth.csv, survival.csv: parameter tables of the Horn species
+        ba_store/s{code}: the basal area of each species as a full-grid raster of an array store (see
+            array_store.py), zero outside the species' cells, as the output of s1_ba_export_to_array_store.py
+        synthetic.json: the settings, grid and species codes
+    export_to_gdb writes the same inputs as rasters (ba.gdb, tdep.gdb) so the scripts themselves
+    can be timed with run_pipeline.py and report_run_profile.py; it is the only part that needs ArcPy.
+
+Used by: benchmarks.py, run_benchmarks.py
+
+Date Created: 2026-10-18
+
+"""
+
+# Import the necessary modules
+import json
+import os
+import numpy as np
+
+from array_store import save_raster
+from raster_blocks import block_to_raster, mosaic_blocks
+from species_params import HORN_SPP_CODES
+from species_ranges import SpeciesRange
+
+# Grid sizes: the full CONUS grid of the Wilson et al. (2013) rasters at 250 m, and a laptop-sized
+# grid at 2.5 km with the same number of species
+PRESETS = {
+    'laptop': {'nrows': 1160, 'ncols': 1840, 'n_species': 324, 'cell_size': 2500.0},
+    'full': {'nrows': 11600, 'ncols': 18400, 'n_species': 324, 'cell_size': 250.0},
+}
+
+# Upper left corner of the grid in Equal Area Conus Albers (EPSG 5070)
+GRID_ORIGIN = (-2361000.0, 3177000.0)
+
+# TDep periods written, with deposition relative to 2017-2019 (deposition has declined since 2000)
+TDEP_PERIODS = {'0002': 1.6, '1719': 1.0}
+
+# Range of the TDep surfaces by element, kg/ha/yr
+TDEP_RANGES = {'n': (2.0, 30.0), 's': (0.5, 20.0)}
+
+# Rows generated at a time for the TDep surfaces and written at a time by export_to_gdb; also the chunk
+# size of the basal area store (large chunks, as most of each species' raster is zero)
+STRIP_ROWS = 1024
+
+# Folder of the basal area array store in the inputs folder
+BA_STORE_NAME = 'ba_store'
+
+# Parameter columns of the tables, by element (see species_params.PARAM_COLUMNS)
+TABLE_COLUMNS = ['spp_code', 'n1', 'n2', 'min_n', 'max_n', 'ndep_max', 's1', 's2', 'min_s', 'max_s', 'sdep_max']
+
+
+def species_codes(n_species):
+    """
+    spp codes of n_species species: the Horn species first, then made-up codes for the others
+    (the Wilson et al. rasters hold 324 species, 94 of them Horn species).
+    """
+    extra = [code for code in range(1, 10000) if code not in HORN_SPP_CODES]
+    return (HORN_SPP_CODES + extra)[:n_species]
+
+
+def species_patch(rng, nrows, ncols):
+    """
+    Random noisy elliptical patch for one species. Returns (row0, col0, mask), where mask is the
+    boolean window of the patch and row0, col0 its upper left cell on the grid.
+    """
+    # Log-normal share of the grid, e.g., 3% for the median species and up to half of CONUS
+    share = float(np.clip(np.exp(rng.normal(np.log(0.03), 1.2)), 0.0005, 0.5))
+    aspect = rng.uniform(0.5, 2.0)
+    half_rows = max(2, int(np.sqrt(share * nrows * ncols / np.pi / aspect)))
+    half_cols = max(2, int(half_rows * aspect))
+    center_row, center_col = rng.integers(0, nrows), rng.integers(0, ncols)
+    row0, row1 = max(0, center_row - half_rows), min(nrows, center_row + half_rows)
+    col0, col1 = max(0, center_col - half_cols), min(ncols, center_col + half_cols)
+
+    # Ellipse with a low-frequency noisy edge (a coarse noise grid repeated onto the window)
+    rows = (np.arange(row0, row1) - center_row)[:, np.newaxis] / half_rows
+    cols = (np.arange(col0, col1) - center_col)[np.newaxis, :] / half_cols
+    coarse = rng.normal(0.0, 0.35, (9, 9))
+    noise = coarse[np.arange(row1 - row0) * 9 // (row1 - row0)][:, np.arange(col1 - col0) * 9 // (col1 - col0)]
+    return row0, col0, rows ** 2 + cols ** 2 + noise < 1.0
+
+
+def make_species(seed, index, code, grid):
+    """
+    Basal area of one species as a SpeciesRange on the synthetic grid: a patch (see species_patch)
+    where about 70% of the cells have basal area (gamma distributed, ft2/acre) and the rest are zero.
+    The same seed, index and grid always give the same species.
+    """
+    rng = np.random.default_rng([seed, index])
+    row0, col0, mask = species_patch(rng, grid['nrows'], grid['ncols'])
+    mask &= rng.random(mask.shape) < 0.7
+    indices = np.flatnonzero(mask)
+    values = rng.gamma(2.0, 5.0, len(indices)).astype(np.float32)
+    nrows, ncols = mask.shape
+    cell_size = grid['cell_size']
+    return SpeciesRange('s{}'.format(code), grid['x_min'] + col0 * cell_size, grid['y_max'] - row0 * cell_size,
+                        cell_size, cell_size, nrows, ncols,
+                        indices.astype(np.int32 if nrows * ncols < np.iinfo(np.int32).max else np.int64), values)
+
+
+def window_offset(species_range, grid):
+    """
+    (row, col) of the upper left cell of a species' window on the synthetic grid.
+    """
+    return (int(round((grid['y_max'] - species_range.y_max) / grid['cell_size'])),
+            int(round((species_range.x_min - grid['x_min']) / grid['cell_size'])))
+
+
+def grid_cells(species_range, grid):
+    """
+    Flat (row-major) indices on the whole grid of the species' cells, in the order of its values.
+    """
+    row0, col0 = window_offset(species_range, grid)
+    rows, cols = np.divmod(species_range.indices.astype(np.int64), species_range.ncols)
+    return (rows + row0) * grid['ncols'] + cols + col0
+
+
+def species_strips(species_range, grid):
+    """
+    Yield (row_start, strip) full-width strips (float32, STRIP_ROWS rows) of a species' full-grid basal
+    area raster, zero outside its cells.
+    """
+    cells = grid_cells(species_range, grid)
+    ncols = grid['ncols']
+    for row_start in range(0, grid['nrows'], STRIP_ROWS):
+        nrows = min(STRIP_ROWS, grid['nrows'] - row_start)
+        strip = np.zeros(nrows * ncols, dtype=np.float32)
+        bounds = np.searchsorted(cells, [row_start * ncols, (row_start + nrows) * ncols])
+        strip[cells[bounds[0]:bounds[1]] - row_start * ncols] = species_range.values[bounds[0]:bounds[1]]
+        yield row_start, strip.reshape(nrows, ncols)
+
+
+def grid_geotransform(grid):
+    """
+    GDAL geotransform of the synthetic grid, as saved in the array store.
+    """
+    return (grid['x_min'], grid['cell_size'], 0.0, grid['y_max'], 0.0, -grid['cell_size'])
+
+
+def tdep_surface(rng, element, nrows, ncols, out):
+    """
+    Fill out (rows x cols) with a smooth TDep surface: an east-west gradient plus a few random waves,
+    scaled to TDEP_RANGES[element]. Made STRIP_ROWS rows at a time.
+    """
+    low, high = TDEP_RANGES[element]
+    waves = [(rng.uniform(0.5, 4.0), rng.uniform(0.5, 4.0), rng.uniform(0, 2 * np.pi), rng.uniform(0.1, 0.3))
+             for _ in range(6)]
+    x = np.linspace(0.0, 1.0, ncols)[np.newaxis, :]
+    for row_start in range(0, nrows, STRIP_ROWS):
+        y = (np.arange(row_start, min(nrows, row_start + STRIP_ROWS)) / max(1, nrows - 1))[:, np.newaxis]
+        field = np.repeat(0.3 + 0.4 * x, len(y), axis=0)
+        for fx, fy, phase, amplitude in waves:
+            field += amplitude * np.cos(2 * np.pi * (fx * x + fy * y) + phase)
+        out[row_start:row_start + len(y)] = low + (high - low) * np.clip(field, 0.0, 1.0)
+
+
+def parameter_rows(rng, codes):
+    """
+    Rows of a growth or survival table for the species codes. About 20% of the species have no
+    critical load for an element (a flat response) and 15% have no ndep_max (nitrogen increasers).
+    """
+    rows = []
+    for code in codes:
+        row = {'spp_code': code}
+        for element in ['n', 's']:
+            low, high = TDEP_RANGES[element]
+            min_dep = rng.uniform(low, low + 3.0)
+            max_dep = rng.uniform(high * 0.6, high)
+            if rng.random() < 0.2:
+                values = [None, None, min_dep, max_dep, None]
+            else:
+                cl1 = rng.uniform(min_dep + 0.5, max_dep - 0.5)
+                dep_max = None if element == 'n' and rng.random() < 0.15 else cl1
+                values = [cl1, rng.uniform(1.5, 4.0), min_dep, max_dep, dep_max]
+            for name, value in zip(TABLE_COLUMNS[1:6] if element == 'n' else TABLE_COLUMNS[6:], values):
+                row[name] = value
+        rows.append(row)
+    return rows
+
+
+def write_table(rows, csv_path):
+    """
+    Write parameter rows as a csv with the columns of growth.csv / survival.csv (NA for missing).
+    """
+    with open(csv_path, 'w', newline='') as f:
+        f.write(','.join(TABLE_COLUMNS) + '\n')
+        for row in rows:
+            f.write(','.join('NA' if row[name] is None else '{:.6g}'.format(row[name]) for name in TABLE_COLUMNS) + '\n')
+
+
+def generate_inputs(inputs_dir, nrows, ncols, n_species, seed=0, cell_size=250.0):
+    """
+    Write the synthetic inputs to inputs_dir (see the module description), unless inputs made with the
+    same settings are already there. Returns the settings and grid (the contents of synthetic.json).
+    """
+    codes = species_codes(n_species)
+    settings = {'nrows': nrows, 'ncols': ncols, 'n_species': n_species, 'seed': seed, 'cell_size': cell_size,
+                'x_min': GRID_ORIGIN[0], 'y_max': GRID_ORIGIN[1], 'species': codes,
+                'horn_species': [code for code in codes if code in HORN_SPP_CODES],
+                'tdep_periods': sorted(TDEP_PERIODS), 'ba_store': BA_STORE_NAME}
+    meta_path = os.path.join(inputs_dir, 'synthetic.json')
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            if json.load(f) == settings:
+                return settings
+
+    print('Generating synthetic inputs:', nrows, 'x', ncols, 'grid,', n_species, 'species, seed', seed)
+    os.makedirs(os.path.join(inputs_dir, 'species'), exist_ok=True)
+    for index, code in enumerate(settings['species']):
+        species_range = make_species(seed, index, code, settings)
+        species_range.save(os.path.join(inputs_dir, 'species', 's{}.npz'.format(code)))
+        save_raster(os.path.join(inputs_dir, BA_STORE_NAME), 's{}'.format(code), species_strips(species_range, settings),
+                    nrows, ncols, grid_geotransform(settings), chunk_size=STRIP_ROWS)
+
+    rng = np.random.default_rng([seed, n_species, 1])
+    for element in ['n', 's']:
+        surface = np.empty((nrows, ncols), dtype=np.float32)
+        tdep_surface(rng, element, nrows, ncols, surface)
+        for period, factor in TDEP_PERIODS.items():
+            np.save(os.path.join(inputs_dir, 'tdep_{}_{}.npy'.format(element, period)), surface * np.float32(factor))
+        del surface
+
+    for response_variable in ['growth', 'survival']:
+        write_table(parameter_rows(rng, settings['horn_species']), os.path.join(inputs_dir, '{}.csv'.format(response_variable)))
+
+    # Written last, so an interrupted run generates the inputs again
+    with open(meta_path, 'w') as f:
+        json.dump(settings, f, indent=1)
+    return settings
+
+
+def load_inputs(inputs_dir):
+    """
+    Settings and grid of the synthetic inputs in inputs_dir (see generate_inputs).
+    """
+    with open(os.path.join(inputs_dir, 'synthetic.json')) as f:
+        return json.load(f)
+
+
+def load_species(inputs_dir, code):
+    """
+    Basal area of one synthetic species as a SpeciesRange.
+    """
+    return SpeciesRange.load(os.path.join(inputs_dir, 'species', 's{}.npz'.format(code)))
+
+
+def load_tdep(inputs_dir, element, period='1719'):
+    """
+    TDep surface of an element and period, memory-mapped.
+    """
+    return np.load(os.path.join(inputs_dir, 'tdep_{}_{}.npy'.format(element, period)), mmap_mode='r')
+
+
+def ba_store_path(inputs_dir, code):
+    """
+    Path of one synthetic species' basal area raster in the array store, as read by raster_blocks.read_block.
+    """
+    return os.path.join(inputs_dir, BA_STORE_NAME, 's{}'.format(code))
+
+
+def export_to_gdb(inputs_dir, root_dir, out_folder, ba_gdb_name='ba.gdb'):
+    """
+    Write the synthetic inputs where the scripts expect the real ones, so the script series can be
+    run and timed on them (e.g., with run_pipeline.py):
+        root_dir/growth.csv, root_dir/survival.csv
+        root_dir/out_folder/tdep.gdb: {element}_tw_{period}
+        root_dir/out_folder/ba_gdb_name: one full-grid basal area raster per species (s{code}),
+            zero outside the species' cells, as the output of s1_ba_export_to_single_gdb.py
+    """
+    import arcpy as ap
+
+    grid = load_inputs(inputs_dir)
+    out_dir = os.path.join(root_dir, out_folder)
+    for gdb_name in ['tdep.gdb', ba_gdb_name]:
+        if not ap.Exists(os.path.join(out_dir, gdb_name)):
+            ap.CreateFileGDB_management(out_dir, gdb_name)
+    for response_variable in ['growth', 'survival']:
+        with open(os.path.join(inputs_dir, '{}.csv'.format(response_variable))) as f:
+            table = f.read()
+        with open(os.path.join(root_dir, '{}.csv'.format(response_variable)), 'w', newline='') as f:
+            f.write(table)
+
+    # TDep rasters; the first one sets the grid and spatial reference of the others
+    cell_size = grid['cell_size']
+    lower_left = ap.Point(grid['x_min'], grid['y_max'] - grid['nrows'] * cell_size)
+    template = None
+    for element in ['n', 's']:
+        for period in grid['tdep_periods']:
+            out_raster_save_path = os.path.join(out_dir, 'tdep.gdb', '{}_tw_{}'.format(element, period))
+            raster = ap.NumPyArrayToRaster(np.asarray(load_tdep(inputs_dir, element, period)), lower_left,
+                                           cell_size, cell_size)
+            raster.save(out_raster_save_path)
+            ap.DefineProjection_management(out_raster_save_path, ap.SpatialReference(5070))
+            template = template or ap.Raster(out_raster_save_path)
+            print('***SAVED***', out_raster_save_path)
+
+    # Basal area rasters, written a strip of rows at a time
+    for code in grid['species']:
+        block_rasters = []
+        for row_start, strip in species_strips(load_species(inputs_dir, code), grid):
+            strip_lower_left = ap.Point(grid['x_min'], grid['y_max'] - (row_start + strip.shape[0]) * cell_size)
+            block_rasters.append(block_to_raster(strip, strip_lower_left, template))
+        mosaic_blocks(block_rasters, os.path.join(out_dir, ba_gdb_name, 's{}'.format(code)), template)
+        print('***SAVED***', 's{}'.format(code))
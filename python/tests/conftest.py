@@ -0,0 +1,11 @@
+"""
+Tests of the shared modules. The modules are imported from the python folder, as the scripts do;
+the tests only need NumPy (no ArcPy or input data).
+
+Run from the python folder: python -m pytest tests
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,59 @@
+"""
+Percentile selection of cell_statistics.py against np.nanpercentile.
+"""
+
+import numpy as np
+import pytest
+
+from cell_statistics import SignatureCache, nanpercentile_select
+
+
+def sparse_stack(seed, n_rasters, n_cells):
+    """
+    Stack of rasters with a different number of NaN at each cell, including all-NaN cells and ties.
+    """
+    rng = np.random.default_rng(seed)
+    stack = rng.gamma(2.0, 5.0, (n_rasters, n_cells))
+    stack[:, :n_cells // 10] = np.round(stack[:, :n_cells // 10])
+    stack[rng.random(stack.shape) < rng.uniform(0.0, 1.0, n_cells)] = np.nan
+    stack[:, -3:] = np.nan
+    return stack
+
+
+@pytest.mark.parametrize('q', [0, 1, 5, 33.3, 50, 95, 100])
+@pytest.mark.parametrize('dtype', [np.float32, np.float64])
+def test_nanpercentile_select_matches_numpy(q, dtype):
+    stack = sparse_stack(1, 40, 3000).astype(dtype)
+    with pytest.warns(RuntimeWarning): # All-NaN cells
+        expected = np.nanpercentile(stack, q, axis=0)
+    result = nanpercentile_select(stack.copy(), q)
+    assert np.array_equal(np.isnan(result), np.isnan(expected))
+    np.testing.assert_allclose(result, expected, rtol=1e-6 if dtype == np.float32 else 1e-12)
+
+
+def test_nanpercentile_select_single_raster():
+    stack = np.array([[1.0, np.nan, 3.0]])
+    np.testing.assert_array_equal(nanpercentile_select(stack, 5), [1.0, np.nan, 3.0])
+
+
+def test_signature_cache_matches_stacked_percentile():
+    rng = np.random.default_rng(2)
+    levels = rng.uniform(2.0, 20.0, 70) # More than one word of species
+    levels[3] = np.nan
+    n_cells = 5000
+    species_cells = [np.flatnonzero(rng.random(n_cells) < rng.uniform(0.05, 0.6)) for _ in levels]
+    cache = SignatureCache(levels, lambda stack: nanpercentile_select(stack, 5))
+
+    # Two strips, so signatures seen in the first are reused in the second
+    half = n_cells // 2
+    result = np.concatenate([
+        cache.scatter(cache.index(cache.presence([cells[cells < half] for cells in species_cells], half))),
+        cache.scatter(cache.index(cache.presence([cells[cells >= half] - half for cells in species_cells],
+                                                 n_cells - half))),
+    ])
+
+    stack = np.full((len(levels), n_cells), np.nan)
+    for i, cells in enumerate(species_cells):
+        stack[i, cells] = levels[i]
+    expected = np.nanpercentile(stack.astype(np.float32), 5, axis=0)
+    np.testing.assert_allclose(result, expected, rtol=1e-6)
@@ -0,0 +1,82 @@
+"""
+Grouped statistics of group_statistics.py against per-group NumPy (R's quantile type 7 and median).
+"""
+
+import csv
+
+import numpy as np
+import pytest
+
+from group_statistics import grouped_statistics, percentile_name, summarize_tree_effects
+
+
+def expected_statistics(block, probs):
+    """
+    Statistics of each column as R gives them: median NA if any value is missing, quantile(type = 7,
+    na.rm = TRUE).
+    """
+    stats = {'n_valid': np.count_nonzero(~np.isnan(block), axis=0),
+             'median': np.array([np.median(column) if not np.isnan(column).any() else np.nan for column in block.T])}
+    for p in probs:
+        stats[percentile_name(p)] = np.array([np.percentile(column[~np.isnan(column)], p * 100)
+                                              if (~np.isnan(column)).any() else np.nan for column in block.T])
+    return stats
+
+
+def test_grouped_statistics_matches_numpy():
+    rng = np.random.default_rng(3)
+    n_trees = 2000
+    values = rng.normal(0.0, 0.2, (n_trees, 4))
+    values[rng.random(values.shape) < 0.1] = np.nan
+    keys = [rng.integers(0, 5, n_trees), rng.integers(0, 3, n_trees)]
+    values[(keys[0] == 4) & (keys[1] == 2), 1] = np.nan # A group without values in one column
+    probs = (0.05, 0.5, 0.95)
+
+    group_keys, n_trees_by_group, stats = grouped_statistics(values, keys, probs)
+    assert [tuple(key) for key in group_keys] == sorted(set(zip(*keys)))
+    for g, key in enumerate(group_keys):
+        trees = (keys[0] == key[0]) & (keys[1] == key[1])
+        assert n_trees_by_group[g] == np.count_nonzero(trees)
+        for name, expected in expected_statistics(values[trees], probs).items():
+            np.testing.assert_allclose(stats[name][g], expected, rtol=1e-12, err_msg=name)
+
+
+def test_summarize_tree_effects(tmp_path):
+    rng = np.random.default_rng(4)
+    species = ['Quercus_rubra', 'Acer_rubrum', 'Pinus_taeda']
+    states = ['VA', 'NC', '']
+    rows = []
+    for i in range(300):
+        effects = rng.normal(0.0, 0.1, 2)
+        rows.append({'SPCD': [833, 316, 131][i % 3], 'Gen_Spp': species[i % 3], 'STUSPS': states[i % 7 % 3],
+                     'n_tw_20000_Domain': int(i % 11 == 0), 's_tw_20000_Domain': 0,
+                     'G_N_00': '{:.6f}'.format(effects[0]), 'G_N_01': 'NA' if i % 13 == 0 else '{:.6f}'.format(effects[1])})
+    effects_csv_path = str(tmp_path / 'tree_level_effects.csv')
+    with open(effects_csv_path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+    out_csv_paths = {'species': str(tmp_path / 'species.csv'), 'state': str(tmp_path / 'state.csv')}
+    n_groups = summarize_tree_effects(effects_csv_path, out_csv_paths, probs=(0.05,), suffixes=['00', '01'],
+                                      endpoints=['G_N'])
+    assert n_groups == {'species': 3, 'state': 3}
+
+    kept = [row for row in rows if row['n_tw_20000_Domain'] == 0]
+    with open(out_csv_paths['state'], newline='') as f:
+        written = list(csv.DictReader(f))
+    # Groups sorted by name, with the missing state last (as group_by)
+    assert [row['STUSPS'] for row in written] == ['NC', 'NC', 'VA', 'VA', 'NA', 'NA']
+    for row in written:
+        state = '' if row['STUSPS'] == 'NA' else row['STUSPS']
+        column = 'G_N_{}'.format(row['year'])
+        group = np.array([np.nan if tree[column] == 'NA' else float(tree[column]) for tree in kept
+                          if tree['STUSPS'] == state])
+        expected = expected_statistics(group[:, np.newaxis], (0.05,))
+        assert int(row['n']) == len(group)
+        assert int(row['n_valid']) == expected['n_valid'][0]
+        for name in ['median', 'p5']:
+            if np.isnan(expected[name][0]):
+                assert row[name] == 'NA'
+            else:
+                assert float(row[name]) == pytest.approx(expected[name][0], rel=1e-6, abs=1e-7)
@@ -0,0 +1,117 @@
+"""
+Presence index of presence_index.py: build from cached ranges, save/load round-trip and queries,
+against the species' cells on the grid.
+"""
+
+import os
+
+import numpy as np
+import pytest
+
+from presence_index import PresenceIndex, index_path, load_presence_index
+from species_ranges import RANGES_DIR_NAME, SpeciesRange
+from synthetic_inputs import GRID_ORIGIN, grid_cells, make_species
+
+# Small synthetic grid; more than 64 species, so cells hold two words
+GRID = {'nrows': 90, 'ncols': 120, 'cell_size': 250.0, 'x_min': GRID_ORIGIN[0], 'y_max': GRID_ORIGIN[1]}
+N_SPECIES = 70
+
+
+@pytest.fixture
+def out_dir(tmp_path):
+    """
+    out_dir with the cached ranges of N_SPECIES synthetic species in spp_ranges.
+    """
+    ranges_dir = tmp_path / RANGES_DIR_NAME
+    ranges_dir.mkdir()
+    for i in range(N_SPECIES):
+        make_species(0, i, i + 1, GRID).save(str(ranges_dir / 's{}_proportion.npz'.format(i + 1)))
+    return str(tmp_path)
+
+
+def range_paths(out_dir):
+    """
+    Paths of the cached ranges of out_dir, sorted as load_presence_index lists them.
+    """
+    ranges_dir = os.path.join(out_dir, RANGES_DIR_NAME)
+    return [os.path.join(ranges_dir, name) for name in sorted(os.listdir(ranges_dir))]
+
+
+def grid_presence(index, paths):
+    """
+    (species x grid cells) presence from the ranges, and the grid cells of the index cells.
+    """
+    presence = np.zeros((len(paths), GRID['nrows'] * GRID['ncols']), dtype=bool)
+    for i, path in enumerate(paths):
+        presence[i, grid_cells(SpeciesRange.load(path), GRID)] = True
+    row0 = int(round((GRID['y_max'] - index.y_max) / GRID['cell_size']))
+    col0 = int(round((index.x_min - GRID['x_min']) / GRID['cell_size']))
+    rows, cols = np.divmod(index.cells.astype(np.int64), index.ncols)
+    return presence, (rows + row0) * GRID['ncols'] + cols + col0
+
+
+def test_build_matches_ranges(out_dir):
+    paths = range_paths(out_dir)
+    index = PresenceIndex.build(paths, block_rows=16)
+    presence, cells = grid_presence(index, paths)
+    assert index.words.shape == (len(index), 2)
+    np.testing.assert_array_equal(np.sort(cells), np.flatnonzero(presence.any(axis=0)))
+    np.testing.assert_array_equal(index.richness(), presence[:, cells].sum(axis=0))
+    for i, name in enumerate(index.species):
+        np.testing.assert_array_equal(index.has(name), presence[i, cells])
+    assert index.occupancy()[index.species[-1]] == np.count_nonzero(presence[-1])
+
+
+def test_save_load_round_trip(out_dir):
+    paths = range_paths(out_dir)
+    index = PresenceIndex.build(paths)
+    path = index_path(out_dir)
+    index.save(path)
+    loaded = PresenceIndex.load(path)
+    for name in ['template', 'x_min', 'y_max', 'cell_width', 'cell_height', 'nrows', 'ncols', 'species', 'stamps']:
+        assert getattr(loaded, name) == getattr(index, name), name
+    np.testing.assert_array_equal(loaded.cells, index.cells)
+    np.testing.assert_array_equal(loaded.words, index.words)
+    assert loaded.words.dtype == np.uint64
+    np.testing.assert_array_equal(loaded.richness(), index.richness())
+
+
+def test_queries(out_dir):
+    paths = range_paths(out_dir)
+    index = PresenceIndex.build(paths)
+    presence, cells = grid_presence(index, paths)
+
+    # Species at the center of a cell with the most species
+    cell = cells[np.argmax(index.richness())]
+    row, col = divmod(int(cell), GRID['ncols'])
+    x = GRID['x_min'] + (col + 0.5) * GRID['cell_size']
+    y = GRID['y_max'] - (row + 0.5) * GRID['cell_size']
+    assert index.species_at(x, y) == [name for i, name in enumerate(index.species) if presence[i, cell]]
+    assert index.species_at(GRID['x_min'] - 1000.0, y) == []
+
+    # Positions of a species' cells among the index cells, in the order of its values
+    species_range = SpeciesRange.load(paths[5])
+    positions = index.positions(species_range)
+    np.testing.assert_array_equal(cells[positions], grid_cells(species_range, GRID))
+
+    # Cells where two species occur together
+    first, second = index.species[0], index.species[1]
+    together = np.sort(cells[np.searchsorted(index.cells, index.cooccurrence(first, second))])
+    np.testing.assert_array_equal(together, np.flatnonzero(presence[0] & presence[1]))
+    np.testing.assert_array_equal(index.select(any_of=[first], none_of=[second]), presence[0, cells] & ~presence[1, cells])
+
+
+def test_load_presence_index_rebuilds_on_changed_range(out_dir):
+    index = load_presence_index(out_dir)
+    assert os.path.exists(index_path(out_dir))
+    assert load_presence_index(out_dir).stamps == index.stamps
+
+    # Replace one range with another species' range; the saved index is out of date
+    paths = range_paths(out_dir)
+    make_species(1, 0, 1, GRID).save(paths[0])
+    stat = os.stat(paths[0])
+    os.utime(paths[0], (stat.st_atime, stat.st_mtime + 10))
+    rebuilt = load_presence_index(out_dir)
+    assert rebuilt.stamps != index.stamps
+    presence, cells = grid_presence(rebuilt, paths)
+    np.testing.assert_array_equal(rebuilt.has(rebuilt.species[0]), presence[0, cells])
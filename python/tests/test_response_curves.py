@@ -0,0 +1,117 @@
+"""
+response_curves.py against the raster algebra of the original s6a/s6b and s9a/s9b scripts.
+"""
+
+import math
+
+import numpy as np
+import pytest
+
+from response_curves import (CurveParams, ENDPOINTS, LOOKUP_TOLERANCE, ResponseTable, ba_weighted_effect,
+                             deposition_level, effect, lookup_tables)
+
+# (cl1, cl2, min_dep, max_dep, dep_max): a hump with a dep_max, an increaser without one
+# and a steep curve
+PARAMS = [
+    CurveParams(8.0, 2.5, 3.0, 25.0, 8.0),
+    CurveParams(12.0, 3.0, 2.5, 28.0, None),
+    CurveParams(5.0, 0.4, 1.0, 15.0, 5.0),
+]
+
+
+def original_effect(dep, params, endpoint):
+    """
+    Effect as in s6a/s6b: Exp(coef * Square(Divide(Ln(Divide(dep, n1)), n2))) over the same with
+    Con(dep > dep_max, dep_max, min_dep), minus 1, with deposition below min_dep set to NoData.
+    """
+    coef = ENDPOINTS[endpoint]['coef']
+    dep_max = params.min_dep if params.dep_max is None else params.dep_max
+    if dep < params.min_dep:
+        return math.nan
+    reference = dep_max if dep > dep_max else params.min_dep
+    numerator = math.exp(coef * (math.log(dep / params.cl1) / params.cl2) ** 2)
+    denominator = math.exp(coef * (math.log(reference / params.cl1) / params.cl2) ** 2)
+    return numerator / denominator - 1
+
+
+@pytest.mark.parametrize('endpoint', ['growth', 'survival'])
+@pytest.mark.parametrize('params', PARAMS)
+def test_effect_matches_original(params, endpoint):
+    dep = np.concatenate([np.linspace(0.5, 30.0, 501), [params.min_dep, params.dep_max or params.min_dep]])
+    expected = np.array([original_effect(value, params, endpoint) for value in dep])
+    result = effect(dep, params, endpoint)
+    assert np.array_equal(np.isnan(result), np.isnan(expected))
+    finite = np.isfinite(expected)
+    np.testing.assert_allclose(result[finite], expected[finite], rtol=1e-9, atol=1e-12)
+
+
+def test_effect_writes_into_out():
+    dep = np.linspace(3.0, 20.0, 50)
+    out = np.empty_like(dep)
+    result = effect(dep, PARAMS[0], 'growth', out=out)
+    assert result is out
+    np.testing.assert_array_equal(out, effect(dep, PARAMS[0], 'growth'))
+
+
+@pytest.mark.parametrize('endpoint', ['growth', 'survival'])
+def test_deposition_level_matches_original(endpoint):
+    params = PARAMS[0]
+    reduction = ENDPOINTS[endpoint]['reduction']
+    # s9a/s9b: n1 * Exp(SquareRoot(Square(Ln(Divide(dep_max, n1))) + Ln(1 - x) / coef))
+    expected = params.cl1 * math.exp(math.sqrt(math.log(params.dep_max / params.cl1) ** 2
+                                               + math.log(1 - reduction) / ENDPOINTS[endpoint]['coef']))
+    assert float(deposition_level(params, endpoint)) == pytest.approx(expected, rel=1e-12)
+
+
+def test_deposition_level_of_array_dep_max():
+    params = CurveParams(8.0, 2.5, 3.0, 25.0, np.array([8.0, 10.0, 12.0]))
+    levels = deposition_level(params, 'growth', reduction=0.1)
+    for dep_max, level in zip(params.dep_max, levels):
+        single = CurveParams(8.0, 2.5, 3.0, 25.0, float(dep_max))
+        assert level == pytest.approx(float(deposition_level(single, 'growth', reduction=0.1)))
+
+
+def test_ba_weighted_effect_keeps_nodata():
+    result = ba_weighted_effect(np.array([0.5, np.nan, 0.25]), np.array([-0.2, 0.1, np.nan]))
+    np.testing.assert_array_equal(result, [-0.1, np.nan, np.nan])
+
+
+@pytest.mark.parametrize('endpoint', ['growth', 'survival'])
+@pytest.mark.parametrize('params', PARAMS)
+def test_response_table_within_tolerance(params, endpoint):
+    table = ResponseTable(params, endpoint)
+    dep = np.random.default_rng(0).uniform(0.0, 60.0, 20000)
+    exact = effect(dep, params, endpoint)
+    result = table.evaluate(dep)
+    assert np.array_equal(np.isnan(result), np.isnan(exact))
+    if table.values is not None:
+        assert table.max_error <= LOOKUP_TOLERANCE
+    finite = np.isfinite(exact)
+    error = np.abs(result[finite] - exact[finite]) / np.maximum(1.0, np.abs(exact[finite]))
+    assert error.max() <= LOOKUP_TOLERANCE
+
+
+def test_response_table_exact_at_jumps():
+    params = PARAMS[0]
+    table = ResponseTable(params, 'growth')
+    dep = np.array([params.min_dep, params.dep_max, np.nextafter(params.dep_max, np.inf), np.nan])
+    np.testing.assert_array_equal(table.evaluate(dep), table.exact(dep))
+
+
+def test_response_table_too_steep_is_exact():
+    params = PARAMS[2]
+    table = ResponseTable(params, 'survival', max_bins=16)
+    assert table.values is None
+    dep = np.linspace(1.0, 15.0, 100)
+    np.testing.assert_allclose(table.evaluate(dep), effect(dep, params, 'survival'), rtol=1e-12)
+
+
+def test_lookup_tables_cover_every_endpoint():
+    dep = {'n': np.linspace(3.0, 70.0, 4000), 's': np.linspace(1.0, 20.0, 4000)}
+    params_by_endpoint = {('growth', 'n'): PARAMS[0], ('survival', 's'): PARAMS[2]}
+    tables = lookup_tables(params_by_endpoint, dep)
+    assert set(tables) == set(params_by_endpoint)
+    for (endpoint, element), table in tables.items():
+        exact = effect(dep[element], params_by_endpoint[(endpoint, element)], endpoint)
+        np.testing.assert_allclose(table.evaluate(dep[element]), exact, rtol=LOOKUP_TOLERANCE,
+                                   atol=LOOKUP_TOLERANCE)
@@ -0,0 +1,80 @@
+"""
+Tree-level effects of tree_effects.py against the formula of r/calculate_effects.R.
+"""
+
+import numpy as np
+import pytest
+
+from response_curves import ENDPOINTS, CurveParams
+from tree_effects import INCREASE_DEP_MAX, domain_flags, endpoint_effects
+
+
+def r_effect(dep, cl1, cl2, min_dep, dep_max, shape, endpoint):
+    """
+    Effect of one tree and year as calculate_effects.R: Dep.max set to 1e9 for increasers without one, then
+        ifelse(dep >= Dep.max, exp(coef * (log(dep / cl1) / cl2)^2) / exp(coef * (log(Dep.max / cl1) / cl2)^2) - 1,
+                               exp(coef * (log(dep / cl1) / cl2)^2) / exp(coef * (log(min_dep / cl1) / cl2)^2) - 1)
+    with NA wherever a value is missing.
+    """
+    coef = ENDPOINTS[endpoint]['coef']
+    if shape == 'increase' and np.isnan(dep_max):
+        dep_max = INCREASE_DEP_MAX
+    if np.isnan(dep) or np.isnan(dep_max):
+        return np.nan
+    reference = dep_max if dep >= dep_max else min_dep
+    return np.exp(coef * (np.log(dep / cl1) / cl2) ** 2) / np.exp(coef * (np.log(reference / cl1) / cl2) ** 2) - 1
+
+
+def trees(seed, n_trees=400, n_years=6):
+    """
+    Deposition and parameters of trees of a few species, with increasers, missing dep_max and missing
+    deposition. The first year is at dep_max, where R switches to the dep_max reference.
+    """
+    rng = np.random.default_rng(seed)
+    species = np.array([
+        # spcd, cl1, cl2, min_dep, max_dep, dep_max, shape
+        (833, 8.0, 2.5, 3.0, 25.0, 8.0, 'hump'),
+        (316, 12.0, 3.0, 2.5, 28.0, np.nan, 'increase'),
+        (131, 6.0, 1.5, 1.0, 20.0, 9.0, 'decrease'),
+        (318, 7.0, 2.0, 2.0, 22.0, np.nan, 'hump'),
+    ], dtype=object)
+    choice = rng.integers(0, len(species), n_trees)
+    spcd, cl1, cl2, min_dep, max_dep, dep_max, shape = (np.array(column) for column in species[choice].T)
+    dep = rng.uniform(0.5, 30.0, (n_trees, n_years))
+    dep[:, 0] = np.where(np.isnan(dep_max.astype(float)), dep[:, 0], dep_max.astype(float))
+    dep[rng.random(dep.shape) < 0.02] = np.nan
+    params = CurveParams(cl1.astype(float), cl2.astype(float), min_dep.astype(float), max_dep.astype(float),
+                         dep_max.astype(float))
+    return dep, spcd.astype(float), params, shape.astype(str)
+
+
+@pytest.mark.parametrize('endpoint', ['growth', 'survival'])
+def test_endpoint_effects_match_r(endpoint):
+    dep, spcd, params, shape = trees(6)
+    result = endpoint_effects(dep, spcd, params, shape, endpoint)
+    expected = np.array([[r_effect(value, params.cl1[i], params.cl2[i], params.min_dep[i], params.dep_max[i],
+                                   shape[i], endpoint) for value in row] for i, row in enumerate(dep)])
+    assert np.array_equal(np.isnan(result), np.isnan(expected))
+    finite = np.isfinite(expected)
+    np.testing.assert_allclose(result[finite], expected[finite], rtol=1e-9, atol=1e-12)
+
+
+@pytest.mark.parametrize('endpoint', ['growth', 'survival'])
+def test_endpoint_effects_lookup_within_tolerance(endpoint):
+    dep, spcd, params, shape = trees(7)
+    tolerance = 1e-4
+    exact = endpoint_effects(dep, spcd, params, shape, endpoint)
+    tables = {}
+    result = endpoint_effects(dep, spcd, params, shape, endpoint, lookup=(0.01, tolerance), tables=tables)
+    assert tables # Built once per species and kept for the next chunk
+    assert np.array_equal(np.isnan(result), np.isnan(exact))
+    finite = np.isfinite(exact)
+    error = np.abs(result[finite] - exact[finite]) / np.maximum(1.0, np.abs(exact[finite]))
+    assert error.max() <= tolerance
+
+
+def test_domain_flags_follow_r():
+    dep = np.array([[1.0, 5.0, 30.0, np.nan], [1.0, 5.0, 30.0, np.nan]])
+    flags = domain_flags(dep, np.array([2.0, np.nan]), np.array([25.0, 25.0]))
+    # ifelse(dep < min | dep > max, 1, 0): TRUE | NA is TRUE, FALSE | NA is NA
+    np.testing.assert_array_equal(flags, [[1.0, 0.0, 1.0, np.nan], [np.nan, np.nan, 1.0, np.nan]])
@@ -0,0 +1,59 @@
+"""
+Zone totals of zonal_statistics.py against per-zone NumPy.
+"""
+
+import numpy as np
+
+from zonal_statistics import ZoneTotals
+
+
+def add_strip(totals, zones, values):
+    """
+    Add the cells of one strip that are in a zone, sorted by zone, as zonal_statistics does.
+    """
+    in_zone = np.flatnonzero(zones >= 0)
+    order = in_zone[np.argsort(zones[in_zone], kind='stable')]
+    sorted_zones = zones[order]
+    starts = np.flatnonzero(np.concatenate([[True], sorted_zones[1:] != sorted_zones[:-1]]))
+    totals.add(sorted_zones, starts, values[order])
+
+
+def test_zone_totals_match_numpy():
+    rng = np.random.default_rng(5)
+    n_cells = 20000
+    zones = rng.integers(-1, 8, n_cells) # -1 is outside the zones
+    zones[zones == 5] = 6 # Label 5 has no cells
+    values = rng.gamma(2.0, 3.0, n_cells)
+    values[rng.random(n_cells) < 0.2] = np.nan
+    values[zones == 7] = np.nan # A zone without data
+
+    totals = ZoneTotals(keep_values=True)
+    for strip in np.array_split(np.arange(n_cells), 3):
+        add_strip(totals, zones[strip], values[strip])
+    labels = np.array([0, 1, 2, 3, 4, 6, 7])
+    stats = totals.statistics(labels, probs=(0.05, 0.5))
+
+    for i, label in enumerate(labels):
+        zone_values = values[(zones == label) & ~np.isnan(values)]
+        assert stats['count'][i] == len(zone_values)
+        if not len(zone_values):
+            for name in ['sum', 'mean', 'min', 'max', 'p5', 'p50']:
+                assert np.isnan(stats[name][i]), name
+            continue
+        np.testing.assert_allclose(stats['sum'][i], zone_values.sum(), rtol=1e-12)
+        np.testing.assert_allclose(stats['mean'][i], zone_values.mean(), rtol=1e-12)
+        assert stats['min'][i] == zone_values.min()
+        assert stats['max'][i] == zone_values.max()
+        # The kept values are float32
+        np.testing.assert_allclose(stats['p5'][i], np.percentile(zone_values.astype(np.float32), 5), rtol=1e-6)
+        np.testing.assert_allclose(stats['p50'][i], np.percentile(zone_values.astype(np.float32), 50), rtol=1e-6)
+
+
+def test_zone_totals_without_percentiles():
+    totals = ZoneTotals()
+    add_strip(totals, np.array([2, 0, 2, 2]), np.array([1.0, 4.0, np.nan, 3.0]))
+    stats = totals.statistics(np.array([0, 2]))
+    np.testing.assert_array_equal(stats['count'], [1, 2])
+    np.testing.assert_array_equal(stats['sum'], [4.0, 4.0])
+    np.testing.assert_array_equal(stats['mean'], [4.0, 2.0])
+    assert 'p5' not in stats
@@ -0,0 +1,226 @@
+"""
+#### Module Information ####
+
+Module name: tree_effects.py
+
+Purpose of module: Tree-level growth and survival effects for every TDep year, the Python
+    equivalent of the effect and domain sections of r/calculate_effects.R.
+    The R script loops over the year suffixes once per endpoint (G_N, G_S, S_N, S_S), evaluates
+    the response curve for both branches of an ifelse on every row, and appends columns one
+    at a time. Here the deposition columns of a chunk of trees are read into a (trees x years)
+    matrix and every endpoint is one broadcast over that matrix. The reference (denominator)
+    values only depend on the species' parameters, so they are calculated once per species
+    instead of once per tree and year. The table is read and written in chunks of rows, so
+    memory does not grow with the number of trees.
+
+    Results match calculate_effects.R, except that the ratio of the curve values is taken in
+    log space, so trees far from the curve optimum get a value close to -1 instead of NA (0/0).
+    With lookup tables (see response_curves.ResponseTable) each species' curve is tabulated once
+    and the trees are looked up, within the tolerance of the table.
+
+Used by: calculate_tree_effects.py, group_statistics.py
+
+Date Created: 2026-10-18
+
+"""
+
+# Import the necessary modules
+import numpy as np
+
+from fia_tables import iter_chunks, read_header
+from response_curves import LOOKUP_TOLERANCE, CurveParams, ResponseTable, log_response
+
+# TDep year suffixes: single years 2000-2019 and the 3-year periods, e.g., '00' for n_tw_20000,
+# '0002' for n_tw_200020
+TDEP_SUFFIXES = ['{:02d}'.format(year) for year in range(20)] + ['0002', '0911', '1719']
+
+# Endpoint prefix -> (response variable, element, cl1, cl2, min, max, dep_max, shape) columns
+ENDPOINT_COLUMNS = {
+    'G_N': ('growth', 'n', 'g.n1', 'g.n2', 'min_N', 'max_N', 'Dep.max.g.N', 'Shape.g.N'),
+    'G_S': ('growth', 's', 'g.s1', 'g.s2', 'min_S', 'max_S', 'Dep.max.g.S', 'Shape.g.S'),
+    'S_N': ('survival', 'n', 's.n1', 's.n2', 'min_N', 'max_N', 'Dep.max.s.N', 'Shape.s.N'),
+    'S_S': ('survival', 's', 's.s1', 's.s2', 'min_S', 'max_S', 'Dep.max.s.S', 'Shape.s.S'),
+}
+
+# Tree and plot columns kept in the output; the others are numeric
+ID_COLUMNS = ['Gen_Spp', 'Genus', 'Species', 'Common.Name', 'SPCD', 'TRE_CN', 'PLT_CN', 'LAT', 'LON',
+              'STUSPS', 'NAME', 'pheno.type', 'Wood.Products']
+TEXT_COLUMNS = ['Gen_Spp', 'Genus', 'Species', 'Common.Name', 'STUSPS', 'NAME', 'pheno.type', 'Wood.Products']
+
+# Dep.max used for monotonic increasers without a curve maximum (stands in for Inf)
+INCREASE_DEP_MAX = 1000000000
+
+# Rows of the tree table read and written at a time
+CHUNK_ROWS = 100000
+
+
+def deposition_column(element, suffix):
+    """
+    TDep column for an element and year suffix, e.g., ('n', '00') -> 'n_tw_20000'.
+    """
+    return '{}_tw_20{}0'.format(element, suffix)
+
+
+def endpoint_effects(dep, spcd, params, shape, endpoint, lookup=None, tables=None):
+    """
+    Effect for a (trees x years) deposition matrix:
+        exp(f(dep)) / exp(f(ref)) - 1, with ref = dep_max where dep >= dep_max and min_dep elsewhere
+
+    dep: (trees x years) deposition
+    spcd: species code of each tree; the reference values are calculated once per species
+    params: CurveParams of per-tree arrays (cl1, cl2, min_dep, max_dep, dep_max)
+    shape: per-tree curve shape; increasers without a dep_max use INCREASE_DEP_MAX
+    endpoint: 'growth' or 'survival'
+    lookup: (step, tolerance) to look the effects up from a table of each species' curve, or None
+    tables: dict that keeps the tables of the species between chunks of trees
+
+    Trees with a missing dep_max (other than increasers) or deposition get NaN, as ifelse returns NA.
+    """
+    dep_max = np.where((shape == 'increase') & np.isnan(params.dep_max), INCREASE_DEP_MAX, params.dep_max)
+
+    # Reference values once per species (and parameter set), then indexed back to the trees
+    species_params = np.column_stack([spcd, params.cl1, params.cl2, params.min_dep, dep_max])
+    if lookup:
+        return _lookup_effects(dep, species_params, endpoint, lookup, {} if tables is None else tables)
+    unique_params, tree_index = np.unique(species_params, axis=0, return_inverse=True)
+    tree_index = tree_index.ravel()
+    unique_curve = CurveParams(unique_params[:, 1], unique_params[:, 2], None, None, None)
+    log_ref_low = log_response(unique_params[:, 3], unique_curve, endpoint)[tree_index, np.newaxis]
+    log_ref_high = log_response(unique_params[:, 4], unique_curve, endpoint)[tree_index, np.newaxis]
+
+    # One broadcast over the (trees x years) matrix
+    tree_curve = CurveParams(params.cl1[:, np.newaxis], params.cl2[:, np.newaxis], None, None, None)
+    out = log_response(dep, tree_curve, endpoint, out=np.empty(dep.shape))
+    out -= np.where(dep >= dep_max[:, np.newaxis], log_ref_high, log_ref_low)
+    np.expm1(out, out=out)
+    out[np.isnan(dep_max)] = np.nan
+    return out
+
+
+def _lookup_effects(dep, species_params, endpoint, lookup, tables):
+    """
+    endpoint_effects from one ResponseTable per species (row of species_params: spcd, cl1, cl2, min_dep,
+    dep_max), with the reference of the trees (dep_max at and above it, no NaN below min_dep).
+    Tables are kept in tables by endpoint and parameters, so each is built once for the whole table of trees.
+    """
+    step, tolerance = lookup
+    out = np.full(dep.shape, np.nan)
+    # Trees of each species, from one sort; missing parameters are grouped as -1 (np.unique keeps every
+    # NaN apart) as the parameters are never negative
+    unique_params, tree_index = np.unique(np.where(np.isnan(species_params), -1.0, species_params), axis=0,
+                                          return_inverse=True)
+    unique_params[unique_params == -1.0] = np.nan
+    tree_index = tree_index.ravel()
+    order = np.argsort(tree_index, kind='stable')
+    bounds = np.searchsorted(tree_index[order], np.arange(len(unique_params) + 1))
+    for k, (_, cl1, cl2, min_dep, dep_max) in enumerate(unique_params):
+        trees = order[bounds[k]:bounds[k + 1]]
+        if np.isnan([cl1, cl2, dep_max]).any():
+            continue # NA, as with the exact formula
+        if np.isnan(min_dep):
+            # Only the effect at and above dep_max is defined
+            curve = CurveParams(cl1, cl2, None, None, None)
+            log_ref_high = float(log_response(dep_max, curve, endpoint))
+            values = log_response(dep[trees], curve, endpoint)
+            out[trees] = np.expm1(values - np.where(dep[trees] >= dep_max, log_ref_high, np.nan))
+            continue
+        key = (endpoint, cl1, cl2, min_dep, dep_max)
+        if key not in tables:
+            tables[key] = ResponseTable(CurveParams(cl1, cl2, min_dep, None, dep_max), endpoint, dep_floor=0.0,
+                                        high_at_max=True, step=step, tolerance=tolerance)
+        out[trees] = tables[key].evaluate(dep[trees])
+    return out
+
+
+def domain_flags(dep, min_dep, max_dep):
+    """
+    1 where deposition is outside the domain of the response curve (dep < min or dep > max), 0 inside,
+    NaN where that can not be decided because of missing values (R's three-valued | operator).
+    """
+    below = dep < min_dep[:, np.newaxis]
+    above = dep > max_dep[:, np.newaxis]
+    unknown_below = np.isnan(dep) | np.isnan(min_dep)[:, np.newaxis]
+    unknown_above = np.isnan(dep) | np.isnan(max_dep)[:, np.newaxis]
+    flags = (below | above).astype(np.float64)
+    flags[~flags.astype(bool) & (unknown_below | unknown_above)] = np.nan
+    return flags
+
+
+def row_format(is_text):
+    """
+    printf-style format of one csv line as written by R's write.csv: text quoted, numbers to
+    15 significant digits. is_text: one bool per column.
+    """
+    return ','.join('"%s"' if text else '%.15g' for text in is_text)
+
+
+def format_rows(columns, is_text):
+    """
+    Format a chunk of columns (lists or arrays of equal length) as csv lines. Missing numbers
+    (printed as nan) are written as NA; text fields are quoted, so they are not affected.
+    """
+    line_format = row_format(is_text)
+    columns = [[value.replace('"', '""') for value in column] if text else np.asarray(column).tolist()
+               for column, text in zip(columns, is_text)]
+    lines = [line_format % row for row in zip(*columns)]
+    return [(',' + line + ',').replace(',nan,', ',NA,').replace(',nan,', ',NA,')[1:-1] for line in lines]
+
+
+def calculate_tree_effects(in_csv_path, out_csv_path, suffixes=TDEP_SUFFIXES, chunk_rows=CHUNK_ROWS, lookup_step=None,
+                           lookup_tolerance=LOOKUP_TOLERANCE):
+    """
+    Read tree_characteristic_deposition.csv, calculate the effects of every endpoint and year and the
+    domain flags, and write them in chunks with the columns of tree_level_effects_2000_2019.csv:
+    the tree columns, n_tw_* and their _Domain flags, s_tw_* and their _Domain flags, then G_N_*, G_S_*,
+    S_N_* and S_S_* (one column per year suffix). Returns the number of trees written.
+    lookup_step: look the effects up from tables starting at this deposition step, within
+        lookup_tolerance of the exact effect (see response_curves.ResponseTable); None for the exact formula
+    """
+    header = read_header(in_csv_path)
+    dep_columns = {element: [column for column in header if column.startswith('{}_tw'.format(element))]
+                   for element in ['n', 's']}
+    shape_columns = [columns[7] for columns in ENDPOINT_COLUMNS.values()]
+    param_columns = [column for columns in ENDPOINT_COLUMNS.values() for column in columns[2:7]]
+    read_columns = list(dict.fromkeys(ID_COLUMNS + dep_columns['n'] + dep_columns['s'] + param_columns
+                                      + shape_columns))
+
+    # Output columns in the order of calculate_effects.R
+    domain_columns = {element: ['{}_Domain'.format(deposition_column(element, suffix)) for suffix in suffixes]
+                      for element in ['n', 's']}
+    out_columns = (ID_COLUMNS + dep_columns['n'] + domain_columns['n'] + dep_columns['s'] + domain_columns['s']
+                   + ['{}_{}'.format(prefix, suffix) for prefix in ENDPOINT_COLUMNS for suffix in suffixes])
+
+    n_trees = 0
+    tables = {} # Lookup tables of the species, built once
+    with open(out_csv_path, 'w', newline='') as out:
+        out.write(','.join('"{}"'.format(column) for column in [''] + out_columns) + '\n')
+        # Read full precision numbers and the original text, so values are written back unchanged
+        for chunk in iter_chunks(in_csv_path, read_columns, chunk_rows, compact=False):
+            results = {column: chunk[column] for column in read_columns
+                       if column not in TEXT_COLUMNS and column not in shape_columns}
+            dep = {element: np.column_stack([results[deposition_column(element, suffix)] for suffix in suffixes])
+                   for element in ['n', 's']}
+
+            # Domain of the response curve for every year
+            for element in ['n', 's']:
+                flags = domain_flags(dep[element], results['min_{}'.format(element.upper())],
+                                     results['max_{}'.format(element.upper())])
+                for j, column in enumerate(domain_columns[element]):
+                    results[column] = flags[:, j]
+
+            # Effects of each endpoint for every year as one (trees x years) matrix
+            for prefix, (endpoint, element, cl1, cl2, min_dep, max_dep, dep_max, shape) in ENDPOINT_COLUMNS.items():
+                params = CurveParams(results[cl1], results[cl2], results[min_dep], results[max_dep], results[dep_max])
+                effects = endpoint_effects(dep[element], results['SPCD'], params, chunk[shape], endpoint,
+                                           (lookup_step, lookup_tolerance) if lookup_step else None, tables)
+                for j, suffix in enumerate(suffixes):
+                    results['{}_{}'.format(prefix, suffix)] = effects[:, j]
+
+            # Write the chunk; R's write.csv puts the row number first
+            n_chunk = len(results['SPCD'])
+            columns = [[str(i) for i in range(n_trees + 1, n_trees + n_chunk + 1)]]
+            columns += [chunk[column] if column in TEXT_COLUMNS else results[column] for column in out_columns]
+            out.write('\n'.join(format_rows(columns, [True] + [column in TEXT_COLUMNS for column in out_columns])) + '\n')
+            n_trees += n_chunk
+            print('Trees processed:', n_trees)
+    return n_trees
@@ -0,0 +1,318 @@
+"""
+#### Module Information ####
+
+Module name: zonal_statistics.py
+
+Purpose of module: Zonal statistics (count, sum, mean, min, max and percentiles) of many rasters at once
+    for the state, county and ecoregion summaries used by the figures (e.g., r/fig_4.R), which were
+    made outside the repo by running Zonal Statistics as Table once per raster and zone layer.
+    Zones are a label raster on the grid of the rasters, or polygons rasterized once onto that grid
+    and cached in out_dir/zones.gdb with a csv of the zone keys (see rasterize_zones).
+
+    The zone raster and every value raster are read together in full-width strips, and each strip is
+    reduced per zone with bincount (count, sum) and fmin/fmax.reduceat over the cells sorted by zone,
+    so memory is set by the strip size, not the grid. Percentiles need every value of a zone: the
+    (zone, value) pairs of the cells with data are kept (8 bytes per cell and raster, rasters taken a
+    batch at a time within a memory budget) and sorted once, and every percentile of every zone is
+    read from the sorted values. Percentiles match R's quantile(type = 7), as in group_statistics.py.
+
+    Results are written as a tidy csv (one row per zone and raster) and, optionally, as columns (one
+    .npy file per column, as the fia_tables.py cache).
+
+Used by: s10_zonal_statistics.py, deposition_scenarios.py
+
+Date Created: 2026-10-18
+
+"""
+
+# Import the necessary modules
+import csv
+import json
+import os
+import numpy as np
+
+import raster_blocks
+from group_statistics import format_value, percentile_name
+from raster_blocks import read_block
+from run_profile import count_cells
+
+# Statistics of every zone and raster, before the percentiles
+STATISTICS = ['count', 'sum', 'mean', 'min', 'max']
+
+# Default memory budget for the values kept for the percentiles, in MB
+MEMORY_BUDGET_MB = 4096
+
+# Gdb in out_dir that holds the rasterized zone layers
+ZONES_GDB_NAME = 'zones.gdb'
+
+
+def rasterize_zones(zone_features, key_fields, template, out_dir, name, overwrite=False):
+    """
+    Rasterize a polygon layer onto the grid of the template (cell centers), once: the zone raster is
+    saved as out_dir/zones.gdb/{name}, with the object ID of each polygon as the zone, and the key
+    fields of every zone in out_dir/zones_{name}_keys.csv. Both are reused by later runs unless
+    overwrite is set (or they are deleted).
+
+    key_fields: fields of the polygons written for each zone, e.g., ['STUSPS'] or ['NA_L1CODE', 'NA_L1NAME']
+    Returns (zone raster path, keys): keys is a dict of zone -> tuple of key field values.
+    """
+    import arcpy as ap
+
+    zones_gdb_path = os.path.join(out_dir, ZONES_GDB_NAME)
+    zone_raster_path = os.path.join(zones_gdb_path, name)
+    keys_path = os.path.join(out_dir, 'zones_{}_keys.csv'.format(name))
+    if not overwrite and ap.Exists(zone_raster_path) and os.path.exists(keys_path):
+        return zone_raster_path, read_zone_keys(keys_path)[1]
+
+    if not ap.Exists(zones_gdb_path):
+        ap.CreateFileGDB_management(out_dir, ZONES_GDB_NAME)
+    oid_field = ap.Describe(zone_features).OIDFieldName
+    template_raster = ap.Raster(template)
+    print('Rasterizing', zone_features, 'to', zone_raster_path)
+    with ap.EnvManager(snapRaster=template, extent=template_raster.extent, cellSize=template,
+                       outputCoordinateSystem=template_raster.spatialReference):
+        ap.conversion.PolygonToRaster(zone_features, oid_field, zone_raster_path, 'CELL_CENTER', '',
+                                      template_raster.meanCellWidth)
+
+    keys = {}
+    with ap.da.SearchCursor(zone_features, ['OID@'] + list(key_fields)) as cursor:
+        for row in cursor:
+            keys[int(row[0])] = tuple(row[1:])
+    with open(keys_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['zone'] + list(key_fields))
+        for zone in sorted(keys):
+            writer.writerow([zone] + ['' if value is None else value for value in keys[zone]])
+    return zone_raster_path, keys
+
+
+def read_zone_keys(keys_path):
+    """
+    (key fields, dict of zone -> tuple of key values) from a keys csv written by rasterize_zones.
+    """
+    with open(keys_path, newline='') as f:
+        reader = csv.reader(f)
+        key_fields = next(reader)[1:]
+        return key_fields, {int(row[0]): tuple(row[1:]) for row in reader}
+
+
+def zone_layer(zones, template, out_dir, name):
+    """
+    Zone raster of one zone layer of the settings: [polygon feature class, [key fields]], rasterized
+    once with rasterize_zones, or the path of a zone raster on the grid of the template, used as it is.
+    Returns (zone raster path, key fields, keys).
+    """
+    if isinstance(zones, str):
+        return zones, [], {}
+    zone_raster_path, keys = rasterize_zones(zones[0], zones[1], template, out_dir, name)
+    return zone_raster_path, list(zones[1]), keys
+
+
+def _grow(arr, size, fill):
+    """
+    arr extended with fill to at least size values.
+    """
+    if len(arr) >= size:
+        return arr
+    return np.concatenate([arr, np.full(size - len(arr), fill, dtype=arr.dtype)])
+
+
+class ZoneTotals(object):
+    """
+    Running count, sum, min and max of one raster for every zone label, from strips of cells.
+
+    count, total, minimum, maximum: arrays indexed by zone label
+    pairs: list of (zone, value) arrays of the cells with data, kept for the percentiles (None if
+        no percentile is needed)
+    """
+
+    def __init__(self, keep_values=False):
+        self.count = np.zeros(0, dtype=np.int64)
+        self.total = np.zeros(0, dtype=np.float64)
+        self.minimum = np.zeros(0, dtype=np.float64)
+        self.maximum = np.zeros(0, dtype=np.float64)
+        self.pairs = [] if keep_values else None
+
+    def add(self, zones, starts, values):
+        """
+        Add the values of a strip's cells, sorted by zone.
+
+        zones: zone label of each cell, sorted; starts: index of the first cell of each zone in the strip
+        values: value of each cell (NaN for NoData)
+        """
+        size = int(zones[-1]) + 1
+        self.count, self.total = _grow(self.count, size, 0), _grow(self.total, size, 0.0)
+        self.minimum, self.maximum = _grow(self.minimum, size, np.nan), _grow(self.maximum, size, np.nan)
+        valid = ~np.isnan(values)
+        self.count += np.bincount(zones[valid], minlength=len(self.count))
+        self.total += np.bincount(zones[valid], weights=values[valid], minlength=len(self.total))
+        # fmin/fmax skip NaN, so zones whose cells are all NoData stay NaN
+        labels = zones[starts]
+        self.minimum[labels] = np.fmin(self.minimum[labels], np.fmin.reduceat(values, starts))
+        self.maximum[labels] = np.fmax(self.maximum[labels], np.fmax.reduceat(values, starts))
+        if self.pairs is not None:
+            self.pairs.append((zones[valid].astype(np.int32), values[valid].astype(np.float32)))
+
+    def percentiles(self, labels, probs):
+        """
+        Percentiles (R's quantile type 7) of the kept values of each zone label, as a dict of
+        percentile name -> array (NaN for zones without values).
+        """
+        zones = np.concatenate([zone for zone, _ in self.pairs]) if self.pairs else np.zeros(0, np.int32)
+        values = np.concatenate([value for _, value in self.pairs]) if self.pairs else np.zeros(0, np.float32)
+        self.pairs = []
+        order = np.lexsort((values, zones))
+        values = values[order].astype(np.float64)
+        counts = _grow(self.count, int(labels.max(initial=-1)) + 1, 0)
+        first = np.concatenate([[0], np.cumsum(counts)])[labels]
+        n = counts[labels]
+        result = {}
+        for p in probs:
+            # Linear interpolation between the order statistics below and above (n - 1) * p
+            h = (np.maximum(n, 1) - 1) * p
+            lo = np.floor(h).astype(np.int64)
+            hi = np.minimum(lo + 1, np.maximum(n, 1) - 1)
+            if len(values):
+                low, high = values[np.minimum(first + lo, len(values) - 1)], values[np.minimum(first + hi, len(values) - 1)]
+                quantile = low + (h - lo) * (high - low)
+            else:
+                quantile = np.full(len(labels), np.nan)
+            result[percentile_name(p)] = np.where(n > 0, quantile, np.nan)
+        return result
+
+    def statistics(self, labels, probs=()):
+        """
+        Dict of statistic -> array of the zone labels (see STATISTICS and percentile_name).
+        """
+        size = int(labels.max(initial=-1)) + 1
+        count = _grow(self.count, size, 0)[labels]
+        total = _grow(self.total, size, 0.0)[labels]
+        stats = {
+            'count': count,
+            'sum': np.where(count > 0, total, np.nan),
+            'mean': np.where(count > 0, total / np.maximum(count, 1), np.nan),
+            'min': _grow(self.minimum, size, np.nan)[labels],
+            'max': _grow(self.maximum, size, np.nan)[labels],
+        }
+        if probs:
+            stats.update(self.percentiles(labels, probs))
+        return stats
+
+
+def zonal_statistics(zone_raster, rasters, probs=(), block_rows=None, memory_budget_mb=MEMORY_BUDGET_MB):
+    """
+    Statistics of every raster for every zone of a zone label raster, from one streamed read of the
+    zone and value rasters per batch of rasters.
+
+    zone_raster: raster of integer zone labels (NoData outside the zones); it sets the grid, and the
+        rasters must share it (e.g., the national forest grid)
+    rasters: dict of name -> raster path
+    probs: percentiles to calculate, e.g., (0.05, 0.5)
+    block_rows: rows per full-width strip; defaults to raster_blocks.BLOCK_SIZE
+    memory_budget_mb: memory allowed for the values kept for the percentiles; sets how many rasters
+        are read in one pass
+    Returns (labels, cells, stats): the zone labels found in the zone raster (sorted), the number of
+        cells of each zone, and a dict of raster name -> dict of statistic -> array of the zones.
+    """
+    import arcpy as ap
+
+    template = ap.Raster(zone_raster)
+    block_rows = block_rows or raster_blocks.BLOCK_SIZE
+    extent = template.extent
+    names = list(rasters)
+    # Zone and value of every cell of the grid kept for the percentiles, in the worst case
+    batch_size = len(names) if not probs else max(1, int(memory_budget_mb * 1024 ** 2 // (8 * template.width * template.height)))
+
+    labels, cells, stats = None, None, {}
+    for batch_start in range(0, len(names), batch_size):
+        batch = names[batch_start:batch_start + batch_size]
+        print('Zonal statistics of', len(batch), 'rasters:', ', '.join(batch))
+        totals = {name: ZoneTotals(keep_values=bool(probs)) for name in batch}
+        zone_cells = np.zeros(0, dtype=np.int64)
+        for row_start in range(0, template.height, block_rows):
+            nrows = min(block_rows, template.height - row_start)
+            lower_left = ap.Point(extent.XMin, extent.YMax - (row_start + nrows) * template.meanCellHeight)
+            zone_block = read_block(template, lower_left, template.width, nrows).ravel()
+            in_zone = np.flatnonzero(~np.isnan(zone_block))
+            if not in_zone.size:
+                continue
+            # Cells of the strip sorted by zone, shared by every raster of the batch
+            zones = zone_block[in_zone].astype(np.int64)
+            if zones.min() < 0:
+                raise ValueError('Zone labels must not be negative: {}'.format(zone_raster))
+            order = np.argsort(zones, kind='stable')
+            in_zone, zones = in_zone[order], zones[order]
+            starts = np.flatnonzero(np.concatenate([[True], zones[1:] != zones[:-1]]))
+            zone_cells = _grow(zone_cells, int(zones[-1]) + 1, 0)
+            zone_cells += np.bincount(zones, minlength=len(zone_cells))
+            for name in batch:
+                values = read_block(rasters[name], lower_left, template.width, nrows).ravel()[in_zone]
+                totals[name].add(zones, starts, values)
+            count_cells(in_zone.size * len(batch))
+        labels = np.flatnonzero(zone_cells)
+        cells = zone_cells[labels]
+        for name in batch:
+            stats[name] = totals[name].statistics(labels, probs)
+    if labels is None:
+        labels, cells = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    return labels, cells, stats
+
+
+def tidy_columns(labels, cells, stats, key_fields=None, keys=None):
+    """
+    Columns of the tidy table (one row per zone and raster) as a dict of column -> array, in order:
+    the zone label, the key fields of each zone (if given), raster, cells (cells of the zone), then
+    the statistics.
+    """
+    names = list(stats)
+    n_zones = len(labels)
+    columns = {'zone': np.tile(labels, len(names))}
+    for j, field in enumerate(key_fields or []):
+        values = np.array([str(keys.get(int(label), ('',) * len(key_fields))[j]) for label in labels])
+        columns[field] = np.tile(values, len(names))
+    columns['raster'] = np.repeat(np.array(names), n_zones)
+    columns['cells'] = np.tile(cells, len(names))
+    for statistic in (stats[names[0]] if names else {}):
+        columns[statistic] = np.concatenate([stats[name][statistic] for name in names])
+    return columns
+
+
+def write_csv(columns, out_csv_path):
+    """
+    Write tidy columns as a csv, with numbers as written by R's write.csv and NA for missing.
+    """
+    with open(out_csv_path, 'w', newline='') as out:
+        out.write(','.join('"{}"'.format(column) for column in columns) + '\n')
+        text = []
+        for values in columns.values():
+            if values.dtype.kind in 'US':
+                text.append(['"{}"'.format(value) for value in values])
+            elif values.dtype.kind in 'iu':
+                text.append([str(value) for value in values])
+            else:
+                text.append([format_value(value) for value in values])
+        for row in zip(*text):
+            out.write(','.join(row) + '\n')
+    return out_csv_path
+
+
+def write_columns(columns, out_columns_dir):
+    """
+    Write tidy columns as one .npy file per column in out_columns_dir, with columns.json listing the
+    column order, e.g., to load a single statistic without parsing the csv.
+    """
+    os.makedirs(out_columns_dir, exist_ok=True)
+    for i, (column, values) in enumerate(columns.items()):
+        np.save(os.path.join(out_columns_dir, '{}.npy'.format(i)), values)
+    with open(os.path.join(out_columns_dir, 'columns.json'), 'w') as f:
+        json.dump(list(columns), f)
+    return out_columns_dir
+
+
+def read_columns(out_columns_dir):
+    """
+    Columns written by write_columns, as a dict of column -> array.
+    """
+    with open(os.path.join(out_columns_dir, 'columns.json')) as f:
+        names = json.load(f)
+    return {column: np.load(os.path.join(out_columns_dir, '{}.npy'.format(i))) for i, column in enumerate(names)}